@@ -0,0 +1,120 @@
+"""A cache of plotted houses, so that the same RLP is not plotted again when it is submitted again.
+
+A result is keyed by a hash of everything that decides what is plotted: the RLP geometry, the DXF
+template (by the hash of its file, see software/TemplateLibrary.py), the blocktypes and the seed. Results are CachedResult rows in the database, so every web
+process and worker process shares them. The cache holds at most PLOT_JOBS['CACHE_MAX_BYTES'] of
+results, and the least recently used results are removed first when it is full.
+
+"""
+
+import hashlib
+import json
+
+from django.db import IntegrityError
+from django.utils import timezone
+
+
+# changes to the plotting process that change results should bump this, so old results are not used
+CACHE_VERSION = 2
+
+# coordinates are rounded to this many decimal places of a metre before hashing
+PRECISION = 6
+
+
+def rlp_fingerprint(rlp):
+    """Returns bytes that are the same for any two RLPs (GeoDataFrames) with the same geometry.
+
+    The geometry is put in the same CRS that plotting uses, normalized so that the order of its
+    vertices and rings does not matter, and rounded.
+
+    """
+
+    import shapely
+
+    rlppolygon = rlp.to_crs(epsg=27700).geometry[0]
+    rlppolygon = shapely.normalize( shapely.set_precision(rlppolygon, 10**-PRECISION) )
+    return shapely.to_wkb(rlppolygon, output_dimension=2)
+
+
+def template_fingerprint(path):
+    """Returns the hash of the DXF template, which is the key of its compiled template."""
+
+    from .software.TemplateLibrary import file_hash
+
+    return file_hash(path).encode()
+
+
+def result_key(rlp, seed, template_path=None):
+    """Returns the key of the result of plotting on the RLP (a GeoDataFrame) with the given seed.
+
+    Houses are plotted from the DXF at "template_path", or the default DXF if it is None.
+    
+    """
+
+    from .software import InputBlocks
+    from .software.Main import website_block_types
+
+    blocktypes, proportions = website_block_types()
+    settings = json.dumps({
+        "version": CACHE_VERSION,
+        "blocktypes": [bt.toList() for bt in blocktypes],
+        "proportions": proportions,
+        "seed": seed,
+    }, sort_keys=True, default=str)
+
+    key = hashlib.sha256()
+    for part in (rlp_fingerprint(rlp), template_fingerprint(template_path or InputBlocks.DXF_PATH), settings.encode()):
+        # the length of each part keeps the parts from running into each other
+        key.update(len(part).to_bytes(8, "little"))
+        key.update(part)
+    return key.hexdigest()
+
+
+def get(key):
+    """Returns the cached result for the key, or None if there is none. Marks the result as used."""
+
+    from .models import CachedResult
+
+    cached = CachedResult.objects.filter(key=key).first()
+    if cached is None:
+        return None
+
+    CachedResult.objects.filter(pk=cached.pk).update(last_used=timezone.now())
+    return cached.result
+
+
+def put(key, result, max_bytes):
+    """Caches the result for the key, then removes the least recently used results until the cache fits in max_bytes."""
+
+    from .models import CachedResult
+
+    try:
+        CachedResult.objects.update_or_create(key=key, defaults={"result": result, "size": len(result), "last_used": timezone.now()})
+    except IntegrityError:
+        # another process cached the same result first
+        pass
+    evict(max_bytes)
+
+
+def evict(max_bytes):
+    """Removes the least recently used results until the cache fits in max_bytes.
+
+    A result larger than the whole cache is removed on its own, rather than pushing out every older result.
+
+    """
+
+    from .models import CachedResult
+
+    total, keep, full = 0, [], False
+    for pk, size in CachedResult.objects.order_by("-last_used").values_list("pk", "size"):
+        if size > max_bytes:
+            full = True
+            continue
+        total += size
+        if total > max_bytes:
+            full = True
+            break
+        keep.append(pk)
+
+    if full:
+        CachedResult.objects.exclude(pk__in=keep).delete()
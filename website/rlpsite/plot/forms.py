@@ -5,4 +5,5 @@ class ExampleForm(forms.Form):
 
 
 class RegionForm(forms.Form):
-    regionfile = forms.FileField()
\ No newline at end of file
+    regionfile = forms.FileField()
+    templatefile = forms.FileField(required=False, label="House template (DXF, optional)")
\ No newline at end of file
@@ -0,0 +1,314 @@
+"""Runs plotting jobs in the background, so that requests do not wait for houses to be plotted.
+
+Jobs are PlotJob rows in the database. Each web process has one dispatcher thread, which starts
+queued jobs in their own worker processes while fewer than MAX_CONCURRENT_JOBS jobs are running
+(counted in the database, so the cap holds across every web process). The dispatcher also stops
+the worker of a job that is cancelled or runs past its time limit.
+
+Each job has its own process rather than a place in a process pool, so that a job can be stopped
+without stopping any other job.
+
+Results are cached (see cache.py). A job whose result is cached is done as soon as it is submitted,
+and a queued job is not started while another job with the same key is running, so identical
+submissions only plot once and the waiting jobs take the result from the cache.
+
+Workers save the progress events of their job as PlotJobEvent rows, which views.job_events() streams
+to the browser.
+
+DXF templates are compiled once into the template cache (PLOT_JOBS['TEMPLATE_CACHE_DIR']), which every
+worker shares, so a DXF is only read by the first job that uses it (see software/TemplateLibrary.py).
+This includes DXFs uploaded with a Region.
+
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import cache
+
+
+POLL_SECONDS = 0.5
+
+# jobs marked as running for this much longer than their time limit have lost their dispatcher,
+# e.g. because the web process was restarted
+STALE_GRACE_SECONDS = 60
+
+
+def job_settings():
+    """Returns the PLOT_JOBS settings, with defaults for any that are not set."""
+
+    return {
+        'MAX_CONCURRENT_JOBS': 2,
+        'TIME_LIMIT': 600,
+        'CACHE_MAX_BYTES': 256 * 1024 * 1024,
+        'TEMPLATE_CACHE_DIR': os.path.join(settings.MEDIA_ROOT, 'templates'),
+        **getattr(settings, 'PLOT_JOBS', {}),
+    }
+
+
+# the template library of this process, made when it is first used
+_template_library = None
+
+
+def template_library():
+    """Returns the TemplateLibrary of this process, which keeps compiled templates in the template cache."""
+
+    global _template_library
+    from .software.TemplateLibrary import TemplateLibrary
+
+    if _template_library is None:
+        _template_library = TemplateLibrary(cache_dir=str(job_settings()['TEMPLATE_CACHE_DIR']))
+    return _template_library
+
+
+def template_path(region):
+    """Returns the path of the DXF uploaded with the region, or of the default DXF if none was uploaded."""
+
+    from .software import InputBlocks
+
+    return region.template.path if region.template else InputBlocks.DXF_PATH
+
+
+def event_to_json(event):
+    """Returns a progress event from plot_proportions_in_region() as json for the browser.
+
+    The rlp is sent as the coordinates of its exterior, and the layout so far as the coordinates of
+    the exterior of every polygon of every block, rounded to the centimetre.
+    
+    """
+
+    import numpy as np
+    import shapely
+
+    data = { key: value for key, value in event.items() if key not in ('region', 'layout') }
+    if 'region' in event:
+        data['region'] = np.round(shapely.get_coordinates(event['region'].exterior), 2).tolist()
+    if 'layout' in event:
+        footprints, fits = event['layout'].footprints()
+        polygons = event['layout'].to_world( footprints[~shapely.is_missing(footprints)] )
+        data['houses'] = [ np.round(shapely.get_coordinates(p.exterior), 2).tolist() for p in polygons ]
+    return json.dumps(data)
+
+
+def event_saver(job):
+    """Returns a progress callback for plot_proportions_in_region() that saves each event of the job as a PlotJobEvent.
+
+    Every 'fill' event holds all of the houses so far, so only the latest one is kept.
+
+    """
+
+    from .models import PlotJobEvent
+
+    last_fill = None
+    def progress(event):
+        nonlocal last_fill
+        saved = PlotJobEvent.objects.create(job=job, data=event_to_json(event))
+        if event['stage'] == 'fill':
+            if last_fill is not None:
+                PlotJobEvent.objects.filter(pk=last_fill).delete()
+            last_fill = saved.pk
+
+    return progress
+
+
+def run_job(job_id):
+    """Plots the houses of a job and saves them in the columnar format (see layouts.py). This runs in the job's worker process."""
+
+    # worker processes import this module before Django is set up, which is why models are imported in functions
+    import django
+    django.setup()
+
+    import geopandas
+    from .layouts import to_columnar
+    from .models import PlotJob
+    from .software.Main import startlayout
+
+    job = PlotJob.objects.get(pk=job_id)
+
+    progress = event_saver(job)
+
+    try:
+        rlp = geopandas.read_file(job.region.outer_polygon.path)
+        template = template_library().get(template_path(job.region))
+        houses = startlayout(rlp, seed=job.seed, progress=progress, template=template)
+        # the browser draws the houses on a Leaflet map, which uses longitude and latitude
+        layout = json.dumps(to_columnar(houses.to_crs(epsg=4326)), separators=(',', ':'))
+    except Exception:
+        PlotJob.objects.filter(pk=job_id, status=PlotJob.RUNNING).update(
+            status=PlotJob.FAILED, error=traceback.format_exc(), finished=timezone.now())
+        return
+
+    if job.key:
+        cache.put(job.key, layout, job_settings()['CACHE_MAX_BYTES'])
+
+    # a job that was cancelled while it finished keeps its status
+    PlotJob.objects.filter(pk=job_id, status=PlotJob.RUNNING).update(
+        status=PlotJob.DONE, result=layout, finished=timezone.now())
+
+
+class JobDispatcher():
+    """Starts queued jobs in worker processes and stops the ones that are cancelled or take too long."""
+
+    def __init__(self) -> None:
+        self.processes = {}
+        self.thread = None
+        self.lock = threading.Lock()
+        # workers are spawned rather than forked, as the web process has threads of its own
+        self.context = multiprocessing.get_context('spawn')
+
+
+    def start(self):
+        """Starts the dispatcher thread if it is not running already."""
+
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='plot-job-dispatcher', daemon=True)
+                self.thread.start()
+
+
+    def run(self):
+        """Checks on the jobs until the web process stops."""
+
+        while True:
+            close_old_connections()
+            try:
+                self.check_workers()
+                self.expire_stale_jobs()
+                self.start_queued_jobs()
+            except Exception:
+                traceback.print_exc()
+            time.sleep(POLL_SECONDS)
+
+
+    def check_workers(self):
+        """Stops workers of cancelled or timed out jobs, and cleans up workers that have exited."""
+
+        from .models import PlotJob
+
+        for job_id, process in list(self.processes.items()):
+            job = PlotJob.objects.get(pk=job_id)
+            elapsed = (timezone.now() - job.started).total_seconds()
+
+            if not process.is_alive():
+                process.join()
+                del self.processes[job_id]
+                # the worker saves its own result, so a running job here means the worker died
+                PlotJob.objects.filter(pk=job_id, status=PlotJob.RUNNING).update(
+                    status=PlotJob.FAILED, error="The worker stopped with exit code %s." % process.exitcode, finished=timezone.now())
+
+            elif job.status==PlotJob.CANCELLED or elapsed > job.time_limit:
+                process.terminate()
+                process.join()
+                del self.processes[job_id]
+                PlotJob.objects.filter(pk=job_id, status=PlotJob.RUNNING).update(
+                    status=PlotJob.TIMED_OUT, error="The job took longer than %s seconds." % job.time_limit, finished=timezone.now())
+
+
+    def expire_stale_jobs(self):
+        """Marks running jobs that no dispatcher is looking after as timed out, so they do not count towards the cap."""
+
+        from .models import PlotJob
+
+        now = timezone.now()
+        for job in PlotJob.objects.filter(status=PlotJob.RUNNING).exclude(pk__in=list(self.processes)):
+            if (now - job.started).total_seconds() > job.time_limit + STALE_GRACE_SECONDS:
+                PlotJob.objects.filter(pk=job.pk, status=PlotJob.RUNNING).update(
+                    status=PlotJob.TIMED_OUT, error="The job was lost by its web process.", finished=now)
+
+
+    def start_queued_jobs(self):
+        """Starts the oldest queued jobs while there is room under the cap."""
+
+        from .models import PlotJob
+
+        max_jobs = job_settings()['MAX_CONCURRENT_JOBS']
+        while PlotJob.objects.filter(status=PlotJob.RUNNING).count() < max_jobs:
+            # jobs wait for a running job with the same key, and then take its result from the cache
+            job = PlotJob.objects.filter(status=PlotJob.QUEUED).exclude(key__in=self.running_keys()).order_by('created', 'pk').first()
+            if job is None:
+                return
+            claimed = self.claim(job)
+
+            result = cache.get(job.key) if claimed and job.key else None
+            if result is not None:
+                PlotJob.objects.filter(pk=job.pk, status=PlotJob.RUNNING).update(
+                    status=PlotJob.DONE, result=result, finished=timezone.now())
+            elif claimed:
+                process = self.context.Process(target=run_job, args=(job.pk,), name='plot-job-%s' % job.pk, daemon=True)
+                process.start()
+                self.processes[job.pk] = process
+
+
+    def running_keys(self):
+        """Returns the keys of the running jobs as a queryset, which is only run as part of the query it is used in."""
+
+        from .models import PlotJob
+
+        return PlotJob.objects.filter(status=PlotJob.RUNNING).exclude(key='').values('key')
+
+
+    def claim(self, job):
+        """Marks the queued job as running. Returns True if it was claimed by this dispatcher.
+
+        Another dispatcher may claim the same job, or another job with the same key, at the same time.
+        Both are checked in the one UPDATE that claims the job, so only one dispatcher's update
+        succeeds and a job is never started while a job with its key is running. This relies on the
+        database running one write at a time, as SQLite does. The UPDATE is not wrapped in a
+        transaction with the SELECT before it, as SQLite cannot turn a reading transaction into a
+        writing one while another process is writing, and fails with "database is locked".
+
+        """
+
+        from .models import PlotJob
+
+        claimed = PlotJob.objects.filter(pk=job.pk, status=PlotJob.QUEUED).exclude(key__in=self.running_keys()).update(
+            status=PlotJob.RUNNING, started=timezone.now())
+        return bool(claimed)
+
+
+dispatcher = JobDispatcher()
+
+
+def submit(region, seed=0):
+    """Queues a job to plot houses on the region, and returns the job.
+
+    The job is done at once if its result is cached.
+    
+    """
+
+    import geopandas
+    from .models import PlotJob
+
+    try:
+        key = cache.result_key(geopandas.read_file(region.outer_polygon.path), seed, template_path(region))
+    except Exception:
+        # the worker reports why the file cannot be plotted, so the job is only left out of the cache
+        key = ''
+
+    job = PlotJob(region=region, seed=seed, key=key, time_limit=job_settings()['TIME_LIMIT'])
+    result = cache.get(key) if key else None
+    if result is not None:
+        job.status, job.result = PlotJob.DONE, result
+        job.started = job.finished = timezone.now()
+    job.save()
+
+    dispatcher.start()
+    return job
+
+
+def cancel(job):
+    """Cancels the job if it has not finished. Returns True if it was cancelled."""
+
+    from .models import PlotJob
+
+    cancelled = PlotJob.objects.filter(pk=job.pk, status__in=[PlotJob.QUEUED, PlotJob.RUNNING]).update(
+        status=PlotJob.CANCELLED, finished=timezone.now())
+    return bool(cancelled)
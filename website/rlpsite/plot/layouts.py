@@ -0,0 +1,118 @@
+"""Compact json formats for the houses of a finished job, which the browser draws with Leaflet.
+
+Jobs save their houses in the columnar format, which is much smaller than GeoJSON:
+    - coordinates are quantized to integers (1e-7 degrees is about a centimetre) and stored as the
+      differences between each coordinate and the one before it, which are mostly small numbers
+    - the closing coordinate of each ring is left out
+    - text columns like 'Section' are stored once for each distinct value, with a code for each polygon
+
+{
+    "format": "columnar",
+    "version": 1,
+    "crs": the crs of the coordinates,
+    "scale": coordinates are multiplied by this and rounded,
+    "origin": [x, y] that the first coordinate is relative to (after scaling),
+    "rings": the number of rings of each polygon,
+    "ring_lengths": the number of coordinates of each ring,
+    "coords": [dx0, dy0, dx1, dy1, ...],
+    "columns": { name: {"values": [distinct values], "codes": [index of the value of each polygon]} }
+}
+
+A layout in the columnar format can also be sent as GeoJSON (see columnar_to_geojson()).
+
+"""
+
+import gzip
+import json
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COLUMNAR_VERSION = 1
+
+# the columns of the houses that are sent to the browser
+COLUMNS = ["Section", "colors"]
+
+
+def to_columnar(houses, scale=10**7):
+    """Returns the polygons of the houses (a GeoDataFrame) in the columnar format, as a dict."""
+
+    import shapely
+
+    polygons = np.asarray(houses.geometry, dtype=object)
+    rings = [ [p.exterior] + list(p.interiors) for p in polygons ]
+    flat_rings = [ring for polygon_rings in rings for ring in polygon_rings]
+
+    # rings are closed, so the last coordinate is left out
+    coords = [ shapely.get_coordinates(ring)[:-1] for ring in flat_rings ]
+    coords = np.concatenate(coords) if coords else np.zeros((0, 2))
+
+    quantized = np.round(coords * scale).astype(np.int64)
+    origin = quantized.min(axis=0) if len(quantized) else np.zeros(2, dtype=np.int64)
+    deltas = np.diff(quantized - origin, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+
+    columns = {}
+    for name in COLUMNS:
+        if name in houses.columns:
+            values, codes = np.unique(houses[name].astype(str), return_inverse=True)
+            columns[name] = { "values": values.tolist(), "codes": codes.ravel().tolist() }
+
+    return {
+        "format": "columnar",
+        "version": COLUMNAR_VERSION,
+        "crs": houses.crs.to_string() if houses.crs is not None else None,
+        "scale": scale,
+        "origin": origin.tolist(),
+        "rings": [len(polygon_rings) for polygon_rings in rings],
+        "ring_lengths": [len(ring.coords)-1 for ring in flat_rings],
+        "coords": deltas.ravel().tolist(),
+        "columns": columns,
+    }
+
+
+def columnar_coordinates(layout):
+    """Returns the coordinates of every polygon of a layout in the columnar format, as lists of closed rings."""
+
+    deltas = np.asarray(layout["coords"], dtype=np.int64).reshape(-1, 2)
+    coords = (np.cumsum(deltas, axis=0) + layout["origin"]) / layout["scale"]
+
+    ring_ends = np.cumsum(layout["ring_lengths"])
+    rings = [ np.vstack((ring, ring[:1])).tolist() for ring in np.split(coords, ring_ends[:-1]) ] if len(ring_ends) else []
+
+    polygon_ends = np.cumsum(layout["rings"])
+    return [ rings[end-count:end] for count, end in zip(layout["rings"], polygon_ends) ]
+
+
+def columnar_to_geojson(layout, precision=7):
+    """Returns a layout in the columnar format as a GeoJSON FeatureCollection, with coordinates rounded to "precision" decimal places."""
+
+    features = []
+    for i, polygon in enumerate(columnar_coordinates(layout)):
+        properties = { name: column["values"][column["codes"][i]] for name, column in layout["columns"].items() }
+        coordinates = [ [ [round(x, precision), round(y, precision)] for x, y in ring ] for ring in polygon ]
+        features.append({ "type": "Feature", "properties": properties, "geometry": { "type": "Polygon", "coordinates": coordinates } })
+
+    return { "type": "FeatureCollection", "features": features }
+
+
+def encode(data, accept_encoding=""):
+    """Returns the data as compact json bytes, compressed with brotli or gzip if the client accepts them.
+
+    Returns (body, content_encoding), where content_encoding is None if the body is not compressed.
+    Brotli is only used if the brotli package is installed.
+
+    """
+
+    body = json.dumps(data, separators=(",", ":")).encode()
+    accepted = [encoding.split(";")[0].strip() for encoding in accept_encoding.split(",")]
+
+    if brotli is not None and "br" in accepted:
+        return brotli.compress(body), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=6), "gzip"
+    return body, None
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlotJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('cancelled', 'Cancelled'), ('timed_out', 'Timed out')], default='queued', max_length=16)),
+                ('time_limit', models.FloatField(help_text='Seconds the job may run for before it is stopped.')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('result', models.TextField(blank=True, help_text='The html of the plotted graph.')),
+                ('error', models.TextField(blank=True)),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='plot.region')),
+            ],
+        ),
+    ]
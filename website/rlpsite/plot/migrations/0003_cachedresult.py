@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plot', '0002_plotjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('result', models.TextField()),
+                ('size', models.IntegerField(help_text='The length of the result, which counts towards the size of the cache.')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('last_used', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='plotjob',
+            name='key',
+            field=models.CharField(blank=True, db_index=True, help_text="The key of the job's result in the cache (see cache.py).", max_length=64),
+        ),
+        migrations.AddField(
+            model_name='plotjob',
+            name='seed',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plot', '0004_plotjobevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='plotjob',
+            name='result',
+            field=models.TextField(blank=True, help_text='The plotted houses, as json in the columnar format (see layouts.py).'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plot', '0005_plotjob_result_layout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='region',
+            name='template',
+            field=models.FileField(blank=True, help_text='The DXF of the houses to plot, or blank for the default DXF.', upload_to=''),
+        ),
+    ]
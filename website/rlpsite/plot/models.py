@@ -1,4 +1,68 @@
 from django.db import models
 
 class Region(models.Model):
-    outer_polygon = models.FileField()
\ No newline at end of file
+    outer_polygon = models.FileField()
+    template = models.FileField(blank=True, help_text="The DXF of the houses to plot, or blank for the default DXF.")
+
+
+class PlotJob(models.Model):
+    """A request to plot houses on a Region, which is run in the background (see jobs.py)."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    TIMED_OUT = "timed_out"
+    STATUSES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+        (CANCELLED, "Cancelled"),
+        (TIMED_OUT, "Timed out"),
+    ]
+    FINISHED = [DONE, FAILED, CANCELLED, TIMED_OUT]
+
+    region = models.ForeignKey(Region, on_delete=models.CASCADE)
+    seed = models.IntegerField(default=0)
+    key = models.CharField(max_length=64, blank=True, db_index=True, help_text="The key of the job's result in the cache (see cache.py).")
+    status = models.CharField(max_length=16, choices=STATUSES, default=QUEUED)
+    time_limit = models.FloatField(help_text="Seconds the job may run for before it is stopped.")
+
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    result = models.TextField(blank=True, help_text="The plotted houses, as json in the columnar format (see layouts.py).")
+    error = models.TextField(blank=True)
+
+    def to_dict(self):
+        """Returns the state of the job without its result, for the status endpoint."""
+
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class PlotJobEvent(models.Model):
+    """A progress event of a running PlotJob, as json, which is streamed to the browser (see views.job_events)."""
+
+    job = models.ForeignKey(PlotJob, on_delete=models.CASCADE, related_name="events")
+    data = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
+
+
+class CachedResult(models.Model):
+    """The plotted houses of a job, kept so that the same submission is not plotted twice (see cache.py)."""
+
+    key = models.CharField(max_length=64, unique=True)
+    result = models.TextField()
+    size = models.IntegerField(help_text="The length of the result, which counts towards the size of the cache.")
+    created = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(db_index=True)
@@ -0,0 +1,296 @@
+"""Plots houses on many RLPs at once, from a directory of RLP files or one large GeoJSON FeatureCollection.
+
+RLPs are read one at a time as they are needed, rather than all at the start, and are plotted in a
+pool of processes with only a few RLPs waiting for each process, so memory stays bounded however
+many RLPs there are. Each layout is written to its own GeoJSON file in the output directory as soon
+as it is plotted.
+
+Every finished RLP gets a line in the manifest (manifest.jsonl in the output directory). Running
+the same command again after it was interrupted skips the RLPs that the manifest says are done,
+and tries the failed ones again.
+
+Usage, from this folder or as "python -m plot.software.BatchPlot" from website/rlpsite:
+
+    python BatchPlot.py <directory or FeatureCollection> <output directory> [--workers N] [--seed S] [--template DXF]
+
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+try:
+    from .Main import startlayout
+    from .TemplateLibrary import default_library
+    from ..software import InputBlocks
+
+except ImportError:
+    from Main import startlayout
+    from TemplateLibrary import default_library
+    import InputBlocks
+
+
+MANIFEST_NAME = "manifest.jsonl"
+
+# the file types of RLPs in a directory
+RLP_EXTENSIONS = (".geojson", ".json")
+
+# how much of a FeatureCollection is read at a time, in characters
+CHUNK_SIZE = 1 << 16
+
+# RLPs waiting for each worker process, so workers never wait for the next RLP to be read
+PENDING_PER_WORKER = 2
+
+
+def iter_features(f, chunk_size=CHUNK_SIZE):
+    """Yields (crs, feature) for each feature of a GeoJSON FeatureCollection in an open file, one at a time.
+
+    Only one feature (and a chunk of the file) is held at a time. "crs" is the name of the crs of the
+    FeatureCollection if it has a 'crs' member before its features, or EPSG:4326 as for any GeoJSON.
+
+    """
+
+    decoder = json.JSONDecoder()
+    buffer, position = "", 0
+    crs = "EPSG:4326"
+
+    def fill():
+        nonlocal buffer, position
+        chunk = f.read(chunk_size)
+        buffer, position = buffer[position:] + chunk, 0
+        return bool(chunk)
+
+    def skip(characters):
+        # skips whitespace and any of the characters, reading more of the file when the buffer runs out
+        nonlocal position
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] in characters):
+                position += 1
+            if position < len(buffer) or not fill():
+                return
+
+    def value():
+        # decodes the next json value, reading more of the file until all of it is in the buffer
+        # (a value that ends at the end of the buffer, like a number, may go on in the next chunk)
+        nonlocal position
+        while True:
+            try:
+                decoded, end = decoder.raw_decode(buffer, position)
+                if end < len(buffer):
+                    position = end
+                    return decoded
+            except json.JSONDecodeError:
+                pass
+            if not fill():
+                decoded, position = decoder.raw_decode(buffer, position)
+                return decoded
+
+    skip("{")
+    while position < len(buffer):
+        key = value()
+        skip(":")
+        if key != "features":
+            member = value()
+            if key == "crs":
+                crs = member.get("properties", {}).get("name", crs)
+            skip(",}")
+            continue
+
+        skip("[")
+        while position < len(buffer) and buffer[position] != "]":
+            yield crs, value()
+            skip(",")
+        position += 1
+        skip(",}")
+
+
+def rlp_id(feature, index):
+    """Returns the name of a feature of a FeatureCollection, from its id or its 'id' or 'name' property if it has one."""
+
+    properties = feature.get("properties") or {}
+    for name in (feature.get("id"), properties.get("id"), properties.get("name")):
+        if name is not None:
+            return str(name)
+    return "feature-%s" % index
+
+
+def iter_rlps(source):
+    """Yields (rlp_id, rlp) for every RLP in a directory of RLP files or a GeoJSON FeatureCollection.
+
+    "rlp" is the path of an RLP file, or (crs, feature) for a feature of a FeatureCollection. Either
+    is read into a GeoDataFrame by read_rlp() in the worker that plots it. Ids are the same every time
+    the same source is read, and so are the names of their output files (see file_name()), which are
+    unique even where the file system ignores case.
+
+    """
+
+    seen = set()
+    def unique(name):
+        candidate, copy = name, 1
+        while file_name(candidate).lower() in seen:
+            copy += 1
+            candidate = "%s-%s" % (name, copy)
+        seen.add(file_name(candidate).lower())
+        return candidate
+
+    if os.path.isdir(source):
+        for entry in sorted(os.scandir(source), key=lambda entry: entry.name):
+            if entry.is_file() and entry.name.lower().endswith(RLP_EXTENSIONS):
+                yield unique(os.path.splitext(entry.name)[0]), entry.path
+        return
+
+    with open(source, encoding="utf-8") as f:
+        for index, (crs, feature) in enumerate(iter_features(f)):
+            yield unique(rlp_id(feature, index)), (crs, feature)
+
+
+def read_rlp(rlp):
+    """Returns an RLP from iter_rlps() as a GeoDataFrame."""
+
+    import geopandas
+
+    if isinstance(rlp, str):
+        return geopandas.read_file(rlp)
+    crs, feature = rlp
+    return geopandas.GeoDataFrame.from_features([feature], crs=crs)
+
+
+def file_name(rlp_id):
+    """Returns the name of the output file of the RLP, which is its id with only characters that are safe in file names."""
+
+    return re.sub(r"[^A-Za-z0-9._-]", "_", rlp_id) + ".geojson"
+
+
+def output_path(output_dir, rlp_id):
+    """Returns the path of the layout of the RLP in the output directory."""
+
+    return os.path.join(output_dir, file_name(rlp_id))
+
+
+def read_manifest(output_dir):
+    """Returns the last manifest entry of every RLP in the output directory, as a dict keyed by rlp id.
+
+    A line that was only partly written when a run was interrupted is ignored.
+
+    """
+
+    entries = {}
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return entries
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            entries[entry["id"]] = entry
+    return entries
+
+
+def is_done(entry):
+    """Returns True if the manifest entry is of an RLP whose layout was written."""
+
+    return entry is not None and entry["status"] == "done" and os.path.exists(entry["output"])
+
+
+def plot_one(rlp_id, rlp, output_dir, seed=None, template_path=None):
+    """Plots houses on one RLP and writes them to the output directory. This runs in a worker process.
+
+    Returns the manifest entry of the RLP, which says why it failed if it did.
+
+    """
+
+    start = time.time()
+    path = output_path(output_dir, rlp_id)
+    entry = { "id": rlp_id, "output": path }
+
+    try:
+        template = default_library().get(template_path or InputBlocks.DXF_PATH)
+        houses = startlayout(read_rlp(rlp), seed=seed, template=template)
+
+        # the fronts are points, which GeoJSON properties cannot hold
+        houses = houses.drop("Front", axis=1, errors="ignore")
+        if houses.crs is not None:
+            houses = houses.to_crs(epsg=4326)
+
+        # the layout is written under another name first, so an interrupted run never leaves half of one
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.write(houses.to_json())
+        os.replace(temporary_path, path)
+        entry.update(status="done", houses=len(houses))
+    except Exception:
+        entry.update(status="failed", error=traceback.format_exc())
+
+    entry["seconds"] = round(time.time() - start, 3)
+    return entry
+
+
+def run_batch(source, output_dir, max_workers=None, seed=None, template_path=None, resume=True):
+    """Plots houses on every RLP from the source (see iter_rlps()) and writes each layout to the output directory.
+
+    RLPs that are done in the manifest are skipped if "resume" is True. Returns the number of RLPs
+    that were (done, failed, skipped) by this run.
+
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = read_manifest(output_dir) if resume else {}
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_workers * PENDING_PER_WORKER
+    counts = { "done": 0, "failed": 0, "skipped": 0 }
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), "a", encoding="utf-8") as manifest_file, \
+            ProcessPoolExecutor(max_workers=max_workers) as pool:
+
+        def record(entry):
+            # each entry is flushed to disk at once, so an interrupted run keeps every finished RLP
+            manifest_file.write(json.dumps(entry) + "\n")
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+            counts[entry["status"]] += 1
+            print("%s %s (%s s)" % (entry["status"].upper(), entry["id"], entry["seconds"]))
+
+        running = set()
+        for rlp_id, rlp in iter_rlps(source):
+            if resume and is_done(manifest.get(rlp_id)):
+                counts["skipped"] += 1
+                continue
+
+            # only a few RLPs wait for a worker at a time, so the source is not read faster than it is plotted
+            while len(running) >= max_pending:
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record(future.result())
+            running.add( pool.submit(plot_one, rlp_id, rlp, output_dir, seed, template_path) )
+
+        for future in wait(running).done:
+            record(future.result())
+
+    return counts["done"], counts["failed"], counts["skipped"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plots houses on every RLP in a directory or GeoJSON FeatureCollection.")
+    parser.add_argument("source", help="a directory of RLP GeoJSON files, or a GeoJSON FeatureCollection of RLPs")
+    parser.add_argument("output", help="the directory to write a layout for every RLP to, with the manifest")
+    parser.add_argument("--workers", type=int, default=None, help="the number of processes (one for each core by default)")
+    parser.add_argument("--seed", type=int, default=None, help="the seed of every RLP, so runs can be repeated")
+    parser.add_argument("--template", default=None, help="the DXF of the houses (the default DXF if not given)")
+    parser.add_argument("--no-resume", action="store_true", help="plot every RLP again, even if the manifest says it is done")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    done, failed, skipped = run_batch(args.source, args.output, args.workers, args.seed, args.template, resume=not args.no_resume)
+    print("%s done, %s failed, %s skipped in %.1f s" % (done, failed, skipped, time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
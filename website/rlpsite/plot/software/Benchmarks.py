@@ -0,0 +1,387 @@
+"""Times each stage of plotting on synthetic RLPs, so that changes which make plotting slower show up.
+
+Synthetic RLPs are made by synthetic_rlp() from a seed, so the same case is always the same RLP.
+They are convex, concave (star shaped), or L shaped, with any number of vertices, any area, and
+their longest edge at any angle. Most cases have their longest edge at a steep angle, as rows
+parallel to steep lines are where plotting has gone wrong before.
+
+Every case is plotted by plot_proportions_in_region(), and each stage is timed by the trace of the plot:
+    'rotation'      - finding the longest line, rotating the unit polygons, and preparing the region
+    'padding'       - findPadding()
+    'lattice'       - best_phase() and block_lattice(), which replaced the blocklines and their intersections
+    'initPlot'      - initPlot()
+    'plotNewBlocks' - one pass of plotNewBlocks() over every blockpoint, as plotting used to do
+    'fill'          - FillEngine.run(), which includes the two stages below
+    'fill.filter_blocks'    - filter_blocks() (and adding the blocks it keeps) while filling
+    'fill.move_blocks_left' - move_blocks_left() while filling
+    'output'        - Layout.to_gdf()
+
+Each case also records the number of blocks, the blocks placed per second (over every stage but
+'plotNewBlocks', which plotting no longer uses), and the peak memory of plotting it. Peak memory is
+measured in a separate run with tracemalloc, so it does not slow down the timings. It only counts
+memory that Python knows about (including numpy arrays), not the memory of GEOS geometries.
+
+Results are compared with a baseline JSON file in the "benchmarks" folder, and any stage that got
+slower (or any case whose number of blocks changed) is reported as a regression. Baselines are only
+comparable on the machine they were written on, with the same versions of Python, numpy, and shapely,
+which every baseline records. If the versions differ, a warning is printed and only the numbers of
+blocks are compared.
+
+Usage, from this folder or as "python -m plot.software.Benchmarks" from website/rlpsite:
+
+    python Benchmarks.py [--suite quick|full] [--repeat N] [--write-baseline] [--template DXF]
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import shapely
+
+try:
+    from ..software import PolygonFunctions, LineFunctions, BlockFunctions, InputBlocks
+    from .PlotOptimals import findPadding, plot_proportions_in_region
+    from .HRGenerator import indexweightrandom
+    from .Main import website_block_types
+    from .TemplateLibrary import TemplateLibrary
+
+except ImportError:
+    import PolygonFunctions, LineFunctions, BlockFunctions, InputBlocks
+    from PlotOptimals import findPadding, plot_proportions_in_region
+    from HRGenerator import indexweightrandom
+    from Main import website_block_types
+    from TemplateLibrary import TemplateLibrary
+
+
+X, Y = 0, 1
+
+EXAMPLE_DXF = InputBlocks.EXAMPLE_DXF_PATH
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+
+STAGES = ('rotation', 'padding', 'lattice', 'initPlot', 'plotNewBlocks', 'fill', 'fill.filter_blocks', 'fill.move_blocks_left', 'output')
+
+# the stages that plotting an RLP goes through, which blocks per second is worked out over
+PIPELINE_STAGES = ('rotation', 'padding', 'lattice', 'initPlot', 'fill', 'output')
+
+SQUARE_METRES_PER_HECTARE = 10000
+
+# a stage is only a regression if it is this much slower than the baseline, and slower by at least MIN_SECONDS
+TOLERANCE = 0.25
+MIN_SECONDS = 0.01
+
+# the parts of the machine that times depend on, which must match for times to be compared
+MACHINE_KEYS = ('processor', 'python', 'numpy', 'shapely')
+
+
+def case(shape, area_ha, vertices, angle, seed=0):
+    """Returns a benchmark case, which is the arguments of synthetic_rlp() with a name."""
+
+    return {
+        'name': "%s-%sha-%sv-%sdeg" % (shape, area_ha, vertices, angle),
+        'shape': shape,
+        'area_ha': area_ha,
+        'vertices': vertices,
+        'angle': angle,
+        'seed': seed,
+    }
+
+
+SUITES = {
+    'quick': [
+        case("convex", 0.1, 6, 80),
+        case("concave", 1, 24, 85),
+        case("L", 10, 64, 75),
+        case("convex", 25, 256, 89),
+        case("concave", 50, 128, 80),
+    ],
+}
+SUITES['full'] = SUITES['quick'] + [
+    case("L", 100, 256, 85),
+    case("concave", 250, 512, 80),
+    case("convex", 500, 1024, 88),
+]
+
+
+def synthetic_rlp(shape="convex", area_ha=10, vertices=16, angle=80, seed=0):
+    """Returns a synthetic RLP as a shapely Polygon moved to the origin (see PolygonFunctions.moveToOrigin()).
+
+    "shape" is one of:
+        'convex'  - vertices at random places on an ellipse
+        'concave' - a star, with vertices at random angles that are alternately far from and close to its center
+        'L'       - an L shape, with extra vertices spread along its edges
+
+    The polygon has "vertices" vertices (at least the few that its shape needs), an area of "area_ha"
+    hectares, and its longest edge at "angle" degrees to the horizontal.
+
+    """
+
+    rng = np.random.default_rng(seed)
+
+    if shape == "convex":
+        angles = np.sort( rng.uniform(0, 2*np.pi, max(vertices, 3)) )
+        coords = np.column_stack( (2*np.cos(angles), np.sin(angles)) )
+    elif shape == "concave":
+        points = max(vertices, 6)
+        angles = np.sort( rng.uniform(0, 2*np.pi, points) )
+        radii = np.where( np.arange(points) % 2 == 0, rng.uniform(0.9, 1.1, points), rng.uniform(0.4, 0.7, points) )
+        coords = np.column_stack( (radii*np.cos(angles), radii*np.sin(angles)) )
+    elif shape == "L":
+        outline = shapely.Polygon([ (0, 0), (3, 0), (3, 1), (1, 1), (1, 3), (0, 3) ])
+        if vertices > 6:
+            outline = shapely.segmentize(outline, outline.length / (vertices - 6))
+        coords = np.asarray(outline.exterior.coords[:-1])
+    else:
+        raise ValueError("Unknown shape '%s'." % shape)
+
+    polygon = shapely.Polygon(coords)
+
+    # the first longest edge is the one that findLongestLine() gives
+    edges = np.diff( np.asarray(polygon.exterior.coords), axis=0 )
+    longest = edges[ np.argmax(np.hypot(edges[:, X], edges[:, Y])) ]
+    turn = np.radians(angle) - np.arctan2(longest[Y], longest[X])
+    polygon = shapely.affinity.rotate(polygon, turn, origin='centroid', use_radians=True)
+
+    scale = np.sqrt( area_ha * SQUARE_METRES_PER_HECTARE / polygon.area )
+    polygon = shapely.affinity.scale(polygon, scale, scale, origin='centroid')
+    return PolygonFunctions.moveToOrigin(polygon)
+
+
+def time_plotNewBlocks(rlppolygon, unitPolygons, blocktypes, proportions, seed=0):
+    """Returns the seconds that one pass of plotNewBlocks() over every blockpoint of the rlppolygon takes.
+
+    The unit polygons should already be rotated to the longest line, as they are after plotting.
+    Only plotNewBlocks() is timed, and not the lattice it is given.
+
+    """
+
+    longestline = PolygonFunctions.findLongestLine(rlppolygon)
+    region = PolygonFunctions.PreparedRegion(rlppolygon, inset_distance=max([up.bounding_radius() for up in unitPolygons]))
+    blockpadding, rowpadding = findPadding(unitPolygons, longestline)
+    smallest_up = BlockFunctions.smallest_unit_polygon(unitPolygons)
+    phase, phase_counts = BlockFunctions.best_phase(region, longestline, blockpadding, rowpadding, smallest_up)
+    rows_of_bps = BlockFunctions.block_lattice(region, longestline, blockpadding, rowpadding, phase)
+    along, normal = LineFunctions.line_axes(LineFunctions.orderLine(longestline))
+    small_layout, blockpoints_as_rows = BlockFunctions.initPlot(False, rows_of_bps, unitPolygons, ax=None, region=region, along=along)
+
+    start = time.perf_counter()
+    numspaces = sum([len(row) for row in blockpoints_as_rows])
+    plotting_guide = indexweightrandom(numspaces, blocktypes, blockpoints_as_rows, rng=seed, counts=proportions)
+    BlockFunctions.plotNewBlocks(blockpoints_as_rows, unitPolygons, plotting_guide, None, region, along=along)
+    return time.perf_counter() - start
+
+
+def time_stages(rlppolygon, template, seed=0):
+    """Plots houses from the CompiledTemplate on the rlppolygon, timing each stage with the trace of the plot (see Tracing.py).
+
+    Returns (seconds of each stage as a dict, number of blocks).
+
+    """
+
+    blocktypes, proportions = website_block_types()
+    unitPolygons = [BlockFunctions.UnitPolygon.of_template(template)]
+    result = plot_proportions_in_region(blocktypes, unitPolygons, proportions, rlppolygon, ax=None, seed=seed)
+
+    totals = result.trace.totals()
+    seconds = { stage: totals.get(stage, 0) for stage in PIPELINE_STAGES }
+    seconds['fill.filter_blocks'] = totals.get('filter_blocks', 0)
+    seconds['fill.move_blocks_left'] = totals.get('move_blocks_left', 0)
+    seconds['plotNewBlocks'] = time_plotNewBlocks(rlppolygon, unitPolygons, blocktypes, proportions, seed)
+    return seconds, len(result.layout)
+
+
+def peak_memory(rlppolygon, template, seed=0):
+    """Returns the peak memory (in bytes) that tracemalloc sees while plotting houses from the CompiledTemplate on the rlppolygon."""
+
+    blocktypes, proportions = website_block_types()
+    unitPolygons = [BlockFunctions.UnitPolygon.of_template(template)]
+
+    tracemalloc.start()
+    try:
+        plot_proportions_in_region(blocktypes, unitPolygons, proportions, rlppolygon, ax=None, seed=seed)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_case(benchmark_case, template, repeat=1):
+    """Runs a benchmark case "repeat" times and returns its results as a dict.
+
+    The time of each stage is the fastest of the runs, as slower runs are slowed down by something else.
+
+    """
+
+    rlppolygon = synthetic_rlp(benchmark_case['shape'], benchmark_case['area_ha'], benchmark_case['vertices'], benchmark_case['angle'], benchmark_case['seed'])
+
+    seconds, blocks = {}, None
+    for run in range(repeat):
+        run_seconds, blocks = time_stages(rlppolygon, template, benchmark_case['seed'])
+        for stage, stage_seconds in run_seconds.items():
+            seconds[stage] = min(seconds.get(stage, stage_seconds), stage_seconds)
+    seconds = { stage: round(seconds.get(stage, 0), 6) for stage in STAGES }
+
+    total_seconds = sum([seconds[stage] for stage in PIPELINE_STAGES])
+    return {
+        **benchmark_case,
+        'vertices': len(rlppolygon.exterior.coords) - 1,
+        'blocks': blocks,
+        'seconds': seconds,
+        'total_seconds': round(total_seconds, 6),
+        'blocks_per_second': round(blocks / total_seconds, 1) if total_seconds else None,
+        'peak_memory_mb': round(peak_memory(rlppolygon, template, benchmark_case['seed']) / 2**20, 2),
+    }
+
+
+def run_suite(suite="quick", template_path=EXAMPLE_DXF, repeat=1, names=None):
+    """Runs every case of the suite (or only the named ones) and returns the results, which can be written as a baseline."""
+
+    template = TemplateLibrary().get(template_path)
+    results = {}
+    for benchmark_case in SUITES[suite]:
+        if names and benchmark_case['name'] not in names:
+            continue
+        results[benchmark_case['name']] = run_case(benchmark_case, template, repeat)
+
+    return {
+        'suite': suite,
+        'template': os.path.basename(template_path),
+        'repeat': repeat,
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'shapely': shapely.__version__,
+        },
+        'cases': results,
+    }
+
+
+def baseline_path(suite):
+    """Returns the path of the baseline of the suite."""
+
+    return os.path.join(BASELINE_DIR, "%s.json" % suite)
+
+
+def read_baseline(path):
+    """Returns the results in the baseline file, or None if there is no baseline."""
+
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_baseline(results, path):
+    """Writes the results to the baseline file."""
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+
+
+def machine_differences(results, baseline):
+    """Returns a list of how the machine of the results differs from the machine of the baseline (see MACHINE_KEYS), as strings."""
+
+    machine, old_machine = results['machine'], baseline.get('machine', {})
+    return [ "%s %s (the baseline has %s)" % (key, machine.get(key), old_machine.get(key)) for key in MACHINE_KEYS if machine.get(key) != old_machine.get(key) ]
+
+
+def compare(results, baseline, tolerance=TOLERANCE, min_seconds=MIN_SECONDS, times=True):
+    """Returns a list of the regressions of the results from the baseline, as strings.
+
+    A stage is a regression if it is more than "tolerance" (as a fraction) slower than in the baseline
+    and at least "min_seconds" slower, since very short stages are mostly noise. Peak memory is a
+    regression if it grew by more than "tolerance", and a different number of blocks always is.
+
+    If "times"=False, only the numbers of blocks are compared.
+
+    """
+
+    regressions = []
+    for name, result in results['cases'].items():
+        old = baseline['cases'].get(name)
+        if old is None:
+            continue
+
+        if result['blocks'] != old['blocks']:
+            regressions.append("%s: %s blocks instead of %s" % (name, result['blocks'], old['blocks']))
+        if not times:
+            continue
+
+        for stage, seconds in result['seconds'].items():
+            old_seconds = old['seconds'].get(stage)
+            if old_seconds is None:
+                continue
+            if seconds > old_seconds * (1+tolerance) and seconds - old_seconds >= min_seconds:
+                regressions.append("%s: %s took %.3f s instead of %.3f s" % (name, stage, seconds, old_seconds))
+
+        if result['peak_memory_mb'] > old['peak_memory_mb'] * (1+tolerance):
+            regressions.append("%s: peak memory was %.1f MB instead of %.1f MB" % (name, result['peak_memory_mb'], old['peak_memory_mb']))
+
+    return regressions
+
+
+def print_results(results, baseline=None):
+    """Prints a table of the results, with the change in total time from the baseline if it is given."""
+
+    print()
+    print("%-28s %7s %9s %11s %9s  %s" % ("case", "blocks", "seconds", "blocks/s", "peak MB", "vs baseline"))
+    for name, result in results['cases'].items():
+        change = ""
+        old = (baseline or {'cases': {}})['cases'].get(name)
+        if old is not None and old['total_seconds']:
+            change = "%+.0f%%" % (100 * (result['total_seconds'] / old['total_seconds'] - 1))
+        print("%-28s %7s %9.3f %11s %9.1f  %s" % (name, result['blocks'], result['total_seconds'], result['blocks_per_second'], result['peak_memory_mb'], change))
+
+        slowest = sorted(PIPELINE_STAGES, key=lambda stage: -result['seconds'][stage])
+        print("    " + ", ".join([ "%s %.3f s" % (stage, result['seconds'][stage]) for stage in slowest ]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Times each stage of plotting on synthetic RLPs and compares the times with a baseline.")
+    parser.add_argument("--suite", default="quick", choices=sorted(SUITES), help="the cases to run (quick by default)")
+    parser.add_argument("--case", action="append", dest="cases", help="only run the case with this name (may be given more than once)")
+    parser.add_argument("--repeat", type=int, default=3, help="how many times to time each case, keeping the fastest time of each stage (3 by default)")
+    parser.add_argument("--template", default=EXAMPLE_DXF, help="the DXF of the houses (the example DXF by default)")
+    parser.add_argument("--baseline", default=None, help="the baseline file (benchmarks/<suite>.json by default)")
+    parser.add_argument("--write-baseline", action="store_true", help="write the results as the new baseline instead of comparing with it")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="how much slower a stage may be than the baseline, as a fraction")
+    args = parser.parse_args(argv)
+
+    path = args.baseline or baseline_path(args.suite)
+    results = run_suite(args.suite, args.template, args.repeat, args.cases)
+
+    if args.write_baseline:
+        print_results(results)
+        write_baseline(results, path)
+        print("\nWrote the baseline to %s" % path)
+        return 0
+
+    baseline = read_baseline(path)
+    print_results(results, baseline)
+    if baseline is None:
+        print("\nThere is no baseline at %s to compare with." % path)
+        return 0
+
+    differences = machine_differences(results, baseline)
+    print()
+    if differences:
+        print("WARNING this machine has %s, so only the numbers of blocks are compared." % ", ".join(differences))
+    regressions = compare(results, baseline, args.tolerance, times=not differences)
+    for regression in regressions:
+        print("REGRESSION " + regression)
+    print("%s regressions from %s" % (len(regressions), path))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
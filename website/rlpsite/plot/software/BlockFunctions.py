@@ -1,22 +1,23 @@
 """Supporting functions when working with blocks (an abstraction over polygons)."""
 
-import matplotlib
 import geopandas.geoseries
-import matplotlib.pyplot as plt
 import geopandas
+import numpy as np
+import shapely
 
 from shapely import Polygon, LineString, affinity, Point
 from shapely import distance as dist
 from shapely.ops import unary_union
 
 try:
-    from ..software import PolygonFunctions, LineFunctions, InputBlocks
-    matplotlib.use('agg')
+    from ..software import PolygonFunctions, LineFunctions, InputBlocks, Tracing
+    from .Layout import Layout
 
     website_call = True
 
 except ImportError:
-    import PolygonFunctions, LineFunctions, InputBlocks
+    import PolygonFunctions, LineFunctions, InputBlocks, Tracing
+    from Layout import Layout
 
 X, Y = 0, 1
 linep1idx, linep2idx = 0, 1
@@ -30,10 +31,13 @@ class UnitPolygon():
     versatility of the actual "item_to_plot" being plotted.
 
     The "item_to_plot" being plotted can either be a polygon or a gdf, for now.
+
+    A gdf may come with the CompiledTemplate it was made from (see TemplateLibrary.py), which
+    rotates it and gives its area, center, and convex hull without measuring it again.
     
     """
 
-    def __init__(self, type, item_to_plot) -> None:
+    def __init__(self, type, item_to_plot, template=None) -> None:
         """Determines what the "item_to_plot" being plotted is."""
         
         if type=="gdf":
@@ -42,6 +46,18 @@ class UnitPolygon():
             self.type = type
         
         self.item_to_plot = item_to_plot
+        self.template = template
+        self.extents = {}
+        self.shapes = {}
+
+
+    @classmethod
+    def of_template(cls, template):
+        """Returns a gdf UnitPolygon of a *copy* of the dxfblock of a CompiledTemplate."""
+
+        up = cls(type="gdf", item_to_plot=template.dxfblock.copy(), template=template)
+        up.shapes = template.shapes()
+        return up
 
     
     def __move_single_polygon(self, polygon, blockpoint, polygon_to_fit_inside=None, geometry=None):
@@ -70,34 +86,72 @@ class UnitPolygon():
             return None
         
     
-    def __move_single_geometry(self, blockpoint, geometry, polygon_to_fit_inside=None):
-        """Returns the whole moved geometry as a list.
-        
-        Can be used to check if the whole moved geometry stays inside the polygon.
+    def move_many(self, blockpoints, polygon_to_fit_inside=None, rotations=None):
+        """Returns the item moved to each of the given points, and which of the moved items fit inside the polygon.
+
+        'Blockpoints' is a list of Point() objects or an (N, 2) array of coordinates.
+
+        Returns (footprints, fits). Footprints is an (N, P) array of polygons where P is the number of
+        polygons in the item (1 for a polygon). Fits is an (N,) boolean array which is True where every
+        polygon of the moved item is inside "polygon_to_fit_inside" (always True if it is not given).
+        "polygon_to_fit_inside" may be a polygon or a PreparedRegion.
+
+        "rotations" optionally gives an angle in radians for each point to rotate the item by
+        (anticlockwise, about its center) before moving it.
+
+        Empty Points never fit.
+
+        GDFs are centered at the origin once for the whole batch, and every polygon is moved in
+        a single vectorized call rather than corner by corner.
 
-        If any of the polygons don't fit, returns None.
-        
         """
 
+        anchors = blockpoints_to_coords(blockpoints)
 
-        blocks = []
-        for p in geometry:
-            corners = []
-            try:
-                for corner in p.exterior.coords[:-1]:
-                    corners.append( (corner[X]+blockpoint.coords[0][X] , corner[Y]+blockpoint.coords[0][Y]) )
-            except:
-                return None
-            block = Polygon(corners)
-            blocks.append(block)
+        if self.type not in ("polygon", "gdf"):
+            return None
+        parts = self.polygons()
+        center = self.center()
+
+        fits = ~np.isnan(anchors).any(axis=1)
+        num_anchors, num_parts = len(anchors), len(parts)
+        tiled = np.tile(parts, num_anchors)
+        coords_per_part = shapely.get_num_coordinates(tiled)
+        coord_anchors = np.repeat( np.repeat(np.where(fits[:, None], anchors, 0), num_parts, axis=0), coords_per_part, axis=0 )
+
+        if rotations is None or not np.any(rotations):
+            transform = lambda coords: coords-center+coord_anchors
+        else:
+            angles = np.repeat( np.repeat(np.broadcast_to(rotations, (num_anchors,)), num_parts), coords_per_part )
+            cos, sin = np.cos(angles), np.sin(angles)
+            def transform(coords):
+                centered = coords-center
+                rotated = np.column_stack( (cos*centered[:, X] - sin*centered[:, Y], sin*centered[:, X] + cos*centered[:, Y]) )
+                return rotated+coord_anchors
+        footprints = shapely.transform(tiled, transform).reshape(num_anchors, num_parts)
 
         if polygon_to_fit_inside:
-            for b in blocks:
-                if not polygon_to_fit_inside.contains(b):
-                    return None
-        return blocks
+            region = PolygonFunctions.PreparedRegion.of(polygon_to_fit_inside)
+            fits &= region.contains_many(footprints).all(axis=1)
+
+        return footprints, fits
+
+
+    def with_geometry(self, polygons):
+        """Returns a *copy* of the item with its polygons replaced by the given ones.
+
+        The given polygons must be in the same order as the polygons of the item.
+        
+        """
+
+        if self.type=="polygon":
+            return polygons[0]
+        elif self.type=="gdf":
+            copyblock = self.item_to_plot.copy()
+            copyblock.geometry = geopandas.GeoSeries(list(polygons), index=copyblock.geometry.index)
+            return copyblock
+
 
-    
     def move(self, blockpoint, polygon_to_fit_inside=None):
         """Returns a block that has been moved to the desired point. 'Blockpoint' is a Point() object or a gdf of Points.
 
@@ -108,10 +162,9 @@ class UnitPolygon():
     
         Optionally returns None if the block does not fit inside the polygon.
 
-        """
+        Moving to a single Point is a batch of one for move_many().
 
-        copyblock = self.item_to_plot.copy()
-        InputBlocks.centerDXFAtOrigin(copyblock)
+        """
 
         try:
             blockpoint.geometry
@@ -120,9 +173,12 @@ class UnitPolygon():
             bp_is_gdf = False
 
         if self.type=="polygon" and not bp_is_gdf:
-            return self.__move_single_polygon(self.item_to_plot, blockpoint, polygon_to_fit_inside)
+            footprints, fits = self.move_many([blockpoint], polygon_to_fit_inside)
+            return footprints[0][0] if fits[0] else None
 
         elif self.type=="gdf" and bp_is_gdf:
+            copyblock = self.item_to_plot.copy()
+            InputBlocks.centerDXFAtOrigin(copyblock)
             try:
                 moved_polygons = []
                 counter = 0
@@ -139,10 +195,10 @@ class UnitPolygon():
             return copyblock
         
         elif self.type=="gdf" and not bp_is_gdf:
-            result = self.__move_single_geometry(blockpoint=blockpoint, geometry=copyblock.geometry, polygon_to_fit_inside=polygon_to_fit_inside)
-            result = geopandas.GeoSeries(result, index=copyblock.geometry.index)
-            copyblock.geometry = result
-            return copyblock
+            footprints, fits = self.move_many([blockpoint], polygon_to_fit_inside)
+            if fits[0]:
+                return self.with_geometry(footprints[0])
+            return self.with_geometry([None]*len(footprints[0]))
 
         return None
 
@@ -221,6 +277,7 @@ class UnitPolygon():
             return PolygonFunctions.centerAtOrigin(self.item_to_plot)
         elif self.type=="gdf":
             InputBlocks.centerDXFAtOrigin(self.item_to_plot)
+            self.shapes = {}
             return self.item_to_plot
     
 
@@ -276,15 +333,21 @@ class UnitPolygon():
         
         The rotated item is parallel to the given line.
 
-        Centers the item at the origin normally.
+        Centers the item at the origin normally. Items with a template are rotated from the
+        template, which is already centered at the origin.
         
         """
 
 
         if self.type=="polygon":
             self.item_to_plot = PolygonFunctions.rotatePolygon(LineString(line), self.item_to_plot, showRotation=False)
+        elif self.type=="gdf" and self.template is not None:
+            self.item_to_plot = self.template.parallel_to(line)
+            self.extents, self.shapes = {}, self.template.shapes( self.template.angle_to(line) )
+            return self.item_to_plot
         elif self.type=="gdf":
             InputBlocks.dxf_parallel_to_ll(dxf=self.item_to_plot, center_at_origin=False, resultline=line)
+        self.extents, self.shapes = {}, {}
         
         if should_be_centered:
             return self.center_at_origin()
@@ -294,288 +357,785 @@ class UnitPolygon():
     def copy(self):
         """Returns a copy of this UnitPolygon instance."""
 
-        return UnitPolygon(type=self.type, item_to_plot=self.item_to_plot)
+        return UnitPolygon(type=self.type, item_to_plot=self.item_to_plot, template=self.template)
     
 
     def distance(self, up):
         """Returns the distance between the item of this and the item of another
         UnitPolygon."""
 
+
+    def polygons(self):
+        """Returns the polygons of the item as an array."""
+
+        if self.type=="polygon":
+            return np.array([self.item_to_plot], dtype=object)
+        elif self.type=="gdf":
+            return np.asarray(self.item_to_plot.geometry, dtype=object)
+
     
     def is_contained_by(self, polygon):
-        """Checks if the item is contained inside the polygon.
+        """Checks if the item is contained inside the polygon, which may be a PreparedRegion.
         
         Can be used to check if the whole moved geometry stays inside the polygon.
 
-        If any of the polygons don't fit, returns None.
+        If any of the polygons don't fit, returns False.
+        
+        """
+
+        region = PolygonFunctions.PreparedRegion.of(polygon)
+        return bool( region.contains_many(self.polygons()).all() )
+
+
+    def projection(self, direction):
+        """Returns how far the item reaches behind and ahead of its center along the given direction (a vector).
+
+        Returns (behind, ahead), where behind is negative. The center is the point that move_many()
+        moves to the blockpoints.
+
+        Only the vertices of the convex hull are projected, as the furthest points are always among them.
+        Results are cached for each direction until the item is rotated.
+        
+        """
+
+        (dx, dy) = direction
+        norm = np.hypot(dx, dy)
+        key = ( round(dx/norm, 12), round(dy/norm, 12) )
+
+        if key not in self.extents:
+            projected = (shapely.get_coordinates(self.convex_hull()) - self.center()) @ np.array(key)
+            self.extents[key] = (projected.min(), projected.max())
+        return self.extents[key]
+
+
+    def extent(self, direction):
+        """Returns the length of the item when projected onto the given direction (a vector).
+
+        This is the smallest distance a copy of the item can be moved along the direction
+        without overlapping the item, for any sideways offset between the two.
+        
+        """
+
+        behind, ahead = self.projection(direction)
+        return ahead - behind
+
+
+    def chord(self, direction):
+        """Returns the length of the item along the line through its center in the given direction (a vector).
+
+        Blocks in a row cover separate pieces of the row's line, so this is the least length of the
+        row's line that a block uses up.
+        
+        """
+
+        (dx, dy) = np.asarray(direction, dtype=float) / np.hypot(*direction)
+        behind, ahead = self.projection((dx, dy))
+        (cx, cy) = self.center()
+        line = LineString([ (cx + 2*behind*dx, cy + 2*behind*dy), (cx + 2*ahead*dx, cy + 2*ahead*dy) ])
+        return shapely.union_all(self.polygons()).intersection(line).length
+
+
+    def center(self):
+        """Returns the point of the item that move_many() moves to the blockpoints, as an array.
+        
+        This is the centroid of the union of polygons for gdfs, and the origin for polygons.
         
         """
 
         if self.type=="polygon":
-            return polygon.contains(self.item_to_plot)
+            return np.zeros(2)
         elif self.type=="gdf":
-            for p in self.item_to_plot.geometry:
-                if not polygon.contains(p):
-                    return False
-            return True
+            if 'center' not in self.shapes:
+                centroid = self.union().centroid
+                self.shapes['center'] = np.array([centroid.x, centroid.y])
+            return self.shapes['center']
+
 
+    def union(self):
+        """Returns the union of the polygons of the item.
+
+        The union, and the shapes made from it, are kept until the item is rotated.
         
+        """
 
-            
+        if 'union' not in self.shapes:
+            self.shapes['union'] = shapely.union_all(self.polygons())
+        return self.shapes['union']
 
-def blocklines(path, distance, rlppolygon, pathIsHorizontal, ax=None, longestline=None):
-    """Returns a list of all new lines, each from a point on the lines of the given path.
 
-    The points are equidistant from each other at a given distance.
-    
-    The new lines have the given gradient m.
+    def union_area(self):
+        """Returns the area of the union of the polygons of the item."""
+
+        if 'union_area' not in self.shapes:
+            self.shapes['union_area'] = self.union().area
+        return self.shapes['union_area']
+
+
+    def convex_hull(self):
+        """Returns the convex hull of the polygons of the item."""
+
+        if 'convex_hull' not in self.shapes:
+            self.shapes['convex_hull'] = self.union().convex_hull
+        return self.shapes['convex_hull']
+
+
+    def bounding_radius(self):
+        """Returns the radius of the circle around the bounding box of the item."""
+
+        minx, miny, maxx, maxy = shapely.total_bounds(self.polygons())
+        return np.hypot(maxx-minx, maxy-miny) / 2
+
+
+
+
+class PlacementIndex():
+    """Holds the polygons of every block placed so far, to quickly check if a new block collides with any of them.
+
+    Two blocks collide if they overlap by more than "tolerance" square units. Blocks that only
+    touch (like after moving blocks left) do not collide.
+
+    Checking a block is a bounding box query on STRtrees followed by an exact intersects check on
+    the prepared polygons of the block, so checking N blocks costs around N log N rather than N^2.
+    Only pairs whose bounding boxes overlap by more than the tolerance are intersected, starting
+    with the pair of each block whose boxes overlap the most.
+
+    STRtrees cannot be changed once built, so new polygons are first held in a small buffer which is
+    checked directly. A full buffer becomes a new tree, and trees of similar size are merged
+    into one, so there are only ever around log N trees.
     
     """
 
-    lines = []
-    p1 = path[0][linep1idx]
+    def __init__(self, polygons=None, num_blocks=0, buffer_size=64, tolerance=1e-6) -> None:
+        """Starts the index with the polygons of "num_blocks" blocks (as one array)."""
 
-    lleq = LineFunctions.lineEQ(longestline[linep1idx], longestline[linep2idx])
-    nleq = LineFunctions.normalLineEQ(lleq, p1)
+        self.buffer_size = buffer_size
+        self.tolerance = tolerance
+        self.levels = []
+        self.buffer = []
+        self.num_blocks = num_blocks
 
-    if pathIsHorizontal:
-        x = p1[X]
+        if polygons is not None and len(polygons):
+            polygons = np.asarray(polygons, dtype=object)
+            self.levels.append( (shapely.STRtree(polygons), polygons) )
 
-        points = []
-        while x < path[ -1+len(path) ][linep2idx][X]:
-            y = LineFunctions.lineyval(lleq, x)
-            points.append( (x,y) )
-            point = (x,y)
-            
-            nleq = LineFunctions.normalLineEQ(lleq, point)
-            newline = LineFunctions.leqtoline(nleq, rlppolygon)
-            lines.append(newline)
-            
-            x+=distance
 
-    else:
-        y = p1[Y]
+    @classmethod
+    def of_layout(cls, layout, footprints=None):
+        """Returns an index holding every block of the layout.
+        
+        "footprints" can be given if the footprints of the layout have already been made.
+        
+        """
 
-        points = []
-        while y > path[ -1+len(path) ][linep2idx][Y]:
-            x = LineFunctions.linexval(nleq, y)
-            points.append( (x,y) )
-            point = (x,y)
+        if footprints is None:
+            footprints, fits = layout.footprints()
+        polygons = footprints[~shapely.is_missing(footprints)]
+        return cls(polygons, num_blocks=len(layout))
 
-            lleq = LineFunctions.normalLineEQ(nleq, point)
-            newline = LineFunctions.leqtoline(lleq, rlppolygon)
-            lines.append(newline)
 
-            y-=distance
+    def __len__(self):
+        return self.num_blocks
 
-    return lines
-    
 
-def filter_blocks(block_ups_as_rows, smallest_up=None, replaceSmall=False):
-    """Filters the blocks by removing the ones that overlap with another block.
+    def add(self, polygons):
+        """Adds the polygons of a block to the index."""
+
+        self.buffer.extend(polygons)
+        self.num_blocks += 1
+
+        if len(self.buffer) >= self.buffer_size:
+            polygons = np.array(self.buffer, dtype=object)
+            self.buffer = []
+            while self.levels and len(self.levels[-1][1]) <= len(polygons):
+                polygons = np.concatenate( (self.levels.pop()[1], polygons) )
+            self.levels.append( (shapely.STRtree(polygons), polygons) )
+
+
+    def __overlapping(self, polygons, others):
+        """Returns a boolean array which is True where a pair of the given polygons overlaps by more than the tolerance."""
+
+        return shapely.area(shapely.intersection(polygons, others)) > self.tolerance
+
+
+    def __box_overlap(self, polygons, others):
+        """Returns how much the bounding boxes of each pair of the given polygons overlap, in square units."""
+
+        bounds, other_bounds = shapely.bounds(polygons), shapely.bounds(others)
+        width = np.minimum(bounds[:, 2], other_bounds[:, 2]) - np.maximum(bounds[:, 0], other_bounds[:, 0])
+        height = np.minimum(bounds[:, 3], other_bounds[:, 3]) - np.maximum(bounds[:, 1], other_bounds[:, 1])
+        return np.clip(width, 0, None) * np.clip(height, 0, None)
+
+
+    def collides(self, polygons):
+        """Returns True if the block with the given polygons collides with any block in the index."""
+
+        return bool( self.collides_many(np.asarray(polygons, dtype=object)[None, :])[0] )
+
+
+    def collides_many(self, footprints):
+        """Returns a boolean array which is True where a block collides with any block in the index.
+
+        "footprints" is an (N, P) array of the polygons of N blocks, padded with None (like
+        Layout.footprints()). The blocks are not checked against each other.
+        
+        """
+
+        footprints = np.asarray(footprints, dtype=object)
+        present = ~shapely.is_missing(footprints)
+        polygons = footprints[present]
+        owners = np.nonzero(present)[0]
+        shapely.prepare(polygons)
+
+        polygon_idxs, others = [np.zeros(0, dtype=int)], [np.zeros(0, dtype=object)]
+        for tree, indexed in self.levels:
+            level_idxs, tree_idxs = tree.query(polygons, predicate="intersects")
+            Tracing.count("predicates", len(polygons))
+            polygon_idxs.append(level_idxs)
+            others.append(indexed[tree_idxs])
+
+        if self.buffer:
+            buffered = np.array(self.buffer, dtype=object)
+            buffer_polygon_idxs, buffer_idxs = np.nonzero( shapely.intersects(polygons[:, None], buffered[None, :]) )
+            Tracing.count("predicates", len(polygons) * len(buffered))
+            polygon_idxs.append(buffer_polygon_idxs)
+            others.append(buffered[buffer_idxs])
+
+        polygon_idxs, others = np.concatenate(polygon_idxs), np.concatenate(others)
+        collisions = np.zeros(len(footprints), dtype=bool)
+
+        # two polygons never overlap by more than their bounding boxes do, which in a LocalFrame
+        # are close to the polygons themselves, so blocks that only touch are never intersected
+        box_overlap = self.__box_overlap(polygons[polygon_idxs], others)
+        candidates = np.flatnonzero(box_overlap > self.tolerance)
+        if not len(candidates):
+            return collisions
+        order = candidates[ np.argsort(-box_overlap[candidates], kind="stable") ]
+        polygon_idxs, others = polygon_idxs[order], others[order]
+        pair_owners = owners[polygon_idxs]
+
+        # the pair of each block whose boxes overlap the most is checked first, since it is the
+        # most likely to collide, and the other pairs only need checking if it does not
+        first = np.unique(pair_owners, return_index=True)[1]
+        collisions[ pair_owners[first] ] = self.__overlapping(polygons[polygon_idxs[first]], others[first])
+
+        rest = np.ones(len(pair_owners), dtype=bool)
+        rest[first] = False
+        rest &= ~collisions[pair_owners]
+        overlapping = self.__overlapping(polygons[polygon_idxs[rest]], others[rest])
+        collisions[ pair_owners[rest][overlapping] ] = True
+
+        return collisions
+
+
+def blockpoints_to_coords(blockpoints):
+    """Returns the blockpoints as an (N, 2) array of coordinates.
+
+    'Blockpoints' may be a list of Point() objects or anything array-like of shape (N, 2).
+    Empty Points become NaN coordinates.
     
-    Returns filtered blocks as rows.
+    """
 
-    Returns filtered blockpoints_as_rows (under same condition as filtered blocks).
+    blockpoints = np.asarray(blockpoints, dtype=object if len(blockpoints) and isinstance(blockpoints[0], Point) else float)
+    if blockpoints.dtype==object:
+        coords = np.full( (len(blockpoints), 2), np.nan )
+        present = ~shapely.is_empty(blockpoints)
+        coords[present] = shapely.get_coordinates(blockpoints[present])
+        return coords
+    return blockpoints.reshape(-1, 2)
+
+
+def lattice_frame(region, longestline):
+    """Returns the frame that the lattice of blockpoints is made in.
+
+    Returns (along, normal, (s_min, s_max), (t_min, t_max)), where "along" and "normal" are unit vectors
+    along and across the longest line, and the ranges are how far the region reaches along each of them.
     
     """
+
+    # rows run towards larger x as move_blocks_left() moves blocks towards smaller x
+    along, normal = LineFunctions.line_axes(LineFunctions.orderLine(longestline))
+    coords = shapely.get_coordinates(region.polygon.exterior)
+    s_coords, t_coords = coords @ along, coords @ normal
+    return along, normal, (s_coords.min(), s_coords.max()), (t_coords.min(), t_coords.max())
+
+
+def iter_block_lattice(region, longestline, blockpadding, rowpadding, phase=(0.5, 0.5), chunk_rows=64):
+    """Yields the blockpoints inside the region (a PreparedRegion) as rows, in chunks of at most "chunk_rows" rows.
+
+    The blockpoints are a grid in a frame rotated to the longest line, with "blockpadding" between
+    blockpoints in a row and "rowpadding" between rows. Each row is an (N, 2) array of coordinates
+    ordered along the longest line, and rows without any blockpoints are left out.
+
+    "phase" is where the first blockpoint and first row start, as a fraction of the padding
+    from the edge of the region.
+
+    Only one chunk of the grid exists at a time, so very large regions do not need much memory.
     
-    distinctblocks = []
+    """
 
-    for x in range(-1+len(block_ups_as_rows)):
-        row = []
-        for y in range(len( block_ups_as_rows[x] )):
-            
-            block_up = block_ups_as_rows[x][y]
-            keepBlock = True
-            shape_type = "UnitPolygon"
-            
-            prev = block_ups_as_rows[x][y-1]
+    along, normal, (s_min, s_max), (t_min, t_max) = lattice_frame(region, longestline)
+    s_vals = np.arange(s_min + phase[X]*blockpadding, s_max, blockpadding)
+    t_vals = np.arange(t_min + phase[Y]*rowpadding, t_max, rowpadding)
 
+    for start in range(0, len(t_vals), chunk_rows):
+        s_grid, t_grid = np.meshgrid(s_vals, t_vals[start:start+chunk_rows])
+        xs = s_grid*along[X] + t_grid*normal[X]
+        ys = s_grid*along[Y] + t_grid*normal[Y]
+        inside = shapely.contains_xy(region.polygon, xs, ys)
+        Tracing.count("predicates", inside.size)
 
-            if block_up.intersects(prev, shape_type=shape_type):
-                keepBlock=False
+        chunk = []
+        for row_xs, row_ys, row_inside in zip(xs, ys, inside):
+            if row_inside.any():
+                chunk.append( np.column_stack( (row_xs[row_inside], row_ys[row_inside]) ) )
+        yield chunk
 
-            for nextrowblock in block_ups_as_rows[x+1]:
-                if block_up.intersects(nextrowblock, shape_type=shape_type):
-                    keepBlock=False
 
-            if keepBlock:
-                row.append(block_up)
-            elif replaceSmall:
-                center = block_up.centroid()
-                new_block = smallest_up.move(blockpoint=center)
-                row.append( UnitPolygon(type=block_up.type, item_to_plot=new_block) )
+def _reach(up, direction):
+    """Returns how far the item reaches behind and ahead of its center along the line through its center in the direction.
 
-        distinctblocks.append(row)
-    distinctblocks.append( block_ups_as_rows[ -1+len(block_ups_as_rows) ] )
+    Only the piece of the line that holds the center counts, so two blocks in a row can be no closer
+    than how far the first reaches ahead plus how far the second reaches behind. Returns None if the
+    center is not in the item.
 
-    return distinctblocks
+    """
 
+    direction = np.asarray(direction, dtype=float) / np.hypot(*direction)
+    behind, ahead = up.projection(direction)
+    center = up.center()
+    line = LineString([ center + 2*(behind-1)*direction, center + 2*(ahead+1)*direction ])
+    pieces = shapely.get_parts( shapely.line_merge(shapely.intersection(up.union(), line)) )
+    for piece in pieces:
+        if piece.geom_type == "LineString" and piece.distance(Point(center)) < 1e-9:
+            projected = (shapely.get_coordinates(piece) - center) @ direction
+            return -projected.min(), projected.max()
+    return None
+
+
+def _lattice_region(region, along, normal):
+    """Returns the polygon of the region in the frame of the lattice, where rows are horizontal (see lattice_frame())."""
+
+    frame = np.array([along, normal])
+    return shapely.transform(region.polygon, lambda coords: coords @ frame.T)
 
-def append_blocks(block_ups_as_rows, current_plot):
-    """Filters the blocks by removing the ones that overlap with current blocks.
-    This essentially appends the blocks that can be appended.
 
-    "current_plot" must have the same number of rows as blocks_as_rows.
+def capacity_bound(region, longestline, unitPolygons, rowpadding, steps=8):
+    """Returns the most blocks that could fit in the rows of the lattice, without making any blocks.
 
-    Returns filtered blocks as rows.
+    Every block is centered on a row. A block can only be centered where every vertex of its convex
+    hull is inside the region, so each row is cut down to the pieces where some unit polygon fits
+    this way. Neighbouring blocks in a row are at least the smallest reach ahead plus the smallest
+    reach behind apart (see _reach()), which limits the blocks in each piece. The blocks also cannot
+    cover more than the area of the region.
 
-    Returns filtered blockpoints_as_rows (under same condition as filtered blocks).
+    Moving blocks along rows cannot beat this, so it is an upper bound for any layout with these rows.
+    Rows can start at any of the phases that best_phase() tries, so the bound is the largest bound of
+    those phases.
 
-    *****WARNING*****
-    *****PERFORMANCE ISSUE O(N^2) WHEN COMPARING b_a_r TO c_p*****
+    The unit polygons should already be rotated to the longest line.
+    
+    """
+
+    along, normal, (s_min, s_max), (t_min, t_max) = lattice_frame(region, longestline)
+    area_bound = int( region.polygon.area // min([up.union_area() for up in unitPolygons]) )
+
+    reaches = [ _reach(up, along) for up in unitPolygons ]
+    if None in reaches:
+        return area_bound
+    spacing = min([behind for behind, ahead in reaches]) + min([ahead for behind, ahead in reaches])
+    if spacing <= 0:
+        return area_bound
+
+    local_region = _lattice_region(region, along, normal)
+
+    best = 0
+    for phase in np.arange(steps) / steps:
+        t_vals = np.arange(t_min + phase*rowpadding, t_max, rowpadding)
+        fits = []
+        for up in unitPolygons:
+            offsets = (shapely.get_coordinates(up.convex_hull()) - up.center()) @ np.array([along, normal]).T
+            # where each vertex is inside the region along the rows, moved back to where the center would be
+            vertex_fits = []
+            for (a, b) in np.unique(offsets, axis=0):
+                lines = shapely.linestrings([ [ (s_min-1, t+b), (s_max+1, t+b) ] for t in t_vals ])
+                inside = shapely.intersection(local_region, lines)
+                vertex_fits.append( shapely.transform(inside, lambda coords: np.column_stack( (coords[:, X] - a, np.zeros(len(coords))) )) )
+            fits.append( shapely.intersection_all(np.stack(vertex_fits), axis=0) )
+        fits = shapely.union_all(np.stack(fits), axis=0) if len(fits) > 1 else fits[0]
+
+        pieces = shapely.get_parts(fits)
+        best = max( best, int( (np.floor(shapely.length(pieces) / spacing) + 1).sum() ) )
+
+    return min(best, area_bound)
+
+
+def _row_crossings(local_region, ys):
+    """Returns the pieces of the horizontal lines at "ys" that are inside the polygon or on its boundary, as (lines, starts, ends).
+
+    "lines" is the index in "ys" of the line of each piece. Edges are crossed by each line in numpy
+    rather than by intersecting shapes, which is much faster for polygons with many vertices. A line
+    along a horizontal edge only gets the pieces of the edge from one of the two ways edges are
+    counted (with or without their top vertex), so both are used and the pieces may overlap.
 
     """
 
-    distinctblocks = []
+    rings = [local_region.exterior] + list(local_region.interiors)
+    coords = [ np.asarray(ring.coords) for ring in rings ]
+    (x1, y1) = np.concatenate([ c[:-1] for c in coords ]).T
+    (x2, y2) = np.concatenate([ c[1:] for c in coords ]).T
+
+    lines, starts, ends = [], [], []
+    for crosses in ( lambda y: (y1 <= y) != (y2 <= y), lambda y: (y1 < y) != (y2 < y) ):
+        line_idxs, edge_idxs = np.nonzero( crosses(ys[:, None]) )
+        x = x1[edge_idxs] + (ys[line_idxs] - y1[edge_idxs]) * (x2[edge_idxs] - x1[edge_idxs]) / (y2[edge_idxs] - y1[edge_idxs])
+        # every line crosses the boundary an even number of times, so sorted crossings pair up into pieces
+        order = np.lexsort( (x, line_idxs) )
+        line_idxs, x = line_idxs[order], x[order]
+        lines.append(line_idxs[0::2]), starts.append(x[0::2]), ends.append(x[1::2])
+    return np.concatenate(lines), np.concatenate(starts), np.concatenate(ends)
+
+
+def _merge_pieces(groups, starts, ends):
+    """Returns the union of the pieces in each group, as (groups, starts, ends) of pieces that do not overlap."""
+
+    if len(groups) == 0:
+        return groups, starts, ends
+
+    order = np.lexsort( (starts, groups) )
+    groups, starts, ends = groups[order], starts[order], ends[order]
+    # the furthest end so far within each group, with each group moved past the ends of the one before
+    lowest, width = starts.min(), ends.max() - starts.min() + 1
+    reach = np.maximum.accumulate(ends - lowest + groups*width) - groups*width + lowest
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (groups[1:] != groups[:-1]) | (starts[1:] > reach[:-1])
+    last = np.roll(first, -1)
+    return groups[first], starts[first], reach[last]
+
+
+def count_feasible_blockpoints(region, longestline, blockpadding, rowpadding, unit_polygon, phases):
+    """Returns how many blockpoints of the lattice the unit polygon fits at, for each phase of the lattice.
+
+    "phases" is a (K, 2) array of phases (see iter_block_lattice()). No polygons are made: the unit
+    polygon fits at a blockpoint if the blockpoint and every vertex of its convex hull, moved to the
+    blockpoint, are inside the region or on its boundary, as blocks that touch the boundary fit (see
+    PreparedRegion.contains()). This is only exact for convex regions, but is close enough to compare
+    phases. Vertices that are outside the region only by float error are counted as inside, so no phase
+    is counted lower than it is by count_phase_fits(), but a phase can be counted higher.
+
+    The lattice is never made. For each phase of the rows, every row is cut down once to the pieces
+    where each vertex is in the region (see _row_crossings()), and then to where all of them are. The
+    blockpoints of every phase along the rows are counted in those pieces, so the phases of a row
+    share the work, and the work does not grow with the area of the region.
+
+    The unit polygon should already be rotated to the longest line.
+    
+    """
 
-    for x in range(-1+len(block_ups_as_rows)):
-        row = []
-        for y in range(len( block_ups_as_rows[x] )):
+    along, normal, (s_min, s_max), (t_min, t_max) = lattice_frame(region, longestline)
+    local_region = _lattice_region(region, along, normal)
+    vertices = np.vstack( (shapely.get_coordinates(unit_polygon.convex_hull()) - unit_polygon.center(), [[0, 0]]) )
+    offsets = np.unique( vertices @ np.array([along, normal]).T, axis=0 )
+    num_vertices = len(offsets)
+    phases = np.asarray(phases, dtype=float).reshape(-1, 2)
+
+    # vertices a hair outside the region are counted too, as they may only be outside up to float error
+    tolerance = 1e-9 * (s_max - s_min + t_max - t_min)
+
+    counts = np.zeros(len(phases), dtype=int)
+    for row_phase in np.unique(phases[:, Y]):
+        t_vals = np.arange(t_min + row_phase*rowpadding, t_max, rowpadding)
+        # lines just above and below each vertex of each row, with their pieces moved back to where the center would be
+        ys = ( t_vals[:, None, None] + offsets[None, :, None, Y] + np.array([-tolerance, tolerance]) ).ravel()
+        lines, starts, ends = _row_crossings(local_region, ys)
+        Tracing.count("predicates", len(ys))
+        groups = lines // 2
+        shift = offsets[groups % num_vertices, X]
+        groups, starts, ends = _merge_pieces(groups, starts - shift - tolerance, ends - shift + tolerance)
+
+        # the center fits where the pieces of every vertex of its row overlap, which is where as many
+        # pieces have started as there are vertices (pieces of a row are sorted, and start before they end)
+        rows = np.tile(groups // num_vertices, 2)
+        positions = np.concatenate( (starts, ends) )
+        steps = np.concatenate( (np.ones(len(starts), dtype=int), -np.ones(len(ends), dtype=int)) )
+        order = np.lexsort( (-steps, positions, rows) )
+        positions, covered = positions[order], np.cumsum(steps[order])
+        opens = np.flatnonzero(covered == num_vertices)
+        fit_starts, fit_ends = positions[opens], positions[opens+1]
+
+        for k in np.flatnonzero(phases[:, Y] == row_phase):
+            first_s = s_min + phases[k, X]*blockpadding
+            # the blockpoints of a row are first_s + i*blockpadding for i from 0 while they are before s_max
+            first = np.maximum( np.ceil((fit_starts - first_s)/blockpadding), 0 )
+            last = np.minimum( np.floor((fit_ends - first_s)/blockpadding), np.ceil((s_max - first_s)/blockpadding) - 1 )
+            counts[k] = int( np.maximum(last - first + 1, 0).sum() )
+
+    return counts
+
+
+def count_phase_fits(region, longestline, blockpadding, rowpadding, unit_polygon, phase):
+    """Returns how many blockpoints of the lattice at the phase the unit polygon fits at, checking the blockpoints themselves.
+
+    This is the count of count_feasible_blockpoints() for a single phase, with the same predicates as
+    placing the blocks: the blockpoints come from iter_block_lattice(), a chunk at a time, and the
+    vertices of the convex hull are only checked for blockpoints that are not in the inset of the
+    region (see PreparedRegion), where every block fits.
 
-            block_up = block_ups_as_rows[x][y]
-            keepBlock = True
-            shape_type = "UnitPolygon"
+    """
 
-            current_row = current_plot[x]
-            for cur in current_row:
-                if block_up.intersects(cur, shape_type=shape_type):
-                    keepBlock = False
-            
-            prev = block_ups_as_rows[x][y-1]
-            if block_up.intersects(prev, shape_type=shape_type):
-                keepBlock=False
+    vertices = shapely.get_coordinates(unit_polygon.convex_hull()) - unit_polygon.center()
+    use_inset = region.inset is not None and np.hypot(vertices[:, X], vertices[:, Y]).max() <= region.inset_distance
+
+    count = 0
+    for chunk in iter_block_lattice(region, longestline, blockpadding, rowpadding, phase):
+        if not chunk:
+            continue
+        blockpoints = np.concatenate(chunk)
+        if use_inset:
+            deep = shapely.contains_xy(region.inset, blockpoints[:, X], blockpoints[:, Y])
+            count += np.count_nonzero(deep)
+            blockpoints = blockpoints[~deep]
+        points = blockpoints[:, None, :] + vertices[None, :, :]
+        inside = shapely.intersects_xy(region.polygon, points[..., X], points[..., Y])
+        Tracing.count("predicates", len(blockpoints) + inside.size)
+        count += np.count_nonzero(inside.all(axis=1))
+    return count
+
+
+def best_phase(region, longestline, blockpadding, rowpadding, unit_polygon, steps=8):
+    """Returns the phase of the lattice where the unit polygon fits at the most blockpoints, and the counts of every phase tried.
+
+    Phases are tried in a grid of "steps" by "steps" fractions of the padding. Every phase is counted
+    at once by count_feasible_blockpoints(), and then the phases with the highest counts are checked
+    with count_phase_fits(), from the highest down, until no phase left is counted higher than the
+    best one checked. The counts of the phases that were checked are the checked counts.
+
+    The usual phase of (0.5, 0.5) is tried first, so it is kept unless another phase is strictly better.
+    
+    """
 
-            for nextrowblock in block_ups_as_rows[x+1]:
-                if block_up.intersects(nextrowblock, shape_type=shape_type):
-                    keepBlock=False
+    fractions = np.arange(steps) / steps
+    phases = np.array( [(0.5, 0.5)] + [(dx, dy) for dx in fractions for dy in fractions if (dx, dy)!=(0.5, 0.5)] )
+    counts = count_feasible_blockpoints(region, longestline, blockpadding, rowpadding, unit_polygon, phases)
 
-            if keepBlock:
-                row.append(block_up)
+    best = None
+    # phases are checked from the highest count down, and in their order among equal counts
+    for k in np.argsort(-counts, kind="stable"):
+        if best is not None and (counts[k], -k) <= (counts[best], -best):
+            break
+        counts[k] = count_phase_fits(region, longestline, blockpadding, rowpadding, unit_polygon, phases[k])
+        if best is None or (counts[k], -k) > (counts[best], -best):
+            best = k
+    return tuple(phases[best]), dict(zip(map(tuple, phases), counts))
 
-        distinctblocks.append(row)
-    distinctblocks.append( block_ups_as_rows[ -1+len(block_ups_as_rows) ] )
 
-    return distinctblocks
+def block_lattice(region, longestline, blockpadding, rowpadding, phase=(0.5, 0.5)):
+    """Returns all blockpoints inside the region as rows (see iter_block_lattice())."""
 
+    return [row for chunk in iter_block_lattice(region, longestline, blockpadding, rowpadding, phase) for row in chunk]
+    
 
-def initPlot(make_smallblocks, rows_of_bps, unitPolygons, ax, rlppolygon, showInit=False):
-    """Returns blockpoints (as rows) that will be included in next iteration.
+def filter_blocks(layout, smallest_up=None, replaceSmall=False, placement_index=None):
+    """Filters the blocks of the layout by removing the ones that overlap with another block.
+    
+    Returns the filtered blocks as a new Layout.
 
-    Creates an initial plot which only uses the smallest blocktype.
+    Blocks are kept row by row, and a block is only kept if it does not collide with any block kept
+    before it (or any block already in "placement_index"). Kept blocks are added to the index.
 
-    This method is mostly just to see which blockpoints are not invalid for plotting
-    (like blockpoints that cause overlaps with the polygon).
+    If "replaceSmall"=True, a removed block is replaced by the smallest block if that fits instead.
     
     """
 
+    if placement_index is None:
+        placement_index = PlacementIndex()
+
+    footprints, fits = layout.footprints()
+    if replaceSmall:
+        smallest = layout.templates.index(smallest_up)
+        small_layout = layout.copy()
+        small_layout.blocks['template'] = smallest
+        small_footprints, small_fits = small_layout.footprints()
+
+    kept = []
+    templates = layout.blocks['template'].copy()
+    for row in layout.rows():
+        for i in row:
+            polygons = layout.polygons(footprints[i])
+
+            if not placement_index.collides(polygons):
+                placement_index.add(polygons)
+                kept.append(i)
+
+            elif replaceSmall:
+                polygons = layout.polygons(small_footprints[i])
+                if not placement_index.collides(polygons):
+                    placement_index.add(polygons)
+                    templates[i] = smallest
+                    kept.append(i)
+
+    filtered = layout.copy()
+    filtered.blocks['template'] = templates
+    filtered.keep( np.array(kept, dtype=int) )
+    return filtered
+
+
+def append_blocks(layout, current_plot, placement_index=None):
+    """Filters the blocks by removing the ones that overlap with current blocks.
+    This essentially appends the blocks that can be appended.
+
+    "layout" and "current_plot" are Layouts with the same templates.
+
+    Returns the filtered blocks as a new Layout.
+
+    "placement_index" should hold the blocks of "current_plot", and is made from them if it is not given.
+    Appended blocks are added to the index.
+
+    """
+
+    if placement_index is None:
+        placement_index = PlacementIndex.of_layout(current_plot)
+
+    return filter_blocks(layout, placement_index=placement_index)
+
+
+def smallest_unit_polygon(unitPolygons):
+    """Returns the unit polygon with the smallest area."""
+
     smallest_up = unitPolygons[0]
     for up in unitPolygons:
         if up.area() < smallest_up.area():
             smallest_up = up
+    return smallest_up
 
-    filtered_blockpoints_as_rows = []
-    distinctblock_ups = []
+
+def initPlot(make_smallblocks, rows_of_bps, unitPolygons, ax, region, showInit=False, along=(1, 0)):
+    """Returns blockpoints (as rows of coordinate arrays) that will be included in next iteration.
+
+    Creates an initial plot (a Layout) which only uses the smallest blocktype.
+
+    This method is mostly just to see which blockpoints are not invalid for plotting
+    (like blockpoints that cause overlaps with the polygon). Each row is moved as one batch.
+
+    "region" is the PreparedRegion for the RLP, and "along" is the direction rows run in.
     
+    """
+
+    smallest_up = smallest_unit_polygon(unitPolygons)
+    smallest = unitPolygons.index(smallest_up)
+
+    filtered_blockpoints_as_rows = []
+    small_layout = Layout(unitPolygons, along)
+
+    for x in range(len(rows_of_bps)):
+        coords = blockpoints_to_coords(rows_of_bps[x])
+        footprints, fits = smallest_up.move_many(coords, polygon_to_fit_inside=region)
+        filtered_blockpoints_as_rows.append(coords[fits])
+        if make_smallblocks:
+            small_layout.add(smallest, coords[fits], x)
+
+    distinct_layout = Layout(unitPolygons, along)
     if make_smallblocks:
-        block_ups = []
-        for row in rows_of_bps:
-            newbprow = []
-            newblockrow = []
-            for blockpoint in row:
-                block = smallest_up.move(blockpoint=blockpoint)
-                # block = move_block_to_point(smallest_up, blockpoint, rlppolygon)
-                if block is not None:
-                    newblockrow.append( UnitPolygon(type=smallest_up.type, item_to_plot=block) )
-                    newbprow.append(blockpoint)
-            block_ups.append(newblockrow)
-            filtered_blockpoints_as_rows.append(newbprow)
-
-        distinctblock_ups = filter_blocks(block_ups)
-    else:
-        for row in rows_of_bps:
-            newbprow = []
-            for blockpoint in row:
-                block = smallest_up.move(blockpoint=blockpoint)
-                if block is not None:
-                    newbprow.append(blockpoint)
-            filtered_blockpoints_as_rows.append(newbprow)
+        distinct_layout = filter_blocks(small_layout)
 
     if showInit:
-        geopandas.GeoSeries([db.exterior for row in distinctblock_ups for db in row]).plot(ax=ax, color="green")
-    return distinctblock_ups, filtered_blockpoints_as_rows
+        footprints, fits = distinct_layout.footprints()
+        geopandas.GeoSeries(shapely.boundary(footprints[:, 0])).plot(ax=ax, color="green")
+    return distinct_layout, filtered_blockpoints_as_rows
 
 
-def plotNewBlocks(rows_of_bps, unitPolygons, plotting_guide, ax, rlppolygon, current_plot=None, showBlocks=False):
+def plotNewBlocks(rows_of_bps, unitPolygons, plotting_guide, ax, region, current_plot=None, showBlocks=False, placement_index=None, along=(1, 0)):
     """Plots a variety of blocktypes using weightedrandomness and a plotting guide.
+
+    Returns every plotted block as a Layout, including the ones in "current_plot" (a Layout).
     
-    Blocks cannot be placed if they cause overlap.
+    Blocks cannot be placed if they cause overlap or if they are outside the region (a PreparedRegion).
+    "placement_index" may hold the blocks of "current_plot" (see append_blocks()).
+
+    Blocks are only made from the plotting guide; their polygons are made in one batch for each
+    blocktype just to check that they fit.
     
     """
 
-    block_ups_as_rows = []
+    new_layout = Layout(unitPolygons, along)
 
     for x in range(len(rows_of_bps)):
+        guide = np.minimum( np.asarray(plotting_guide[x], dtype=int), -1+len(unitPolygons) )
+        coords = blockpoints_to_coords(rows_of_bps[x])
+        new_layout.add(guide, coords, x)
 
-        row = []
-        for y in range(len( rows_of_bps[x] )):
-            bp = rows_of_bps[x][y]
-            bt = min(plotting_guide[x][y], -1+len(unitPolygons))
-            up = unitPolygons[bt]
+    footprints, fits = new_layout.footprints(region=region)
+    new_layout.keep(fits)
 
-            block_dxf = up.move(blockpoint=bp, polygon_to_fit_inside=rlppolygon)
-            
-            if not None in list(block_dxf.geometry):
-                block_up = UnitPolygon(type=up.type, item_to_plot=block_dxf)
-                row.append(block_up)
-
-        block_ups_as_rows.append(row)
-    
-
-    smallest_up = unitPolygons[0]
-    for up in unitPolygons:
-        if up.area() < smallest_up.area():
-            smallest_up = up
-    
     if current_plot:
-        appended_blocks = append_blocks(block_ups_as_rows, current_plot)
-
-        distinctblocks = []
-        for i in range(len(current_plot)):
-            distinctblocks += [current_plot[i]+appended_blocks[i]]
+        distinctblocks = current_plot.copy()
+        distinctblocks.extend( append_blocks(new_layout, current_plot, placement_index) )
         
     else:
-        distinctblocks = filter_blocks(block_ups_as_rows, smallest_up, replaceSmall=True)
-        print("passed distinct")
+        smallest_up = smallest_unit_polygon(unitPolygons)
+        distinctblocks = filter_blocks(new_layout, smallest_up, replaceSmall=True)
 
     if showBlocks:
-        geopandas.GeoSeries([block.exterior for row in distinctblocks for block in row]).plot(ax=ax, color="green")
+        footprints, fits = distinctblocks.footprints()
+        geopandas.GeoSeries(shapely.boundary(footprints[:, 0])).plot(ax=ax, color="green")
     return distinctblocks
 
 
-def move_blocks_left(block_ups_as_rows, rlppolygon, ax=None):
-    """Changes the input parameter to move all blocks left until they touch to open up space for more blocks.
-    
-    TODO: Move first point of each row to be closer to the edge of the polygon.
+def move_blocks_left(layout, region, ax=None, rows=None, clearance=1e-6):
+    """Changes the layout to move all blocks left until they touch to open up space for more blocks.
+
+    The blocks of a row are all on one line, so each template only needs to be projected onto the
+    row once (see Layout.projections()). The closest two neighbouring blocks can be is then how far the
+    first reaches ahead plus how far the second reaches behind, and every block in a row is moved in one
+    pass as a sweep along the row: each block moves back until it touches the block before it.
+
+    The first block of each row is moved back until it touches the edge of the region (less the
+    clearance), so the space before it can be used too.
+
+    A block that would be moved outside the region (a PreparedRegion) stays where it is instead, and the
+    blocks after it are moved towards it.
+
+    Only the rows with the given row numbers are moved if "rows" is given.
+
+    Returns the indexes of the blocks that moved.
     
     """
 
-    for row in block_ups_as_rows:
-        # range(1, len(row)), but later will have separate way to make first block to touch the polygon inshaallah
-        for i in range(1, len(row)):
-            prev = row[i-1]
-            cur = row[i]
-
-            try:
-                block = cur.move_to(prev)
-            except Exception as e:
-                print("\n\n\n")
-                print("Exception:", e)
-                print("prev:")
-                print(prev.item_to_plot)
-                print("cur:")
-                print(cur.item_to_plot)
-                print("\n")
-
-            row[i] = UnitPolygon(type=cur.type, item_to_plot=block)
\ No newline at end of file
+    moved = []
+
+    for row in layout.rows():
+        if rows is not None and layout.blocks['row'][row[0]] not in rows:
+            continue
+
+        coords = layout.coords(row)
+        position = coords @ layout.along
+        behind, ahead = layout.projections(row)
+        # the smallest distance between the centers of neighbouring blocks
+        spacing = np.concatenate( ([0], ahead[:-1] - behind[1:]) )
+
+        footprints, fits = layout.footprints(row[:1])
+        snap = region.distance_to_boundary(footprints[0], -layout.along) - clearance
+        if not np.isfinite(snap) or snap < 0:
+            snap = 0
+
+        start, new_position = 0, position.copy()
+        new_position[0] -= snap
+        while True:
+            # the sweep from the start block onwards, where each block is at most its spacing after the one before it
+            offsets = np.cumsum(spacing[start:]) - spacing[start]
+            new_position[start:] = np.minimum.accumulate( np.concatenate(( new_position[start:start+1], position[start+1:] - offsets[1:] )) ) + offsets
+
+            shifts = position - new_position
+            layout.set_coords( row, coords - shifts[:, None]*layout.along )
+            footprints, fits = layout.footprints(row, region=region)
+            outside = np.flatnonzero(~fits & (shifts > 0))
+            if not len(outside):
+                break
+
+            # a block that would leave the region stays where it is and starts a new sweep
+            start = outside[0]
+            new_position[start] = position[start]
+
+        # blocks that already touch can be moved by tiny distances rather than 0
+        moved.extend( row[shifts > 1e-9] )
+
+    return np.array(moved, dtype=int)
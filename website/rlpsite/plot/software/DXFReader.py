@@ -0,0 +1,302 @@
+"""Reads the houses in a DXF file by going through the file once and only keeping what houses are made of.
+
+geopandas (GDAL) makes a row for every entity in a DXF, which is slow and uses a lot of memory for
+DXFs that hold many house types. This reader goes through the tags of the file one entity at a time
+and only keeps the hatches on the layers of houses (see LAYERS), and the INSERTs of blocks. Every
+other entity is skipped as soon as its layer is known, and every other section is skipped entirely.
+
+Each house type is a block. A block can insert other blocks (like a shared parking space), which are
+moved into the block that inserts them. Blocks that are only inserted by other blocks are parts of
+house types rather than house types. Houses drawn straight into the model space (like in
+House_plotting_example.dxf) are one more house type, called MODEL_SPACE.
+
+Like geopandas, the polygons of a house are its hatches: lines that outline a house are ignored.
+
+*****ONLY ASCII DXFs ARE READ, AND ONLY THE 2D SHAPE OF ENTITIES IS USED*****
+
+"""
+
+import geopandas
+import numpy as np
+
+from shapely import Polygon, LinearRing, affinity
+
+
+X, Y = 0, 1
+
+# the layers that houses are made of (see InputBlocks.set_up_colors())
+LAYERS = ('GARDEN', 'HOUSE NEW', 'PARKING')
+
+# the name of the house type drawn straight into the model space
+MODEL_SPACE = "*Model_Space"
+
+# entities in blocks on this layer take the layer of the INSERT of the block
+INHERITED_LAYER = "0"
+
+# the number of straight lines that a full circle is drawn with, for arcs in hatches
+ARC_SEGMENTS = 64
+
+
+def iter_tags(f):
+    """Yields the (group code, value) pairs of an ASCII DXF file, one pair at a time."""
+
+    for code, value in zip(f, f):
+        yield int(code), value.rstrip("\r\n")
+
+
+def iter_entities(tags, sections=("BLOCKS", "ENTITIES"), keep=None):
+    """Yields (section, entity_type, tags) for every entity in the given sections.
+
+    The tags of an entity are a list of its (group code, value) pairs. Entities in other sections
+    are skipped without keeping their tags, as are entities where keep(section, entity_type, layer)
+    is False once their layer is read.
+
+    """
+
+    section, entity_type, entity_tags = None, None, None
+
+    for code, value in tags:
+        if code != 0:
+            if entity_tags is not None:
+                entity_tags.append((code, value))
+                if code == 8 and keep is not None and not keep(section, entity_type, value):
+                    entity_tags = None
+            elif entity_type == "SECTION" and code == 2:
+                section = value
+            continue
+
+        if entity_tags is not None:
+            yield section, entity_type, entity_tags
+
+        entity_type = value
+        if value == "ENDSEC":
+            section = None
+        entity_tags = [] if section in sections and value not in ("SECTION", "ENDSEC") else None
+
+
+def tag_value(tags, code, default=None):
+    """Returns the value of the first tag with the group code, or the default if there is none."""
+
+    for tag_code, value in tags:
+        if tag_code == code:
+            return value
+    return default
+
+
+def arc_points(center, radius, start, end, anticlockwise=True):
+    """Returns points along an arc from the start angle to the end angle (in degrees), not including the end."""
+
+    if not anticlockwise:
+        start, end = -start, -end
+    sweep = (end - start) % 360 or 360
+    steps = max(1, int(np.ceil(ARC_SEGMENTS * sweep / 360)))
+    angles = np.radians(start + sweep * np.arange(steps) / steps)
+    if not anticlockwise:
+        angles = -angles
+    return np.column_stack( (center[X] + radius*np.cos(angles), center[Y] + radius*np.sin(angles)) )
+
+
+def hatch_polygon(tags):
+    """Returns the polygon outlined by the boundary paths of a HATCH, or None if it cannot be made.
+
+    The path with the largest area is the exterior and the other paths are holes. Paths may be
+    polylines or edges that are lines or circular arcs. Bulges of polylines are drawn as straight lines.
+
+    """
+
+    position = 0
+    def take(code):
+        nonlocal position
+        while tags[position][0] != code:
+            position += 1
+        position += 1
+        return tags[position-1][1]
+
+    rings = []
+    try:
+        for path in range(int(take(91))):
+            flags = int(take(92))
+            points = []
+
+            if flags & 2:
+                has_bulge = int(take(72))
+                take(73)
+                for vertex in range(int(take(93))):
+                    points.append( (float(take(10)), float(take(20))) )
+                    if has_bulge:
+                        take(42)
+            else:
+                for edge in range(int(take(93))):
+                    edge_type = int(take(72))
+                    if edge_type == 1:
+                        points.append( (float(take(10)), float(take(20))) )
+                        take(11), take(21)
+                    elif edge_type == 2:
+                        center = (float(take(10)), float(take(20)))
+                        radius, start, end = float(take(40)), float(take(50)), float(take(51))
+                        anticlockwise = int(take(73))
+                        points.extend( arc_points(center, radius, start, end, anticlockwise) )
+                    else:
+                        print("Skipping a hatch with elliptic or spline edges.")
+                        return None
+
+            if len(points) >= 3:
+                rings.append( LinearRing(points) )
+    except (IndexError, ValueError):
+        print("Skipping a hatch with a broken boundary.")
+        return None
+
+    if not rings:
+        return None
+    rings.sort(key=lambda ring: -Polygon(ring).area)
+    return Polygon(rings[0], holes=rings[1:])
+
+
+def insert_transform(tags):
+    """Returns the affine transforms (as shapely matrices) that an INSERT moves the polygons of its block with.
+
+    An INSERT with several columns or rows (a MINSERT) has a transform for each copy of the block.
+
+    """
+
+    x, y = float(tag_value(tags, 10, 0)), float(tag_value(tags, 20, 0))
+    sx, sy = float(tag_value(tags, 41, 1)), float(tag_value(tags, 42, 1))
+    angle = np.radians(float(tag_value(tags, 50, 0)))
+    columns, rows = int(tag_value(tags, 70, 1)), int(tag_value(tags, 71, 1))
+    column_spacing, row_spacing = float(tag_value(tags, 44, 0)), float(tag_value(tags, 45, 0))
+
+    cos, sin = np.cos(angle), np.sin(angle)
+    transforms = []
+    for row in range(rows):
+        for column in range(columns):
+            # copies are spaced along the rotated axes of the insert
+            dx, dy = column*column_spacing, row*row_spacing
+            transforms.append( [sx*cos, -sy*sin, sx*sin, sy*cos, x + dx*cos - dy*sin, y + dx*sin + dy*cos] )
+    return transforms
+
+
+class DXFBlock():
+    """The polygons and INSERTs of one block of a DXF, relative to the base point of the block."""
+
+    def __init__(self, name, base=(0, 0)) -> None:
+        self.name = name
+        self.base = base
+        self.polygons = []
+        self.inserts = []
+
+
+    def add_polygon(self, layer, polygon):
+        """Adds a polygon on the layer, moving it so that the base point is the origin."""
+
+        self.polygons.append( (layer, affinity.translate(polygon, -self.base[X], -self.base[Y])) )
+
+
+    def add_insert(self, layer, name, transforms):
+        """Adds an INSERT of the named block, whose transforms are from insert_transform()."""
+
+        to_base = [1, 0, 0, 1, -self.base[X], -self.base[Y]]
+        self.inserts.append( (layer, name, [ compose(to_base, transform) for transform in transforms ]) )
+
+
+def compose(outer, inner):
+    """Returns the shapely affine matrix of applying the inner matrix and then the outer matrix."""
+
+    a, b, d, e, xoff, yoff = outer
+    a2, b2, d2, e2, xoff2, yoff2 = inner
+    return [ a*a2 + b*d2, a*b2 + b*e2, d*a2 + e*d2, d*b2 + e*e2, a*xoff2 + b*yoff2 + xoff, d*xoff2 + e*yoff2 + yoff ]
+
+
+def resolve(name, blocks, resolved, resolving=()):
+    """Returns the (layer, polygon) pairs of the named block, with the polygons of the blocks it inserts moved into it.
+
+    Blocks that are resolved are kept in "resolved", so each block is only resolved once.
+
+    """
+
+    if name in resolved:
+        return resolved[name]
+    if name in resolving:
+        raise ValueError("The block '%s' inserts itself." % name)
+    if name not in blocks:
+        print("The block '%s' is inserted but never defined." % name)
+        return []
+
+    block = blocks[name]
+    polygons = list(block.polygons)
+    for layer, inserted, transforms in block.inserts:
+        for inserted_layer, polygon in resolve(inserted, blocks, resolved, resolving + (name,)):
+            inserted_layer = layer if inserted_layer == INHERITED_LAYER else inserted_layer
+            for transform in transforms:
+                polygons.append( (inserted_layer, affinity.affine_transform(polygon, transform)) )
+
+    resolved[name] = polygons
+    return polygons
+
+
+def read_houses(path, layers=LAYERS):
+    """Returns the polygons of every house type in the DXF as one GeoDataFrame.
+
+    There is a row for every hatch of a house on the layers, like the Polygon rows that geopandas
+    reads from a DXF, with the name of the house type in the 'House' column and the layer in the
+    'Layer' column. The file is only gone through once.
+
+    """
+
+    blocks = {}
+    block = None
+    model_space = DXFBlock(MODEL_SPACE)
+    # blocks that are inserted by other blocks, and blocks that are inserted into the model space
+    parts, placed = set(), set()
+    kept_layers = set(layers)
+
+    def keep(section, entity_type, layer):
+        if entity_type in ("BLOCK", "ENDBLK", "INSERT"):
+            return True
+        return entity_type == "HATCH" and (layer in kept_layers or (section == "BLOCKS" and layer == INHERITED_LAYER))
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        first_line = f.readline()
+        if first_line.startswith("AutoCAD Binary DXF"):
+            raise ValueError("%s is a binary DXF, which cannot be read." % path)
+        f.seek(0)
+
+        for section, entity_type, tags in iter_entities(iter_tags(f), keep=keep):
+            if entity_type == "BLOCK":
+                name = tag_value(tags, 2)
+                block = DXFBlock(name, ( float(tag_value(tags, 10, 0)), float(tag_value(tags, 20, 0)) ))
+                blocks[name] = block
+                continue
+            if entity_type == "ENDBLK":
+                block = None
+                continue
+
+            in_block = section == "BLOCKS" and block is not None
+            target = block if in_block else model_space
+            if section == "ENTITIES" and tag_value(tags, 67, "0").strip() == "1":
+                # entities in the paper space are not part of any house
+                continue
+
+            layer = tag_value(tags, 8, INHERITED_LAYER)
+            if entity_type == "INSERT":
+                name = tag_value(tags, 2)
+                (parts if in_block else placed).add(name)
+                if in_block:
+                    target.add_insert(layer, name, insert_transform(tags))
+            elif entity_type == "HATCH":
+                polygon = hatch_polygon(tags)
+                if polygon is not None:
+                    target.add_polygon(layer, polygon)
+
+    resolved = {}
+    names, layer_names, polygons = [], [], []
+    house_types = [ name for name in blocks if not name.startswith("*") and (name not in parts or name in placed) ]
+    for name in house_types + [MODEL_SPACE]:
+        house = model_space.polygons if name == MODEL_SPACE else resolve(name, blocks, resolved)
+        for layer, polygon in house:
+            if layer in kept_layers:
+                names.append(name)
+                layer_names.append(layer)
+                polygons.append(polygon)
+
+    # one GeoDataFrame is made for every house type at once, as making many small ones is slow
+    return geopandas.GeoDataFrame({ 'House': names, 'Layer': layer_names }, geometry=polygons)
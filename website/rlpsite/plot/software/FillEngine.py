@@ -0,0 +1,141 @@
+"""The incremental process that fills an RLP with blocks, used by PlotOptimals.py."""
+
+import numpy as np
+
+try:
+    from .HRGenerator import indexweightrandom
+    from ..software import BlockFunctions, Tracing
+    from .Layout import Layout
+
+except ImportError:
+    from HRGenerator import indexweightrandom
+    import BlockFunctions, Tracing
+    from Layout import Layout
+
+
+class FillEngine():
+    """Fills a region with blocks by plotting blocks at free blockpoints and moving them left until nothing changes.
+
+    The blockpoints that are still free make up the 'frontier'. Each iteration only tries to plot
+    blocks at the frontier, and each blockpoint that was tried leaves the frontier whether a block
+    was plotted there or not. Blocks are then moved left in the rows that got new blocks, and only
+    the blocks that moved are checked again (see BlockFunctions.move_blocks_left()). Blockpoints in
+    rows where blocks moved rejoin the frontier if the smallest block fits there now.
+
+    Filling stops as soon as the frontier is empty, the region cannot hold any more of the smallest
+    block (by area), or "max_iterations" is reached.
+
+    The telemetry of every iteration is kept in "telemetry" as a list of dicts. Each iteration is also
+    a span of the active trace (see Tracing.py), with a span for each part of it, and adds to the
+    'tried', 'placed', 'rejected' and 'moved' counters.
+
+    The blocktypes are chosen with the engine's own random number generator, so an engine made with
+    the same seed always fills the region in the same way.
+
+    """
+
+    def __init__(self, blocktypes, unitPolygons, region, blockpoints_as_rows, along, max_iterations=100, rng=None, proportions=None, frame=None) -> None:
+        """Sets up an empty layout with every blockpoint in the frontier.
+
+        "region" is a PreparedRegion, and "blockpoints_as_rows" are the blockpoints from
+        BlockFunctions.initPlot(), which the smallest block fits at. "rng" is a numpy Generator
+        or a seed for one. "proportions" are the proportions (or numbers of blocks) of each blocktype
+        that are tried in each iteration. "frame" is the LocalFrame that the region is in, if it is
+        in one (see Layout).
+
+        """
+
+        self.blocktypes = blocktypes
+        self.unitPolygons = unitPolygons
+        self.region = region
+        self.max_iterations = max_iterations
+        self.rng = np.random.default_rng(rng)
+        self.proportions = proportions
+
+        self.smallest_up = BlockFunctions.smallest_unit_polygon(unitPolygons)
+        self.smallest = unitPolygons.index(self.smallest_up)
+        self.capacity = int( region.polygon.area // self.smallest_up.union_area() )
+
+        self.anchors = np.concatenate( [np.zeros((0, 2))] + [np.asarray(row).reshape(-1, 2) for row in blockpoints_as_rows] )
+        self.anchor_rows = np.concatenate( [np.zeros(0, dtype=int)] + [np.full(len(row), x) for x, row in enumerate(blockpoints_as_rows)] )
+        self.frontier = np.ones(len(self.anchors), dtype=bool)
+
+        self.layout = Layout(unitPolygons, along, frame=frame)
+        self.placement_index = BlockFunctions.PlacementIndex()
+        self.telemetry = []
+
+
+    def is_done(self):
+        """Returns True if filling should stop."""
+
+        return ( not self.frontier.any()
+                 or len(self.layout) >= self.capacity
+                 or len(self.telemetry) >= self.max_iterations )
+
+
+    def step(self):
+        """Runs one iteration of filling and returns its telemetry."""
+
+        tried = np.flatnonzero(self.frontier)
+
+        with Tracing.span("candidates"):
+            plotting_guide = indexweightrandom(numspaces=len(tried), blocktypes=self.blocktypes, rows=[tried], rng=self.rng, counts=self.proportions)[0]
+            candidates = Layout(self.unitPolygons, self.layout.along, frame=self.layout.frame)
+            candidates.add( np.minimum(plotting_guide, -1+len(self.unitPolygons)), self.anchors[tried], self.anchor_rows[tried] )
+
+            # the smallest block fits at every blockpoint, so it replaces blocks that are too big to fit
+            footprints, fits = candidates.footprints(region=self.region)
+            candidates.blocks['template'][~fits] = self.smallest
+            too_big = int( np.count_nonzero(~fits) )
+
+        with Tracing.span("filter_blocks"):
+            placed = BlockFunctions.filter_blocks(candidates, self.smallest_up, replaceSmall=True, placement_index=self.placement_index)
+            self.frontier[tried] = False
+            self.layout.extend(placed)
+
+        with Tracing.span("move_blocks_left"):
+            moved = BlockFunctions.move_blocks_left(self.layout, self.region, rows=set(placed.blocks['row']))
+
+        reopened = np.zeros(0, dtype=int)
+        if len(moved):
+            with Tracing.span("reopen"):
+                # moved blocks are in new places, so the index is remade
+                self.placement_index = BlockFunctions.PlacementIndex.of_layout(self.layout)
+
+                moved_rows = np.unique(self.layout.blocks['row'][moved])
+                reopened = np.flatnonzero( np.isin(self.anchor_rows, moved_rows) & ~self.frontier )
+                footprints, fits = self.smallest_up.move_many(self.anchors[reopened])
+                reopened = reopened[ ~self.placement_index.collides_many(footprints) ]
+                self.frontier[reopened] = True
+
+        record = {
+            'iteration': 1+len(self.telemetry),
+            'tried': len(tried),
+            'too_big': too_big,
+            'placed': len(placed),
+            'rejected': len(tried) - len(placed),
+            'moved': len(moved),
+            'reopened': len(reopened),
+            'blocks': len(self.layout),
+        }
+        self.telemetry.append(record)
+        for counter in ('tried', 'placed', 'rejected', 'moved'):
+            Tracing.count(counter, record[counter])
+        return record
+
+
+    def run(self, progress=None):
+        """Fills the region and returns the layout.
+
+        "progress" is called after every iteration with a progress event: the telemetry of the
+        iteration with 'stage' set to 'fill', and the layout so far as 'layout'. The layout keeps
+        changing, so it should be used before "progress" returns.
+        
+        """
+
+        while not self.is_done():
+            with Tracing.span("iteration", iteration=1+len(self.telemetry)):
+                record = self.step()
+            if progress is not None:
+                progress({ 'stage': 'fill', **record, 'layout': self.layout })
+        return self.layout
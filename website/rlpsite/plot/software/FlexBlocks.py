@@ -1,12 +1,9 @@
 """The functions here are used to support the stretching of regions in gdfs which will be used to fill up remaining space."""
 
 from shapely import Polygon
-import matplotlib.pyplot as plt
 import geopandas
 
 
-fig, ax = plt.subplots()
-
 def stretch_one_vertex(p, vindex, dir):
     """Stretches a polygon by one of its vertices.
     
@@ -17,6 +14,8 @@ def stretch_one_vertex(p, vindex, dir):
     """
     
     
+    import matplotlib.pyplot as plt
+
     box_for_reference = Polygon([ (1,1),(1,10),(10,10),(10,1),(1,1) ])
     p = Polygon([ (5,5),(5,8),(8,8),(8,5),(5,5) ])
     vindex = 3
@@ -26,6 +25,7 @@ def stretch_one_vertex(p, vindex, dir):
     
     
     
+    fig, ax = plt.subplots()
     geopandas.GeoSeries(box_for_reference.exterior).plot(ax=ax, color="red")
     geopandas.GeoSeries(p.exterior).plot(ax=ax, color="green")
     plt.show()
@@ -40,5 +40,7 @@ def stretch(dxf):
 
     flex_dxf = dxf.loc[ dxf['Flex']==True ]
     stretch_one_vertex(None, None, None)
-    
-stretch(None)
\ No newline at end of file
+
+
+if __name__ == "__main__":
+    stretch(None)
\ No newline at end of file
@@ -1,6 +1,6 @@
-import scipy.optimize as opt
 from math import floor
 from numpy import random
+import numpy as np
 
 # Block Road Generator
 # Primary function of this class is to generate the numbers of blocks and roads of each type to optimise to profit and cost
@@ -84,6 +84,8 @@ class ManageBlockTypes():
 def simplexmax(revenues, costs, sizes, budget, maxsize):
     """Calculates and returns the optimal proportion of blocks of blocktypes using simplex."""
 
+    import scipy.optimize as opt
+
     objective = [-1*x for x in revenues]
     ineq_coeffs = [costs] + [sizes]
     ineq_values = [budget, maxsize]
@@ -153,8 +155,12 @@ def generateBasicTypes(blocktypes, budget=500, maxsize=500, showResults=False):
     return (basicproportions)
 
 
-def weightrandom(numspaces, blocktypes):
-    """Returns a list of randomly determined blocktypes for initial plotting."""
+def weightrandom(numspaces, blocktypes, rng=None):
+    """Returns a list of randomly determined blocktypes for initial plotting.
+    
+    "rng" is a numpy Generator or a seed for one, so that the same seed gives the same list.
+    
+    """
     
     # for now, just to see this artificial example
     blocktypes[1].PROPORTION = 35
@@ -165,83 +171,74 @@ def weightrandom(numspaces, blocktypes):
     for bt in blocktypes:
         plot_chances.append( bt.PROPORTION / total_proportion )
     
-    rng = random.default_rng()
+    rng = random.default_rng(rng)
     plot_blocktypes = rng.choice( [bt.NAME for bt in blocktypes] , numspaces, p=plot_chances)
 
     return plot_blocktypes
 
 
-def indexweightrandom(numspaces, blocktypes, rows, accuracy=0.005, showInfo=False):
+def quotas(numspaces, weights):
+    """Returns the number of spaces each weight gets, so that the numbers add up to exactly numspaces.
+
+    The weights can be proportions or numbers of blocks (like the ones from generateBestTypes()).
+    Each weight gets the whole part of its share, and the spaces left over go to the weights with
+    the largest remainders (the largest remainder method). Equal remainders go to the earlier weights.
+
+    Raises a ValueError if any weight is negative or no weight is more than 0.
+    
+    """
+
+    weights = np.asarray(weights, dtype=float)
+    if (weights < 0).any() or not weights.sum() > 0:
+        raise ValueError("Weights must not be negative and must not all be 0, but were %s." % weights.tolist())
+    shares = numspaces * weights / weights.sum()
+    counts = np.floor(shares).astype(int)
+
+    leftover = numspaces - counts.sum()
+    counts[ np.argsort(counts - shares, kind="stable")[:leftover] ] += 1
+    return counts
+
+
+def indexweightrandom(numspaces, blocktypes, rows, showInfo=False, rng=None, counts=None):
     """Returns a list of randomly determined blocktypes for initial plotting.
 
     This list acts as a guide for plotting the blocks.
     
     The blocktypes are represented by their index in the blocktypes array.
 
-    The list will be accurate to within the given accuracy,
-    but more accurate values will take a longer time and more processing.
+    The number of each blocktype is exact (see quotas()). The numbers follow "counts" if given, like the
+    numbers of blocks from generateBestTypes(), or else every blocktype gets the same number of blocks.
 
-    The list will be in rows matching the rows of the plot.
-    
-    """
+    Each blocktype is spread evenly through the list by giving its blocks evenly spaced places with a
+    random jitter, so that every part of the plot gets its share rather than only the list as a whole.
 
-    
-    total_proportion = sum( [bt.PROPORTION for bt in blocktypes] )
+    The list will be in rows matching the rows of the plot, with an array for each row.
 
-    plot_chances = []
-    for bt in blocktypes:
-        plot_chances.append( bt.PROPORTION / total_proportion )
+    "rng" is a numpy Generator or a seed for one, so that the same seed gives the same list.
     
+    """
 
-    # for now, just to see this artificial example
-    # plot_chances = [0.5, 0.5]
-    # plot_chances = [1.0, 0.0]
-    plot_chances = [1/(len(blocktypes)) for i in range( len(blocktypes) )]
-
-
-    rng = random.default_rng()
+    if counts is None:
+        # for now, just to see this artificial example
+        # counts = [bt.PROPORTION for bt in blocktypes]
+        counts = [1 for bt in blocktypes]
 
-    accuracy_reached = False
-    counter = 0
-    while not accuracy_reached:
+    rng = random.default_rng(rng)
+    type_counts = quotas(numspaces, counts)
 
-        if counter>20:
-            accuracy*=2
-        
-        counter+=1
-        plot_blocktypes = rng.choice( len(blocktypes) , numspaces, p=plot_chances)
+    # the k-th of c blocks of a type goes at (k + jitter)/c of the way through the list
+    plot_blocktypes = np.repeat(np.arange(len(blocktypes)), type_counts)
+    ranks = np.arange(numspaces) - np.repeat(np.cumsum(type_counts) - type_counts, type_counts)
+    places = (ranks + rng.random(numspaces)) / np.repeat(np.maximum(type_counts, 1), type_counts)
+    plot_blocktypes = plot_blocktypes[ np.argsort(places, kind="stable") ]
 
-        accuracy_reached = True
-        for i in range(len(blocktypes)):
-            actual_plot_chance = len( [v for v in plot_blocktypes if v==i] ) / len(plot_blocktypes)
-            if abs(plot_chances[i] - actual_plot_chance) >= accuracy:
-                accuracy_reached = False
-                break
-    
     if showInfo:
-        print("counter =", counter)
-        print( len( [v for v in plot_blocktypes if v==0] ) )
-        print( len( [v for v in plot_blocktypes if v==0] ) / len(plot_blocktypes) )
-        print( len( [v for v in plot_blocktypes if v==1] ) )
-        print( len( [v for v in plot_blocktypes if v==1] ) / len(plot_blocktypes) )
+        print("counts =", type_counts)
+        print("proportions =", type_counts / max(numspaces, 1))
         print()
 
-    plot_blocktypes_as_rows = []
-    blocki = 0
-    for row in rows:
-        pb_row = []
-        for i in range(len(row)):
-            # pb_row.append(plot_blocktypes[blocki])
-            pb_row.append(plot_blocktypes[blocki])
-            blocki+=1
-        plot_blocktypes_as_rows.append(pb_row)
-        
-    checkrow = [ bt for row in plot_blocktypes_as_rows for bt in row ]
-    for bval in checkrow==plot_blocktypes:
-        if bval==False:
-            print("error when generating indexweightrandom as rows")
-
-    return plot_blocktypes_as_rows
+    row_ends = np.cumsum([len(row) for row in rows])
+    return np.split(plot_blocktypes, row_ends[:-1])
 
 
 
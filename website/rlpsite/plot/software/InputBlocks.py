@@ -1,7 +1,10 @@
 """This file converts user-inputted blocks representing houses and their gardens and parking to unitPolygons used in PlotOptimals.py"""
 
+import os
+
 import geopandas
-import matplotlib.pyplot as plt
+import numpy as np
+import shapely
 from shapely.ops import unary_union
 from shapely import LineString, Polygon, Point
 
@@ -11,11 +14,6 @@ except ImportError:
     import LineFunctions
 
 
-dxfblock = None
-gardens = None
-parking = None
-house = None
-
 X,Y = 0,1
 
 
@@ -58,7 +56,14 @@ def set_up_colors(dxfblock):
     dxfblock['colors']= colors
 
 
-def readDXF():
+# the example DXF at the top of the repository
+EXAMPLE_DXF_PATH = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir]*4, "House_plotting_example.dxf"))
+
+# the DXF of the houses, which is the example DXF unless the HOUSE_DXF environment variable is set
+DXF_PATH = os.environ.get("HOUSE_DXF") or EXAMPLE_DXF_PATH
+
+
+def readDXF(path=DXF_PATH):
     """Reads dxf file to get the user-drawn block and cleans the data.
 
     May add extra info to the dxf for plotting purposes (like 'Front'), and remove some info.
@@ -68,20 +73,29 @@ def readDXF():
     """
     
 
-    dxfblock = geopandas.read_file("C:/Users/Saihan Marshall/Documents/house stuff/house repo/House/House_plotting_example.dxf")
+    return clean_dxfblock( geopandas.read_file(path) )
+
+
+def clean_dxfblock(dxfblock, center=True):
+    """Cleans the data of a dxf read by geopandas or DXFReader.read_houses(), as in readDXF().
+
+    The dxf is only centered at the origin if "center" is True, as a dxf of many house types
+    should have each house type centered on its own.
+
+    Returns (dxfblock, gardens, parking, house)
+    
+    """
+
     dxfblock['geom_type']= dxfblock.geometry.type
     dxfblock = dxfblock.loc[dxfblock.geom_type == 'Polygon']
     set_up_colors(dxfblock=dxfblock)
-    centerDXFAtOrigin(dxf=dxfblock)
+    if center:
+        centerDXFAtOrigin(dxf=dxfblock)
 
     dxfblock = dxfblock.rename(columns={'geometry': 'MainPlot'})
     dxfblock = dxfblock.set_geometry('MainPlot')
-    dxfblock = dxfblock.drop('PaperSpace', axis=1)
-    dxfblock = dxfblock.drop('SubClasses', axis=1)
-    dxfblock = dxfblock.drop('Linetype', axis=1)
-    dxfblock = dxfblock.drop('EntityHandle', axis=1)
-    dxfblock = dxfblock.drop('Text', axis=1)
-    dxfblock = dxfblock.drop('geom_type', axis=1)
+    # DXFReader only gives the 'Layer' column
+    dxfblock = dxfblock.drop(['PaperSpace', 'SubClasses', 'Linetype', 'EntityHandle', 'Text', 'geom_type'], axis=1, errors='ignore')
 
     gardens = dxfblock.loc[dxfblock.Layer == 'GARDEN'].geometry
     parking = dxfblock.loc[dxfblock.Layer == 'PARKING'].geometry
@@ -94,7 +108,6 @@ def readDXF():
     dxfblock.loc[ flex_regions, 'Flex' ] = True
 
     return (dxfblock, gardens, parking, house)
-(dxfblock, gardens, parking, house) = readDXF()
 
 
 def plotDXF(dxfblock, ax=None):
@@ -108,9 +121,10 @@ def plotDXF(dxfblock, ax=None):
     if 'colors' in dxfblock.columns:
         dxfblock.plot(ax=ax, color=dxfblock['colors'])
     else:
-        geopandas.GeoSeries(gardens).plot(ax=ax, color="green")
-        geopandas.GeoSeries(house).plot(ax=ax, color="blue")
-        geopandas.GeoSeries(parking).plot(ax=ax, color="grey")
+        section = dxfblock['Section'] if 'Section' in dxfblock.columns else dxfblock['Layer']
+        geopandas.GeoSeries(dxfblock.geometry[section == 'GARDEN']).plot(ax=ax, color="green")
+        geopandas.GeoSeries(dxfblock.geometry[section == 'HOUSE NEW']).plot(ax=ax, color="blue")
+        geopandas.GeoSeries(dxfblock.geometry[section == 'PARKING']).plot(ax=ax, color="grey")
 
 
 def dxf_parallel_to_ll(dxf, center_at_origin=True, point_about_rotation=None, resultline=None):
@@ -180,26 +194,31 @@ def calc_front(house_polygon):
     return Point(front_coords)
 
 
-def update_dxf_front(dxf):
-    """Updates the 'Front' column for the houses in the dxf."""
-
-    houses = dxf.loc[dxf['Section'] == 'HOUSE NEW']
-    front_values = houses['MainPlot'].apply(calc_front)
-    print("fv =", front_values)
-    dxf.loc[dxf['Section'] == 'HOUSE NEW', 'Front'] = front_values
-    
+def calc_fronts(house_polygons):
+    """Returns the Front values for an array of houses as an array of Point objects.
 
-def get_dxf_as_gdf():
-    """Returns the combination of the garden, parking, and house as a GeoDataFrame.
-    
-    Returns none if no dxf file is available.
+    Does the same as calc_front() for every house at once.
     
     """
 
-    return dxfblock
+    rings = shapely.get_exterior_ring(house_polygons)
+    num_coords = shapely.get_num_coordinates(rings)
+    starts = np.cumsum(num_coords) - num_coords
+    coords = shapely.get_coordinates(rings)
+    return shapely.points( (coords[starts+2] + coords[starts+3]) / 2 )
 
 
-def get_dxf_separate():
+def update_dxf_front(dxf):
+    """Updates the 'Front' column for the houses in the dxf."""
+
+    houses = (dxf['Section'] == 'HOUSE NEW').to_numpy()
+    front_values = np.full(len(dxf), None, dtype=object)
+    front_values[houses] = calc_fronts(dxf.geometry.values[houses])
+    dxf['Front'] = front_values
+    
+
+def get_dxf_separate(path=DXF_PATH):
     """Returns each part of the DXF polygon separately"""
 
+    (dxfblock, gardens, parking, house) = readDXF(path)
     return gardens, parking, house
\ No newline at end of file
@@ -0,0 +1,269 @@
+"""A compact representation of plotted blocks, used by every stage of the plotting process.
+
+Rather than each block being its own UnitPolygon holding a copy of a gdf, a Layout holds one row of a
+numpy structured array per block with the index of its unit polygon (the 'template'), where it was moved
+to, how it was rotated, and which row it is in. The polygons of a block are only made when they are needed.
+
+"""
+
+import geopandas
+import numpy as np
+import pandas
+import shapely
+
+try:
+    from ..software import InputBlocks
+except ImportError:
+    import InputBlocks
+
+
+X, Y = 0, 1
+
+BLOCK_DTYPE = np.dtype([
+    ('template', np.int32),
+    ('x', np.float64),
+    ('y', np.float64),
+    ('rotation', np.float64),
+    ('row', np.int32),
+])
+
+
+class Layout():
+    """The blocks plotted on an RLP.
+
+    "templates" is the list of UnitPolygons that blocks can be made from, all centered at the origin.
+    A block is its template moved so that its center is at (x, y), after being rotated by "rotation"
+    radians about its center.
+
+    "along" is the direction (a unit vector) that rows run in, which orders the blocks in a row.
+
+    Blocks may be plotted in a PolygonFunctions.LocalFrame rather than where the RLP is. If "frame"
+    is given, blocks are kept in the frame and only their output (see to_world()) is moved back.
+
+    """
+
+    def __init__(self, templates, along=(1, 0), blocks=None, frame=None) -> None:
+        self.templates = templates
+        self.along = np.asarray(along, dtype=float)
+        self.blocks = np.zeros(0, dtype=BLOCK_DTYPE) if blocks is None else blocks
+        self.num_parts = max([len(t.polygons()) for t in templates])
+        self.frame = frame
+
+
+    def __len__(self):
+        return len(self.blocks)
+
+
+    def copy(self, blocks=None):
+        """Returns a new Layout with the same templates, holding a copy of the blocks (or the given blocks)."""
+
+        if blocks is None:
+            blocks = self.blocks.copy()
+        return Layout(self.templates, self.along, blocks, self.frame)
+
+
+    def add(self, templates, coords, rows, rotations=0):
+        """Adds blocks to the layout.
+
+        "templates" and "rows" are integers or arrays of integers, and "coords" is an (N, 2) array
+        of the centers of the new blocks.
+
+        """
+
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        new_blocks = np.zeros(len(coords), dtype=BLOCK_DTYPE)
+        new_blocks['template'] = templates
+        new_blocks['x'] = coords[:, X]
+        new_blocks['y'] = coords[:, Y]
+        new_blocks['rotation'] = rotations
+        new_blocks['row'] = rows
+
+        self.blocks = np.concatenate( (self.blocks, new_blocks) )
+
+
+    def extend(self, layout):
+        """Adds all blocks of another layout with the same templates."""
+
+        self.blocks = np.concatenate( (self.blocks, layout.blocks) )
+
+
+    def keep(self, mask):
+        """Removes the blocks where the mask (or index array) is not selected."""
+
+        self.blocks = self.blocks[mask]
+
+
+    def coords(self, idxs=None):
+        """Returns the centers of the blocks as an (N, 2) array."""
+
+        blocks = self.blocks if idxs is None else self.blocks[idxs]
+        return np.column_stack( (blocks['x'], blocks['y']) )
+
+
+    def set_coords(self, idxs, coords):
+        """Moves the selected blocks so that their centers are at the given coordinates."""
+
+        self.blocks['x'][idxs] = coords[:, X]
+        self.blocks['y'][idxs] = coords[:, Y]
+
+
+    def rows(self):
+        """Returns a list of index arrays, one for each row, ordered along the row.
+
+        Rows are in order of their row number, and rows without blocks are left out.
+
+        """
+
+        position = self.coords() @ self.along
+        order = np.lexsort( (position, self.blocks['row']) )
+        row_numbers = self.blocks['row'][order]
+        splits = np.flatnonzero(np.diff(row_numbers)) + 1
+        return np.split(order, splits) if len(order) else []
+
+
+    def footprints(self, idxs=None, region=None):
+        """Returns the polygons of the selected blocks (or all blocks), and which of them fit inside the region.
+
+        Returns (footprints, fits) like UnitPolygon.move_many(). Footprints is an (N, P) array where
+        P is the largest number of polygons of any template, and blocks with fewer polygons are
+        padded with None. "region" may be a polygon or a PreparedRegion.
+
+        """
+
+        blocks = self.blocks if idxs is None else self.blocks[idxs]
+        footprints = np.full( (len(blocks), self.num_parts), None, dtype=object )
+        fits = np.ones(len(blocks), dtype=bool)
+
+        for t in np.unique(blocks['template']):
+            sel = np.flatnonzero(blocks['template']==t)
+            template_footprints, template_fits = self.templates[t].move_many(
+                np.column_stack( (blocks['x'][sel], blocks['y'][sel]) ),
+                polygon_to_fit_inside=region,
+                rotations=blocks['rotation'][sel],
+            )
+            footprints[sel, :template_footprints.shape[1]] = template_footprints
+            fits[sel] = template_fits
+
+        return footprints, fits
+
+
+    def projections(self, idxs=None, direction=None):
+        """Returns how far the selected blocks (or all blocks) reach behind and ahead of their centers along a direction.
+
+        Returns (behind, ahead) as arrays, like UnitPolygon.projection(). The direction defaults to
+        "along", and is rotated into the frame of each template, so each template is only projected
+        once for each rotation.
+
+        """
+
+        blocks = self.blocks if idxs is None else self.blocks[idxs]
+        direction = self.along if direction is None else np.asarray(direction, dtype=float)
+        behind, ahead = np.zeros(len(blocks)), np.zeros(len(blocks))
+
+        for (t, rotation) in set(zip(blocks['template'].tolist(), blocks['rotation'].tolist())):
+            sel = (blocks['template']==t) & (blocks['rotation']==rotation)
+            cos, sin = np.cos(-rotation), np.sin(-rotation)
+            template_direction = ( cos*direction[X] - sin*direction[Y], sin*direction[X] + cos*direction[Y] )
+            behind[sel], ahead[sel] = self.templates[t].projection(template_direction)
+
+        return behind, ahead
+
+
+    def to_world(self, geometries):
+        """Returns polygons of the layout (like its footprints) moved out of its frame, if it has one."""
+
+        if self.frame is None:
+            return geometries
+        return self.frame.to_world(geometries)
+
+
+    def in_world(self):
+        """Returns a copy of the layout with its blocks moved out of its frame, so that it has no frame.
+
+        Each block is moved and turned with the frame, so its template is only rotated more.
+
+        """
+
+        if self.frame is None:
+            return self.copy()
+
+        blocks = self.blocks.copy()
+        coords = self.frame.coords_to_world(self.coords())
+        blocks['x'], blocks['y'] = coords[:, X], coords[:, Y]
+        blocks['rotation'] += self.frame.angle
+        return Layout(self.templates, self.along @ self.frame.matrix, blocks)
+
+
+    def polygons(self, footprint):
+        """Returns the polygons of one row of footprints(), without padding."""
+
+        return footprint[~shapely.is_missing(footprint)]
+
+
+    def to_block_ups(self):
+        """Returns the blocks as rows of UnitPolygons, each with its own item.
+
+        This makes every polygon and copies a gdf for every block, so should only be used for output.
+
+        """
+
+        footprints, fits = self.footprints()
+        footprints = self.to_world(footprints)
+        block_ups_as_rows = []
+        for row in self.rows():
+            block_ups = []
+            for i in row:
+                template = self.templates[self.blocks['template'][i]]
+                item = template.with_geometry(self.polygons(footprints[i]))
+                block_ups.append( type(template)(type=template.type, item_to_plot=item) )
+            block_ups_as_rows.append(block_ups)
+        return block_ups_as_rows
+
+
+    def to_arrays(self):
+        """Returns the polygons of every block as flat arrays, in row order, moved out of the frame of the layout.
+
+        Returns a dict of arrays with one value for each polygon:
+            'geometry' - the polygon
+            'block'    - the index of its block in the layout
+            'template' - the index of the template of its block
+            'part'     - the index of the polygon in its template
+            'row'      - the row of its block
+
+        """
+
+        order = np.concatenate(self.rows()) if len(self) else np.zeros(0, dtype=int)
+        footprints, fits = self.footprints(order)
+        present = ~shapely.is_missing(footprints)
+
+        block = np.repeat(order[:, None], self.num_parts, axis=1)[present]
+        return {
+            'geometry': self.to_world(footprints[present]),
+            'block': block,
+            'template': self.blocks['template'][block],
+            'part': np.tile(np.arange(self.num_parts), (len(order), 1))[present],
+            'row': self.blocks['row'][block],
+        }
+
+
+    def to_gdf(self):
+        """Returns the polygons of every block as one GeoDataFrame, with the columns of the template gdfs.
+
+        The frame is made in one go rather than by merging the gdf of each block, and the 'Front'
+        of the houses is worked out for all houses at once.
+
+        *****THIS ASSUMES ALL TEMPLATES ARE GDFS*****
+
+        """
+
+        arrays = self.to_arrays()
+
+        template_gdfs = [t.item_to_plot for t in self.templates]
+        geometry_name = template_gdfs[0].geometry.name
+        attributes = pandas.concat( [pandas.DataFrame(gdf.drop(columns=gdf.geometry.name)) for gdf in template_gdfs], ignore_index=True )
+        first_rows = np.cumsum([0] + [len(gdf) for gdf in template_gdfs])
+
+        attributes = attributes.iloc[ first_rows[arrays['template']] + arrays['part'] ].reset_index(drop=True)
+        gdf = geopandas.GeoDataFrame( attributes.assign(**{ geometry_name: arrays['geometry'] }), geometry=geometry_name )
+        InputBlocks.update_dxf_front(gdf)
+        return gdf
@@ -112,6 +112,19 @@ def leqtoline(leq, polygon):
         return shorterline
 
 
+def line_axes(line):
+    """Returns unit vectors along the line and normal to it as numpy arrays (along, normal).
+
+    Together they make a rotated frame where rows of blocks are parallel to the line.
+    
+    """
+
+    (x1, y1), (x2, y2) = line[linep1idx], line[linep2idx]
+    along = np.array([x2-x1, y2-y1]) / np.hypot(x2-x1, y2-y1)
+    normal = np.array([-along[Y], along[X]])
+    return (along, normal)
+
+
 def normalLineEQ(leq, point):
     """Returns equation for the normal of a given line as a tuple (gradient, cvalue, isVertical).
     
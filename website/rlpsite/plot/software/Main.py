@@ -5,28 +5,29 @@ This file is used for both the website and the standalone software folder.
 """
 
 
-import matplotlib.pyplot as plt
-from matplotlib import use
 website_call = False
 
 try:
     from .HRGenerator import ManageBlockTypes, generateBestTypes, generateBasicTypes, indexweightrandom
     from .RedLinePlot import get_one_RLP, get_path_for_one_RLP, get_RLPs_from_directory_path, getPathForRoads
     from ..software import PolygonFunctions, LineFunctions, BlockFunctions, InputBlocks
-    from .PlotOptimals import plot_proportions_in_region
-    use('agg')
+    from .PlotOptimals import plot_proportions_in_region, best_of_seeds, search_orientations, plot_in_parts
+    from .TemplateLibrary import default_library
 
     website_call = True
 
 except ImportError:
     from HRGenerator import ManageBlockTypes, generateBestTypes, generateBasicTypes, indexweightrandom
     from RedLinePlot import get_one_RLP, get_path_for_one_RLP, get_RLPs_from_directory_path, getPathForRoads
-    from PlotOptimals import plot_proportions_in_region
+    from PlotOptimals import plot_proportions_in_region, best_of_seeds, search_orientations, plot_in_parts
+    from TemplateLibrary import default_library
     import PolygonFunctions, LineFunctions, BlockFunctions, InputBlocks
 
 
 
-if not website_call:
+if not website_call and __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     mht = ManageBlockTypes()
 
     gdfs = [ get_one_RLP(get_path_for_one_RLP()) ]
@@ -39,8 +40,7 @@ if not website_call:
         rlp = rlp.to_crs(epsg=27700)
         rlppolygon = rlp.geometry[0]
 
-        (dxfblock, gardens, parking, house) = InputBlocks.readDXF()
-        upgdf = BlockFunctions.UnitPolygon(type="gdf", item_to_plot=dxfblock)
+        upgdf = BlockFunctions.UnitPolygon.of_template(default_library().get())
         unitPolygons = [upgdf]
 
         # for now, will set these to useless values until all other gdf functionality is checked
@@ -56,9 +56,40 @@ if not website_call:
     plt.show()
 
 
-def startplot(rlp, showCloseToOrigin=True):
+def website_block_types():
+    """Returns the blocktypes that startplot() plots and their proportions, as (blocktypes, proportions)."""
+
     mht = ManageBlockTypes()
 
+    # fillMHT(mht)
+    # blocktypes = mht.getBlockTypes()
+    # bestproportions, profit = generateBestTypes(blocktypes, maxsize=rlppolygon.area, showResults=False)
+    # mht.addProportions(bestproportions)
+
+    # for now, will set these to useless values until all other gdf functionality is checked
+    mht.addNewBlockType("gdf1", 100000, 0, 25, 30)
+    bestproportions = [100]
+    mht.addProportions(bestproportions)
+    return mht.getBlockTypes(), bestproportions
+
+
+def startplot(rlp, showCloseToOrigin=True, seed=None, num_seeds=1, search_orientation=False, decompose=False, progress=None, template=None):
+    """Plots houses on the RLP and returns the figure.
+
+    The same seed always gives the same figure. If "num_seeds" is more than 1, that many seeds are
+    tried at once and the figure with the most houses is returned (see PlotOptimals.best_of_seeds()).
+    If "search_orientation" is True, several orientations of the rows are tried at once instead of
+    only the longest line of the RLP (see PlotOptimals.search_orientations()). If "decompose" is True,
+    a concave RLP is split into near-convex parts which are plotted at once, each with its own
+    orientation (see PlotOptimals.plot_in_parts()).
+
+    "progress" is given progress events while a single seed is plotted (see plot_proportions_in_region()).
+
+    Houses are plotted from the CompiledTemplate "template", or from the default DXF if it is not
+    given (see TemplateLibrary.py).
+    
+    """
+
     rlp = rlp.to_crs(epsg=27700)
     rlppolygon = rlp.geometry[0]
     if showCloseToOrigin:
@@ -67,22 +98,49 @@ def startplot(rlp, showCloseToOrigin=True):
 
 
     # unitPolygons = makeUnitPolygons(blocktypes)
-    (dxfblock, gardens, parking, house) = InputBlocks.readDXF()
-    upgdf = BlockFunctions.UnitPolygon(type="gdf", item_to_plot=dxfblock)
+    upgdf = BlockFunctions.UnitPolygon.of_template(template or default_library().get())
     unitPolygons = [upgdf]
 
 
-    # fillMHT(mht)
-    # blocktypes = mht.getBlockTypes()
-    # bestproportions, profit = generateBestTypes(blocktypes, maxsize=rlppolygon.area, showResults=False)
-    # mht.addProportions(bestproportions)
-
-    # for now, will set these to useless values until all other gdf functionality is checked
-    mht.addNewBlockType("gdf1", 100000, 0, 25, 30)
-    bestproportions = [100]
-    mht.addProportions(bestproportions)
-    blocktypes = mht.getBlockTypes()
+    blocktypes, bestproportions = website_block_types()
 
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots()
-    plot_proportions_in_region(blocktypes, unitPolygons, bestproportions, rlppolygon, ax=ax)
+    if search_orientation:
+        search_orientations(blocktypes, unitPolygons, bestproportions, rlppolygon, ax=ax, seed=seed)
+    elif decompose:
+        plot_in_parts(blocktypes, unitPolygons, bestproportions, rlppolygon, ax=ax, seed=seed)
+    elif num_seeds > 1:
+        best_of_seeds(blocktypes, unitPolygons, bestproportions, rlppolygon, ax=ax, num_seeds=num_seeds, seed=seed)
+    else:
+        plot_proportions_in_region(blocktypes, unitPolygons, bestproportions, rlppolygon, ax=ax, seed=seed, progress=progress)
     return fig
+
+
+
+def startlayout(rlp, seed=None, progress=None, template=None):
+    """Plots houses on the RLP without drawing a figure, and returns the houses as a GeoDataFrame in the CRS of the RLP.
+
+    The houses are plotted like in startplot() with a single seed, and moved back from the origin
+    to where the RLP is.
+
+    Houses are plotted from the CompiledTemplate "template", or from the default DXF if it is not given.
+    
+    """
+
+    crs = rlp.crs
+    rlp = rlp.to_crs(epsg=27700)
+    rlppolygon = rlp.geometry[0]
+    # moveToOrigin() moves the lowest and leftmost vertices to the axes
+    (minx, miny, maxx, maxy) = rlppolygon.exterior.bounds
+    rlppolygon = PolygonFunctions.moveToOrigin(rlppolygon)
+
+    upgdf = BlockFunctions.UnitPolygon.of_template(template or default_library().get())
+    unitPolygons = [upgdf]
+
+    blocktypes, bestproportions = website_block_types()
+    result = plot_proportions_in_region(blocktypes, unitPolygons, bestproportions, rlppolygon, ax=None, seed=seed, progress=progress)
+
+    houses = result.gdf
+    houses[houses.geometry.name] = houses.translate(minx, miny)
+    return houses.set_crs(epsg=27700).to_crs(crs)
@@ -2,13 +2,13 @@
 relative to the RLP."""
 
 
-import matplotlib
 import geopandas.geoseries
-import matplotlib.pyplot as plt
 import geopandas
 import numpy as np
-from pandas import merge
+import os
+import shapely
 
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from shapely import Polygon, LineString, affinity, Point, intersection
 from shapely import distance as dist
 
@@ -18,20 +18,65 @@ website_call = False
 try:
     from .HRGenerator import ManageBlockTypes, generateBestTypes, generateBasicTypes, indexweightrandom
     from .RedLinePlot import get_one_RLP, get_path_for_one_RLP, get_RLPs_from_directory_path, getPathForRoads
-    from ..software import PolygonFunctions, LineFunctions, BlockFunctions, InputBlocks
-    matplotlib.use('agg')
+    from ..software import PolygonFunctions, LineFunctions, BlockFunctions, InputBlocks, Tracing
+    from .FillEngine import FillEngine
+    from .Layout import Layout
 
     website_call = True
 
 except ImportError:
     from HRGenerator import ManageBlockTypes, generateBestTypes, generateBasicTypes, indexweightrandom
     from RedLinePlot import get_one_RLP, get_path_for_one_RLP, get_RLPs_from_directory_path, getPathForRoads
-    import PolygonFunctions, LineFunctions, BlockFunctions, InputBlocks
+    import PolygonFunctions, LineFunctions, BlockFunctions, InputBlocks, Tracing
+    from FillEngine import FillEngine
+    from Layout import Layout
 
 
 X, Y = 0, 1
 linep1idx, linep2idx = 0, 1
 
+# the smallest part that plot_in_parts() splits off, in blocks of the smallest unit polygon
+MIN_PART_BLOCKS = 20
+
+class PlotResult():
+    """What plot_proportions_in_region() made.
+
+    "layout" is the Layout of every plotted block, "gdf" is the GeoDataFrame of their polygons, and
+    "telemetry" is a list with a dict for each iteration of filling (see FillEngine). "trace" is the
+    Trace of the plot, with a span for each stage and each iteration of filling (see Tracing.py).
+
+    "orientations" is the table of every orientation tried if the result came from search_orientations(),
+    "parts" is the table of every part if it came from plot_in_parts(), and "seed_scores" is the score
+    of every seed tried, in the order of the seeds, if it came from best_of_seeds().
+    
+    """
+
+    def __init__(self, layout, gdf, telemetry, seed=None, trace=None) -> None:
+        self.layout = layout
+        self.gdf = gdf
+        self.telemetry = telemetry
+        self.seed = seed
+        self.trace = trace
+        self.orientations = None
+        self.parts = None
+        self.seed_scores = None
+
+
+    def revenue(self, blocktypes):
+        """Returns the total revenue of the plotted blocks, where each template makes the blocktype with the same index."""
+
+        revenues = np.array([float(bt.REVENUE) for bt in blocktypes])
+        return revenues[self.layout.blocks['template']].sum()
+
+
+    def score(self, blocktypes, score_by="blocks"):
+        """Returns how good the result is, either by its number of blocks or by its revenue."""
+
+        if score_by=="revenue":
+            return self.revenue(blocktypes)
+        return len(self.layout)
+
+
 def fillMHT(mht):
     mht.addNewBlockType("ht1", 100000, 0, 25, 30)
     mht.addNewBlockType("ht2", 150000, 0, 50, 50)
@@ -58,153 +103,412 @@ def makeUnitPolygons(blocktypes):
 def findPadding(unitPolygons, longestline):
     """Returns blockpadding and rowpadding.
     
-    Blockpadding is the largest parallel length of all unit polygons with a bit added.
-    Rowpadding is the largest perpendicular length of all unit polygons with a bit added.
+    Blockpadding is the largest parallel length of all unit polygons.
+    Rowpadding is the largest perpendicular length of all unit polygons.
 
-    Padding is calculated iteratively.
+    Padding is calculated exactly from the length of each unit polygon when projected onto the
+    longest line and its normal, so blocks at this padding touch but do not overlap.
     
     """
 
-    def calculateDistance(leq, padding=0, increment=10, showDistance=False):
-        """Returns the (slightly increased) distance across the largest polygon, with respect to the
-        given line equation.
-        
-        """
-        
-        originalx = 0
-        originaly = LineFunctions.lineyval(leq, originalx)
-
-        allups = []
-
-        for up in unitPolygons:
-            upcopy = up.copy()
-            up1 = up2 = upcopy.move(blockpoint=Point(originalx, originaly))
-
-            x=0
-            while (True in list(up1.intersects(up2))):
-                x += increment
-                y = LineFunctions.lineyval(leq, x)
-                up2 = upcopy.move(blockpoint=Point(x,y))
-            
-            distance = np.sqrt(np.square(x-originalx) + np.square(y-originaly))
-            if padding<distance : padding = distance
-
-            allups.append(up1)
-            allups.append(up2)
-
-        return padding
+    parallel, perpendicular = LineFunctions.line_axes(longestline)
 
-    leq = LineFunctions.lineEQ(longestline[linep1idx], longestline[linep2idx])
-    blockpadding = calculateDistance(leq, showDistance=False)
-
-    nleq = LineFunctions.normalLineEQ(leq, longestline[linep1idx])
-    rowpadding = calculateDistance(nleq, showDistance=False)
+    blockpadding = max([up.extent(parallel) for up in unitPolygons])
+    rowpadding = max([up.extent(perpendicular) for up in unitPolygons])
 
     return (blockpadding, rowpadding)
 
 
-def plot_proportions_in_region(blocktypes, unitPolygons, proportions, rlppolygon, ax):
+def plot_proportions_in_region(blocktypes, unitPolygons, proportions, rlppolygon, ax, seed=None, line=None, phase=None, progress=None):
     """Plots all blocktypes on the rlp.
     
     The number of blocks of each bt depends on its proportion in proportions.
     
-    Unit polygons are copied and moved around the rlp to create new blocks.
+    Unit polygons are copied and moved around the rlp to create new blocks. Blocks are kept in a
+    Layout until the end, when the polygons of every block are made for plotting.
+
+    Returns a PlotResult.
 
     Blockpadding is for perp lines, while Rowpadding is for parallel lines.
+
+    The rlppolygon is prepared once as a PreparedRegion which every stage uses for containment checks.
+
+    The same seed (an int or a numpy SeedSequence) always gives the same result. Nothing is plotted
+    if ax is None.
+
+    Blocks are plotted parallel to the longest line of the rlp, or to "line" if it is given. The rlp is
+    moved once into a frame where that line is the x axis (see PolygonFunctions.LocalFrame), so every
+    stage works with horizontal rows, and the blocks are only moved back when the output is made.
+
+    The lattice of blockpoints starts at the given phase, or else at the phase where the smallest
+    block fits at the most blockpoints (see BlockFunctions.best_phase()).
+
+    "progress" is called with a progress event (a dict) as each stage starts and after each
+    iteration of filling. Every event has a 'stage', which is one of:
+        'start'   - with the rlppolygon as 'region'
+        'lattice' - with the number of blockpoints as 'blockpoints'
+        'fill'    - with the telemetry of the iteration and the layout so far (see FillEngine.run())
+        'output'  - with the number of blocks as 'blocks'
+
+    Each stage is timed as a span of the trace of the result (see Tracing.py): 'rotation', 'padding',
+    'lattice', 'initPlot', 'fill' (with a span for each iteration), and 'output'.
     
     """
 
-    # fig, ax = plt.subplots()
-    longestline = PolygonFunctions.findLongestLine(rlppolygon)
+    report = progress if progress is not None else (lambda event: None)
+    report({ 'stage': 'start', 'region': rlppolygon })
+
+    trace = Tracing.Trace("plot_proportions_in_region")
+    with trace.activate(), trace.span("plot", seed=None if seed is None else str(seed)):
+
+        # fig, ax = plt.subplots()
+        with trace.span("rotation"):
+            line = PolygonFunctions.findLongestLine(rlppolygon) if line is None else line
+            frame = PolygonFunctions.LocalFrame(line)
+            longestline = frame.line_to_local(line)
+            [up.rotate(line=longestline, should_be_centered=True) for up in unitPolygons]
+            region = PolygonFunctions.PreparedRegion(frame.to_local(rlppolygon), inset_distance=max([up.bounding_radius() for up in unitPolygons]))
+
+        with trace.span("padding"):
+            blockpadding, rowpadding = findPadding(unitPolygons, longestline)
+
+        with trace.span("lattice"):
+            if phase is None:
+                smallest_up = BlockFunctions.smallest_unit_polygon(unitPolygons)
+                phase, phase_counts = BlockFunctions.best_phase(region, longestline, blockpadding, rowpadding, smallest_up)
+            rows_of_bps = BlockFunctions.block_lattice(region, longestline, blockpadding, rowpadding, phase)
+            along, normal = LineFunctions.line_axes(LineFunctions.orderLine(longestline))
+        report({ 'stage': 'lattice', 'blockpoints': sum([len(row) for row in rows_of_bps]) })
+
+        with trace.span("initPlot"):
+            small_layout, blockpoints_as_rows = BlockFunctions.initPlot(False, rows_of_bps, unitPolygons, ax=ax, region=region, showInit=False, along=along)
+
+        with trace.span("fill"):
+            engine = FillEngine(blocktypes, unitPolygons, region, blockpoints_as_rows, along, rng=np.random.default_rng(seed), proportions=proportions, frame=frame)
+            layout = engine.run(progress)
+
+
+        # FLEXING TIME
+        # for row in layout.to_block_ups():
+        #     print(row)
+
+        # so when flexing a flex region, I've gotta check it doesn't overlap with its outer polygon, the houses +-1 of it in
+        #   its row, and with any house in the next or previous row.
+        # 
+        # To flex, I'll take any two consecutive corners of the garden (flex region) and change them by the same value.
+        #   When checking for overlaps, I'll check corners independently
+
+        
+        # THIS ASSUMES ALL ITEMS ARE GDFS
+        report({ 'stage': 'output', 'blocks': len(layout) })
+        with trace.span("output"):
+            merged = layout.to_gdf()
+
+
+    result = PlotResult(layout, merged, engine.telemetry, seed, trace)
+    if ax is not None:
+        plot_result(result, rlppolygon, ax)
+    # geopandas.GeoSeries(merged['Front']).plot(ax=ax, color="red")
+    # geopandas.GeoSeries(parallel_lines+perp_lines).plot(ax=ax, color="red")
+
+    return result
+
+
+def plot_result(result, rlppolygon, ax):
+    """Plots the RLP and the blocks of a PlotResult on the axes."""
+
+    geopandas.GeoSeries(rlppolygon.exterior).plot(ax=ax, color="blue")
+    InputBlocks.plotDXF(result.gdf, ax=ax)
 
-    [up.rotate(line=longestline, should_be_centered=True) for up in unitPolygons]
-    print("PASSED ROTATION")
 
-    horizontal_path_has_longest_line, (linePathX, mX), (linePathY, mY) = PolygonFunctions.findLinePaths(rlppolygon, showPaths=False)
+def _plot_with_seed(blocktypes, unitPolygons, proportions, rlppolygon, seed, line=None):
+    """Runs plot_proportions_in_region() without plotting, for best_of_seeds() and search_orientations()."""
 
-    blockpadding, rowpadding = findPadding(unitPolygons, longestline)
-    print("PASSED PADDING")
+    return plot_proportions_in_region(blocktypes, unitPolygons, proportions, rlppolygon, ax=None, seed=seed, line=line)
 
 
-    if horizontal_path_has_longest_line:
-        perp_lines = BlockFunctions.blocklines(linePathX, blockpadding, rlppolygon, pathIsHorizontal=True, ax=ax, longestline=longestline)
-        parallel_lines = BlockFunctions.blocklines(linePathY, rowpadding, rlppolygon, pathIsHorizontal=False, ax=ax, longestline=longestline)            
-    else:
-        perp_lines = BlockFunctions.blocklines(linePathX, rowpadding, rlppolygon, pathIsHorizontal=True, ax=ax, longestline=longestline)
-        parallel_lines = BlockFunctions.blocklines(linePathY, blockpadding, rlppolygon, pathIsHorizontal=False, ax=ax, longestline=longestline)            
-    print("PASSED BLOCKLINES")
+def best_of_seeds(blocktypes, unitPolygons, proportions, rlppolygon, ax=None, num_seeds=8, seed=None, score_by="blocks", max_workers=None):
+    """Plots the blocktypes on the rlp with "num_seeds" different seeds at once and returns the best PlotResult.
+
+    The best result has the most blocks, or the most revenue if "score_by" is "revenue". The seed of
+    every run is spawned from "seed", so runs are independent of each other and the same seed always
+    gives the same best result.
+
+    Runs are spread over a pool of processes with one process for each core unless "max_workers" is given.
+    Each process gets its own copy of the unit polygons, so the unit polygons given are not rotated.
+
+    The score of every run is kept in the "seed_scores" of the best result.
     
-    blockpoints = []
-    rows_of_bps = []
-    for l1 in parallel_lines:
-        row = []
-        for l2 in perp_lines:
-            blockpoint = intersection(l1, l2)
-            if not blockpoint.is_empty:
-                blockpoints.append(blockpoint)
-                row.append(blockpoint)
-        rows_of_bps.append(row)
-    print("PASSED ROWS_OF_BPS")
+    """
+
+    seeds = np.random.SeedSequence(seed).spawn(num_seeds)
+    max_workers = min(num_seeds, max_workers or os.cpu_count() or 1)
 
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        runs = [ pool.submit(_plot_with_seed, blocktypes, unitPolygons, proportions, rlppolygon, s) for s in seeds ]
+        results = [ run.result() for run in runs ]
+
+    # the first result wins ties, so the best result does not depend on which run finished first
+    best = max( results, key=lambda result: result.score(blocktypes, score_by) )
+    best.seed_scores = [ result.score(blocktypes, score_by) for result in results ]
+
+    if ax is not None:
+        plot_result(best, rlppolygon, ax)
+    return best
+
+
+def candidate_lines(rlppolygon, sweep_degrees=15, merge_degrees=0.5, max_edge_lines=24):
+    """Returns a dict of lines to try plotting blocks parallel to, keyed by their angle in degrees.
+
+    There is a line for the edges of the rlp, and a line every "sweep_degrees" degrees (if it is
+    not None). Angles are between 0 and 180 degrees as a line and its reverse give the same rows.
+
+    Edges within "merge_degrees" of each other give the same rows up to a few blocks, so they are
+    grouped and give a single line, at the angle of the longest edge of the group. Only the
+    "max_edge_lines" groups with the longest edges in total are kept, so rlps with many short edges
+    (like curved boundaries) do not give hundreds of lines. Sweep angles within "merge_degrees" of
+    an edge line are left out.
     
-    smallBlocks_as_rows, blockpoints_as_rows = BlockFunctions.initPlot(False, rows_of_bps, unitPolygons, ax=ax, rlppolygon=rlppolygon, showInit=False)
-    num_blocks = len( [bp for row in blockpoints_as_rows for bp in row] )
-
-    new_blocks_as_rows = []
-    no_change = 0
-    counter=0
-    while no_change < 5:
-        counter+=1
-        print("counter=", counter)
-        prev_blocks = new_blocks_as_rows
-        
-        plotting_guide = indexweightrandom(numspaces=num_blocks, blocktypes=blocktypes, rows=blockpoints_as_rows)
-        new_blocks_as_rows = BlockFunctions.plotNewBlocks(blockpoints_as_rows, unitPolygons, plotting_guide, ax, rlppolygon, current_plot=new_blocks_as_rows, showBlocks=False)
-        BlockFunctions.move_blocks_left(new_blocks_as_rows, rlppolygon, ax=ax)
+    """
+
+    coords = np.asarray(rlppolygon.exterior.coords)
+    edges = np.diff(coords, axis=0)
+    lengths = np.hypot(edges[:, X], edges[:, Y])
+    edges, lengths = edges[lengths > 0], lengths[lengths > 0]
+    angles = np.mod( np.degrees(np.arctan2(edges[:, Y], edges[:, X])), 180 )
+
+    groups = []
+    if len(angles):
+        order = np.argsort(angles)
+        angles, lengths = angles[order], lengths[order]
+        # groups start after the largest gap between angles, so no group is split where angles wrap around at 180
+        gaps = np.diff( np.append(angles, angles[0] + 180) )
+        start = (np.argmax(gaps) + 1) % len(angles)
+        angles, lengths = np.roll(angles, -start), np.roll(lengths, -start)
+        unwrapped = np.where( np.arange(len(angles)) < len(angles) - start, angles, angles + 180 ) if start else angles
+
+        first = 0
+        for i in range(1, len(angles) + 1):
+            if i == len(angles) or unwrapped[i] - unwrapped[first] > merge_degrees:
+                longest = first + np.argmax(lengths[first:i])
+                groups.append( (lengths[first:i].sum(), angles[longest]) )
+                first = i
+
+    kept = [ angle for total, angle in sorted(groups, key=lambda group: -group[0])[:max_edge_lines] ]
+    if sweep_degrees:
+        for angle in np.arange(0, 180, sweep_degrees):
+            distances = np.abs( np.mod(np.array(kept) - angle + 90, 180) - 90 )
+            if not len(kept) or distances.min() > merge_degrees:
+                kept.append(angle)
+
+    lines = {}
+    for angle in sorted( set(np.round(kept, 6)) ):
+        direction = ( np.cos(np.radians(angle)), np.sin(np.radians(angle)) )
+        lines[float(angle)] = LineString([ (0, 0), direction ]).coords
+    return lines
+
+
+def search_orientations(blocktypes, unitPolygons, proportions, rlppolygon, ax=None, sweep_degrees=15, seed=None, score_by="blocks", max_workers=None, max_edge_lines=24):
+    """Plots the blocktypes on the rlp at several orientations at once and returns the best PlotResult.
+
+    The orientations are the edges of the rlp and a sweep of angles (see candidate_lines()). Before
+    plotting, each orientation gets an upper bound on how many blocks could fit (see
+    BlockFunctions.capacity_bound()), and orientations are plotted from the highest bound down.
+    Orientations whose bound cannot beat the best number of blocks so far are left out.
+
+    Runs are spread over a pool of processes with one process for each core unless "max_workers" is given.
+    Which orientations are left out can depend on which runs finish first, but the best result cannot:
+    an orientation that is left out could at most tie the best result, and ties go to the orientation
+    with the higher bound, which was already plotted.
+
+    The "orientations" of the best result is a list with a dict for every orientation:
+        'angle'  - the angle of the rows in degrees
+        'bound'  - the upper bound on the number of blocks
+        'blocks' - the number of blocks plotted, or None if it was left out
+        'score'  - the score of the result (see PlotResult.score()), or None if it was left out
     
-        sanitised_blocks = []
-        for row in new_blocks_as_rows:
-            trow = []
-            for up in row:
-                if up.is_contained_by(rlppolygon):
-                    trow.append(up)
-                else:
-                    print("block outside plot")
-            sanitised_blocks.append(trow)
-        new_blocks_as_rows=sanitised_blocks
-
-        sizeprev = len([block for row in prev_blocks for block in row])
-        sizenew = len([block for row in new_blocks_as_rows for block in row])
-
-        if sizeprev==sizenew:
-            no_change+=1
-        print("sizenew=", sizenew)
-
-        # uncomment for a quicker, less useful answer.
-        # break
-
-
-    # FLEXING TIME
-    # for row in new_blocks_as_rows:
-    #     print(row)
-
-    # so when flexing a flex region, I've gotta check it doesn't overlap with its outer polygon, the houses +-1 of it in
-    #   its row, and with any house in the next or previous row.
-    # 
-    # To flex, I'll take any two consecutive corners of the garden (flex region) and change them by the same value.
-    #   When checking for overlaps, I'll check corners independently
+    """
 
-        
-    blocks_to_plot = [up.item_to_plot for row in new_blocks_as_rows for up in row]
+    table = []
+    for angle, line in candidate_lines(rlppolygon, sweep_degrees, max_edge_lines=max_edge_lines).items():
+        # bounds are worked out in the frame of the line, as plot_proportions_in_region() plots in it
+        frame = PolygonFunctions.LocalFrame(line)
+        local_line = frame.line_to_local(line)
+        ups = [BlockFunctions.UnitPolygon(type=up.type, item_to_plot=up.item_to_plot.copy(), template=up.template) for up in unitPolygons]
+        [up.rotate(line=local_line, should_be_centered=True) for up in ups]
+        region = PolygonFunctions.PreparedRegion(frame.to_local(rlppolygon))
+        blockpadding, rowpadding = findPadding(ups, local_line)
+        bound = BlockFunctions.capacity_bound(region, local_line, ups, rowpadding)
+        table.append({ 'angle': angle, 'bound': bound, 'blocks': None, 'score': None, 'line': line })
+    table.sort(key=lambda row: -row['bound'])
 
-    # THIS ASSUMES ALL ITEMS ARE GDFS
-    merged = blocks_to_plot[0]
-    for i in range( 1, len(blocks_to_plot) ):
-        merged = merge(left=merged, right=blocks_to_plot[i], how="outer")
-    InputBlocks.update_dxf_front(merged)
+    # the bound is on the number of blocks, so the most revenue is the bound with every block the most valuable
+    best_revenue = max([float(bt.REVENUE) for bt in blocktypes])
+    for row in table:
+        row['best_score'] = row['bound'] * (best_revenue if score_by=="revenue" else 1)
 
+    max_workers = min(len(table), max_workers or os.cpu_count() or 1)
+    best, best_key = None, None
+    waiting, running = list(enumerate(table)), {}
 
-    geopandas.GeoSeries(rlppolygon.exterior).plot(ax=ax, color="blue")
-    InputBlocks.plotDXF(merged, ax=ax)
-    # geopandas.GeoSeries(merged['Front']).plot(ax=ax, color="red")
-    # geopandas.GeoSeries(parallel_lines+perp_lines).plot(ax=ax, color="red")
\ No newline at end of file
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while waiting or running:
+            while waiting and len(running) < max_workers:
+                i, row = waiting.pop(0)
+                if best is None or row['best_score'] > best_key[0]:
+                    running[ pool.submit(_plot_with_seed, blocktypes, unitPolygons, proportions, rlppolygon, seed, row['line']) ] = (i, row)
+
+            done, not_done = wait(running, return_when=FIRST_COMPLETED)
+            for run in done:
+                i, row = running.pop(run)
+                result = run.result()
+                row['blocks'] = len(result.layout)
+                row['score'] = result.score(blocktypes, score_by)
+                # ties go to the orientation with the higher bound, so the best result does not depend on timing
+                if best is None or (row['score'], -i) > best_key:
+                    best, best_key = result, (row['score'], -i)
+
+    for row in table:
+        del row['line'], row['best_score']
+    best.orientations = sorted(table, key=lambda row: row['angle'])
+
+    if ax is not None:
+        plot_result(best, rlppolygon, ax)
+    return best
+
+
+def _grow_part(part, rlppolygon, seam):
+    """Returns the part grown by "seam" into the rest of the rlp, without any pieces that are not next to the part."""
+
+    grown = shapely.intersection( part.buffer(seam, join_style="mitre"), rlppolygon )
+    pieces = [piece for piece in shapely.get_parts(grown) if piece.geom_type == "Polygon"]
+    return max( pieces, key=lambda piece: piece.intersection(part).area )
+
+
+def _row_angle(part):
+    """Returns the angle in degrees (from 0 to 180) of the rows that plot_proportions_in_region() plots the part with."""
+
+    (x1, y1), (x2, y2) = PolygonFunctions.findLongestLine(part)[:2]
+    return np.degrees( np.arctan2(y2-y1, x2-x1) ) % 180
+
+
+def merge_parallel_parts(parts, angle_tolerance=5):
+    """Returns the parts with every two parts that touch and have rows within "angle_tolerance" degrees of each other merged into one.
+
+    Parts with the same rows gain nothing from being plotted apart, and would only lose blocks at the
+    seam between them.
+
+    """
+
+    parts = list(parts)
+    merging = True
+    while merging:
+        merging = False
+        for i in range(len(parts)):
+            for j in range(i+1, len(parts)):
+                difference = abs(_row_angle(parts[i]) - _row_angle(parts[j]))
+                if min(difference, 180-difference) <= angle_tolerance and parts[i].intersection(parts[j]).length > 0:
+                    merged = shapely.union(parts[i], parts[j])
+                    if merged.geom_type == "Polygon":
+                        parts[i] = merged
+                        del parts[j]
+                        merging = True
+                        break
+            if merging:
+                break
+
+    return sorted(parts, key=lambda part: -part.area)
+
+
+def plot_in_parts(blocktypes, unitPolygons, proportions, rlppolygon, ax=None, seed=None, score_by="blocks", min_convexity=0.9, max_parts=8, seam=None, max_workers=None):
+    """Splits a concave rlp into near-convex parts, plots every part at once, and returns the merged PlotResult.
+
+    The rlp is split by PolygonFunctions.decompose(), without splitting off parts that hold fewer than
+    MIN_PART_BLOCKS of the smallest unit polygon. Each part is plotted with its own orientation and
+    lattice, parallel to its own longest line (see plot_proportions_in_region()), so an L shaped or
+    notched rlp is not plotted with one orientation that only suits some of it. Parts whose rows
+    would be parallel are merged back together first (see merge_parallel_parts()).
+
+    Parts are grown by "seam" (the largest bounding radius of the unit polygons by default) into the
+    parts next to them, so that blocks are not kept back from the seams. Blocks of two parts may then
+    overlap at a seam, so in the seam pass the parts are merged from the one with the most blocks down,
+    and a block that collides with a block that was already merged is dropped.
+
+    The whole rlp is plotted as well, alongside the parts, and is returned instead if it is at least as
+    good (by "score_by", see PlotResult.score()), so splitting the rlp never makes the result worse.
+    An rlp that is not split is plotted like plot_proportions_in_region() with the same seed.
+
+    Plots are spread over a pool of processes with one process for each core unless "max_workers" is
+    given, and the seed of each part is spawned from "seed". The merged layout has no frame, and each
+    of its blocks is rotated to the rows of its part (see Layout.in_world()).
+
+    The "parts" of the result is a list with a dict for every part of the result:
+        'area'    - the area of the part, before it was grown
+        'angle'   - the angle of its rows in degrees
+        'blocks'  - the number of blocks plotted in it
+        'dropped' - the number of its blocks dropped in the seam pass
+
+    """
+
+    trace = Tracing.Trace("plot_in_parts")
+    with trace.activate(), trace.span("plot", seed=None if seed is None else str(seed)):
+
+        with trace.span("decompose"):
+            smallest_up = BlockFunctions.smallest_unit_polygon(unitPolygons)
+            parts = PolygonFunctions.decompose(rlppolygon, min_convexity, MIN_PART_BLOCKS*smallest_up.union_area(), max_parts)
+            parts = merge_parallel_parts(parts)
+            seam = max([up.bounding_radius() for up in unitPolygons]) if seam is None else seam
+
+        with trace.span("parts", parts=len(parts)):
+            if len(parts) == 1:
+                whole, results = _plot_with_seed(blocktypes, unitPolygons, proportions, rlppolygon, seed), []
+            else:
+                grown_parts = [ _grow_part(part, rlppolygon, seam) for part in parts ]
+                seeds = np.random.SeedSequence(seed).spawn(len(parts))
+                max_workers = min(1+len(parts), max_workers or os.cpu_count() or 1)
+                with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                    runs = [ pool.submit(_plot_with_seed, blocktypes, unitPolygons, proportions, part, s) for part, s in zip(grown_parts, seeds) ]
+                    whole_run = pool.submit(_plot_with_seed, blocktypes, unitPolygons, proportions, rlppolygon, seed)
+                    results = [ run.result() for run in runs ]
+                    whole = whole_run.result()
+
+        with trace.span("seams"):
+            # every part rotates the templates parallel to the x axis of its frame, so the templates
+            # of every part are the same, and each block only needs to be moved out of its frame
+            layouts = [ result.layout.in_world() for result in results ]
+            table = [ _part_row(part, result) for part, result in zip(parts, results) ]
+
+            merged = Layout(whole.layout.templates, whole.layout.along @ whole.layout.frame.matrix)
+            placement_index = BlockFunctions.PlacementIndex()
+            # ties go to the larger part, as parts are from the largest down
+            for i in sorted( range(len(results)), key=lambda i: -len(layouts[i]) ):
+                layout = layouts[i]
+                footprints, fits = layout.footprints()
+                collides = placement_index.collides_many(footprints)
+                table[i]['dropped'] = int( np.count_nonzero(collides) )
+                layout.keep(~collides)
+
+                # rows of different parts are kept apart
+                layout.blocks['row'] += 1 + int(merged.blocks['row'].max()) if len(merged) else 0
+                merged.extend(layout)
+                placement_index = BlockFunctions.PlacementIndex.of_layout(merged)
+
+        telemetry = [ { **record, 'part': i } for i, result in enumerate(results) for record in result.telemetry ]
+        result = PlotResult(merged, None, telemetry, seed, trace)
+        if results and result.score(blocktypes, score_by) > whole.score(blocktypes, score_by):
+            with trace.span("output"):
+                result.gdf = merged.to_gdf()
+        else:
+            result, table = whole, [ _part_row(rlppolygon, whole) ]
+            result.trace = trace
+
+    result.parts = table
+    if ax is not None:
+        plot_result(result, rlppolygon, ax)
+    return result
+
+
+def _part_row(part, result):
+    """Returns the row of a part plotted as the result, for the "parts" of plot_in_parts()."""
+
+    return { 'area': part.area, 'angle': float(np.degrees(result.layout.frame.angle)), 'blocks': len(result.layout), 'dropped': 0 }
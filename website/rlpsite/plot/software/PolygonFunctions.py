@@ -1,24 +1,210 @@
 """"Supporting functions when working with polygons."""
 
 from shapely import Polygon, LineString, affinity, centroid, Point
-from matplotlib import use
 import geopandas
-import matplotlib.pyplot as plt
 import numpy as np
+import shapely
 
 
 try:
-    from ..software import LineFunctions
-    use('agg')
+    from ..software import LineFunctions, Tracing
 
 except ImportError:
-    import LineFunctions
+    import LineFunctions, Tracing
 
 
 X,Y = 0,1
 linep1idx, linep2idx = 0, 1
 
 
+class LocalFrame():
+    """A frame where rows of blocks run along the x axis, made once for the line that rows are parallel to.
+
+    The origin of the frame is the first point of the line (see LineFunctions.orderLine()), and its x
+    axis is at the angle to the horizontal that LineFunctions.findAngle() gives, so vertical lines are
+    no different to any other line. Plotting in the frame makes the lattice, containment checks, and
+    moving blocks along rows axis-aligned. Only the RLP is moved into the frame, and only the output
+    is moved back out of it.
+    
+    """
+
+    def __init__(self, line) -> None:
+        line = LineFunctions.orderLine(line)
+        self.origin = np.array(line[linep1idx], dtype=float)
+        self.angle = LineFunctions.findAngle(LineString(line))
+        # the axes are made from the line itself rather than from the angle, so vertical and
+        # horizontal lines give axes of exactly 0 and 1 (cos(pi/2) is not quite 0)
+        direction = np.array(line[linep2idx], dtype=float) - self.origin
+        self.length = np.hypot(*direction)
+        self.along = direction / self.length if direction[X] > 0 else np.array([0.0, 1.0])
+        self.normal = np.array([-self.along[Y], self.along[X]])
+        # each row is an axis of the frame
+        self.matrix = np.array([self.along, self.normal])
+
+
+    def coords_to_local(self, coords):
+        """Returns an (N, 2) array of coordinates moved into the frame.
+
+        Coordinates on the line, up to float error, are put exactly on the x axis, so rows of blocks
+        that touch the line are not left out because the line is a hair off the axis.
+
+        """
+
+        local = (np.asarray(coords, dtype=float) - self.origin) @ self.matrix.T
+        local[ np.abs(local[..., Y]) <= 1e-12 * max(self.length, 1), Y ] = 0
+        return local
+
+
+    def coords_to_world(self, coords):
+        """Returns an (N, 2) array of coordinates in the frame moved back to where they were."""
+
+        return np.asarray(coords, dtype=float) @ self.matrix + self.origin
+
+
+    def to_local(self, geometry):
+        """Returns a geometry (or an array of geometries) moved into the frame."""
+
+        return shapely.transform(geometry, self.coords_to_local)
+
+
+    def to_world(self, geometry):
+        """Returns a geometry (or an array of geometries) in the frame moved back to where it was."""
+
+        return shapely.transform(geometry, self.coords_to_world)
+
+
+    def line_to_local(self, line):
+        """Returns the coords of a line moved into the frame, like findLongestLine() returns."""
+
+        return LineString( self.coords_to_local(line) ).coords
+
+
+class PreparedRegion():
+    """An RLP prepared once for the many containment checks made while plotting.
+
+    Holds the prepared polygon, its bounding box to quickly reject shapes outside it, and an
+    inset polygon to quickly accept small shapes far enough inside it. Only shapes that are
+    neither rejected nor accepted this way are checked exactly against the polygon.
+
+    Stages of the plotting process take a PreparedRegion wherever they used to take the rlppolygon.
+    
+    """
+
+    def __init__(self, polygon, inset_distance=0) -> None:
+        """Prepares the polygon.
+        
+        Shapes whose bounding box fits in a circle of radius "inset_distance" can be accepted
+        using only the inset polygon.
+        
+        """
+
+        self.polygon = polygon
+        shapely.prepare(self.polygon)
+        self.bounds = np.array(polygon.bounds)
+        self.set_inset(inset_distance)
+
+
+    @classmethod
+    def of(cls, region):
+        """Returns the region if it is already a PreparedRegion, or prepares it if it is a polygon."""
+
+        if isinstance(region, cls):
+            return region
+        return cls(region)
+
+
+    def set_inset(self, inset_distance):
+        """Remakes the inset polygon for shapes within a circle of radius "inset_distance".
+
+        The polygon is inset slightly further than the distance because buffers approximate arcs with lines.
+        
+        """
+
+        self.inset_distance = inset_distance
+        self.inset = None
+        if inset_distance > 0:
+            self.inset = self.polygon.buffer(-1.01*inset_distance)
+            shapely.prepare(self.inset)
+
+
+    def contains(self, shape):
+        """Returns True if the shape is inside the region."""
+
+        return bool( self.contains_many(np.array([shape], dtype=object))[0] )
+
+
+    def contains_many(self, shapes):
+        """Returns a boolean array which is True where the shape in the array of shapes is inside the region.
+
+        Missing shapes (None) are never inside the region.
+        
+        """
+
+        shapes = np.asarray(shapes, dtype=object)
+        result = np.zeros(shapes.shape, dtype=bool)
+        present = ~shapely.is_missing(shapes)
+
+        minx, miny, maxx, maxy = np.moveaxis(shapely.bounds(shapes), -1, 0)
+        undecided = present & (minx>=self.bounds[0]) & (miny>=self.bounds[1]) & (maxx<=self.bounds[2]) & (maxy<=self.bounds[3])
+
+        if self.inset is not None:
+            small = undecided & ( np.hypot(maxx-minx, maxy-miny)/2 <= self.inset_distance )
+            accepted = np.zeros(shapes.shape, dtype=bool)
+            accepted[small] = shapely.contains_xy(self.inset, (minx[small]+maxx[small])/2, (miny[small]+maxy[small])/2)
+            Tracing.count("predicates", int(np.count_nonzero(small)))
+            result |= accepted
+            undecided &= ~accepted
+
+        result[undecided] = shapely.contains(self.polygon, shapes[undecided])
+        Tracing.count("predicates", int(np.count_nonzero(undecided)))
+        return result
+
+
+    def distance_to_boundary(self, shapes, direction):
+        """Returns how far the shapes can be moved in the given direction (a vector) before touching the boundary of the region.
+
+        The shapes are moved together, so the distance is exact: it is where a vertex of the shapes
+        first hits an edge of the boundary, or a vertex of the boundary first hits an edge of the shapes.
+        Touches at the start are ignored. Returns infinity if the shapes never touch the boundary.
+
+        """
+
+        d = np.asarray(direction, dtype=float)
+        d = d / np.hypot(*d)
+
+        shapes = [shape for shape in shapes if shape is not None]
+        shape_rings = [shapely.get_rings(shape) for shape in shapes]
+        shape_segments = _segments(np.concatenate(shape_rings))
+        boundary_segments = _segments(shapely.get_rings(self.polygon))
+
+        distance = min( _ray_distance(shape_segments[:, 0], boundary_segments, d),
+                        _ray_distance(boundary_segments[:, 0], shape_segments, -d) )
+        return distance
+
+
+def _segments(rings):
+    """Returns the edges of the rings as an (N, 2, 2) array of start and end points."""
+
+    segments = [ np.stack((coords[:-1], coords[1:]), axis=1) for coords in (shapely.get_coordinates(ring) for ring in rings) ]
+    return np.concatenate(segments)
+
+
+def _ray_distance(points, segments, d, tolerance=1e-9):
+    """Returns the smallest distance any point travels in the direction d (a unit vector) before hitting a segment."""
+
+    a, b = segments[None, :, 0], segments[None, :, 1]
+    p = points[:, None]
+    edge = b - a
+    denom = d[X]*edge[..., Y] - d[Y]*edge[..., X]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = ( (a-p)[..., X]*edge[..., Y] - (a-p)[..., Y]*edge[..., X] ) / denom
+        u = ( (a-p)[..., X]*d[Y] - (a-p)[..., Y]*d[X] ) / denom
+
+    hits = (denom!=0) & (u>=0) & (u<=1) & (t>tolerance)
+    return t[hits].min() if hits.any() else np.inf
+
+
 def findLongestLineIndex(polygon):
     """Supporting method to find the longest line and adjacent line.
     
@@ -173,6 +359,7 @@ def findLinePaths(polygon, showPaths=False):
 
 
     if showPaths:
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots()
         geopandas.GeoSeries(polygon.exterior).plot(ax=ax, color="blue")
         geopandas.GeoSeries([LineString(c) for c in xpath]).plot(ax=ax, color="green")
@@ -204,6 +391,7 @@ def rotatePolygon(resultLine, polygon, showRotation=False):
     
 
     if showRotation:
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots()
         geopandas.GeoSeries(oldPolygon).plot(ax=ax, color="red")
         geopandas.GeoSeries(polygon).plot(ax=ax, color="green")
@@ -238,6 +426,7 @@ def moveToOrigin(polygon, showTranslation=False):
     shiftcoords = [(coord[X]-leftmost, coord[Y]-bottom) for coord in polygon.exterior.coords[:-1]]
 
     if showTranslation:
+        import matplotlib.pyplot as plt
         ax = geopandas.GeoSeries(Polygon(shiftcoords).exterior).plot(color="green")
         geopandas.GeoSeries(polygon.exterior).plot(ax=ax, color="red")
         plt.show()
@@ -260,6 +449,7 @@ def centerAtOrigin(polygon, showTranslation=False):
     shiftcoords = [(coord[X]-center.x, coord[Y]-center.y) for coord in polygon.exterior.coords[:-1]]
 
     if showTranslation:
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots()
         pold = polygon
         pnew = Polygon(shiftcoords)
@@ -270,4 +460,107 @@ def centerAtOrigin(polygon, showTranslation=False):
         geopandas.GeoSeries( Point( (0,0) ) ).plot(ax=ax, color="blue")
         plt.show()
     
-    return Polygon(shiftcoords)
\ No newline at end of file
+    return Polygon(shiftcoords)
+
+def convexity(polygon):
+    """Returns the area of the polygon divided by the area of its convex hull, which is 1 for a convex polygon."""
+
+    hull_area = polygon.convex_hull.area
+    return polygon.area / hull_area if hull_area else 1.0
+
+
+def _cut_lines(polygon, max_cuts):
+    """Returns lines that cut the polygon from its deepest reflex vertices, along the edges of those vertices.
+
+    A reflex vertex is a corner of the exterior that points into the polygon. Each one gives two cuts,
+    which carry on each of its edges past it until they leave the polygon. Only the "max_cuts" vertices
+    furthest from the convex hull are used, as they make the deepest notches.
+
+    """
+
+    coords = np.asarray(shapely.geometry.polygon.orient(polygon).exterior.coords)[:-1]
+    incoming = coords - np.roll(coords, 1, axis=0)
+    outgoing = np.roll(coords, -1, axis=0) - coords
+    # the exterior is anticlockwise, so reflex vertices turn right (by more than float error, as
+    # vertices along a straight edge are not corners)
+    lengths = np.hypot(incoming[:, X], incoming[:, Y]) * np.hypot(outgoing[:, X], outgoing[:, Y])
+    turns = (incoming[:, X]*outgoing[:, Y] - incoming[:, Y]*outgoing[:, X]) / np.where(lengths > 0, lengths, 1)
+    reflex = np.flatnonzero(turns < -1e-9)
+
+    depths = shapely.distance(shapely.points(coords[reflex]), polygon.convex_hull.exterior)
+    reflex = reflex[ np.argsort(-depths, kind="stable")[:max_cuts] ]
+
+    minx, miny, maxx, maxy = polygon.bounds
+    reach = np.hypot(maxx-minx, maxy-miny)
+    lines = []
+    for i in reflex:
+        for direction in (incoming[i], -outgoing[i]):
+            length = np.hypot(*direction)
+            if length == 0:
+                continue
+            direction = direction / length
+            ray = LineString([ coords[i], coords[i] + direction*reach ])
+            # the cut starts at the vertex and ends where the ray first leaves the polygon, going a little
+            # past the end so that it crosses the boundary despite float error (see _split())
+            inside = shapely.get_parts( shapely.line_merge(shapely.intersection(ray, polygon)) )
+            starts = [line for line in inside if line.geom_type == "LineString" and Point(coords[i]).distance(line) < 1e-9]
+            if starts:
+                end = np.asarray(starts[0].coords[-1])
+                lines.append( LineString([ coords[i], end + direction*1e-6*reach ]) )
+    return lines
+
+
+def _split(polygon, line):
+    """Returns the parts that the line cuts the polygon into.
+
+    The line is noded with the boundary of the polygon, so it only has to touch the boundary where it
+    starts. shapely.ops.split() needs lines that cross the boundary at both ends, which a cut that
+    starts at a vertex of a slanted edge only does by float error.
+
+    """
+
+    faces = shapely.get_parts( shapely.polygonize([ shapely.union(polygon.boundary, line) ]) )
+    return [face for face in faces if polygon.contains(face.representative_point())]
+
+
+def split_at_best_cut(polygon, min_area=0, max_cuts=16):
+    """Returns the parts of the polygon after the cut (see _cut_lines()) that makes them the most convex, or None.
+
+    How convex the parts are is the convexity of each part weighted by its area. Cuts that leave a part
+    smaller than "min_area", or that do not make the parts more convex than the polygon, are not used.
+
+    """
+
+    best, best_score = None, convexity(polygon)
+    for line in _cut_lines(polygon, max_cuts):
+        parts = _split(polygon, line)
+        if len(parts) < 2 or min([part.area for part in parts]) < min_area:
+            continue
+        score = sum([part.area * convexity(part) for part in parts]) / polygon.area
+        if score > best_score:
+            best, best_score = parts, score
+    return best
+
+
+def decompose(polygon, min_convexity=0.9, min_area=0, max_parts=8):
+    """Splits a concave polygon into near-convex parts, and returns them as a list from the largest down.
+
+    The part that is furthest from convex (by the area between it and its convex hull) is split at its
+    best cut (see split_at_best_cut()) until every part has a convexity of at least "min_convexity",
+    no part can be cut without leaving a part smaller than "min_area", or there are "max_parts" parts.
+
+    A polygon that is already convex enough is returned as the only part.
+
+    """
+
+    parts, done = [polygon], []
+    while parts and len(parts) + len(done) < max_parts:
+        part = max(parts, key=lambda part: part.convex_hull.area - part.area)
+        parts.remove(part)
+        pieces = split_at_best_cut(part, min_area) if convexity(part) < min_convexity else None
+        if pieces is None:
+            done.append(part)
+        else:
+            parts.extend(pieces)
+
+    return sorted(done + parts, key=lambda part: -part.area)
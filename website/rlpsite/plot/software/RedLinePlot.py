@@ -1,8 +1,4 @@
 import geopandas
-from matplotlib import pyplot as plt
-import folium as folium
-from folium.plugins import Draw
-import webbrowser
 import os
 
 
@@ -26,6 +22,8 @@ def get_one_RLP(path_to_rlp):
 
 def openRLP(directory_path):
     """Opens graphs for all datageojson files in the given directory path."""
+
+    from matplotlib import pyplot as plt
     
     for dgj in os.listdir( directory_path ):
         rlp_path = directory_path+'/'+dgj
@@ -49,6 +47,10 @@ def get_RLPs_from_directory_path(directory_path):
 def makeEmptyMap():
     """Makes an empty world map to draw the red line plot on."""
 
+    import folium as folium
+    from folium.plugins import Draw
+    import webbrowser
+
     fmap = folium.Map(location=(51.5,0.127))
     Draw(export=True).add_to(fmap)
     fmap.save('map.html')
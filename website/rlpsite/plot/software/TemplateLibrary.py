@@ -0,0 +1,241 @@
+"""Compiles DXF templates of houses once, so that plotting never reads the same DXF twice.
+
+A compiled template is the cleaned dxfblock from InputBlocks.readDXF() centered at the origin,
+along with everything about its shape that plotting would otherwise work out again for every
+block: its area, center, convex hull, and the template rotated to the usual orientations. A
+UnitPolygon of a template takes these (rotated with it) rather than measuring itself (see
+UnitPolygon.of_template()).
+
+A TemplateLibrary keeps compiled templates in memory, and in files in its cache directory (if it
+has one), keyed by the hash of the DXF file. Compiling a DXF that was compiled before, even from
+another path or in another process, only reads the cache file.
+
+A DXF that holds many house types is compiled into a template for each house type at once, by
+going through the file a single time (see DXFReader.py).
+
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import shapely
+
+try:
+    from ..software import LineFunctions, InputBlocks, DXFReader
+
+except ImportError:
+    import LineFunctions, InputBlocks, DXFReader
+
+
+X, Y = 0, 1
+
+# changes to how templates are compiled should bump this, so old cache files are not used
+TEMPLATE_VERSION = 2
+
+
+def file_hash(path):
+    """Returns the sha256 of the file as a hex string, or of its path if the file cannot be read."""
+
+    digest = hashlib.sha256()
+    if not os.path.exists(path):
+        digest.update(b"path:" + str(path).encode())
+        return digest.hexdigest()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def rotation(angle):
+    """Returns a function that rotates an (N, 2) array of coordinates anticlockwise about the origin by the angle (in radians)."""
+
+    cos, sin = np.cos(angle), np.sin(angle)
+    return lambda coords: coords @ np.array([ [cos, sin], [-sin, cos] ])
+
+
+class CompiledTemplate():
+    """A DXF template that has been read and measured once.
+
+    "dxfblock" is the template centered at the origin (the centroid of the union of its polygons),
+    as made by InputBlocks.readDXF(). The other attributes describe its shape:
+        'polygons'    - the polygons of the dxfblock as an array
+        'area'        - the area of the union of the polygons
+        'center'      - the centroid of the union of the polygons, which is the origin up to float error
+        'convex_hull' - the convex hull of the polygons
+        'base_angle'  - the angle of the front of the house to the horizontal (see LineFunctions.findAngle())
+
+    Rotations of the polygons about the origin are kept in "rotations", keyed by their angle.
+    Rotations for lines every "rotation_step" degrees are made when compiling, and any others are
+    made when they are first used.
+
+    """
+
+    def __init__(self, dxfblock, digest, rotation_step=15) -> None:
+        """Measures the dxfblock, which must already be centered at the origin."""
+
+        self.dxfblock = dxfblock
+        self.digest = digest
+        self.polygons = np.asarray(dxfblock.geometry, dtype=object)
+
+        union = shapely.union_all(self.polygons)
+        self.area = union.area
+        self.center = shapely.get_coordinates(union.centroid)[0]
+        self.convex_hull = union.convex_hull
+
+        house = self.polygons[ (dxfblock['Section'] == 'HOUSE NEW').to_numpy() ][0]
+        front = shapely.LineString(house.exterior.coords[:2])
+        self.base_angle = LineFunctions.findAngle(front)
+
+        self.rotations = {}
+        if rotation_step:
+            # findAngle() gives the angle of a line between -90 and 90 degrees
+            for line_angle in np.arctan( np.tan(np.radians(np.arange(0, 180, rotation_step))) ):
+                self.rotated(line_angle - self.base_angle)
+
+
+    def rotated(self, angle):
+        """Returns the polygons rotated anticlockwise about the origin by the angle (in radians), as an array."""
+
+        key = round(float(angle), 9)
+        if key not in self.rotations:
+            self.rotations[key] = shapely.transform(self.polygons, rotation(key))
+        return self.rotations[key]
+
+
+    def shapes(self, angle=0):
+        """Returns the area, center, and convex hull of the template rotated like rotated(), as the "shapes" of a UnitPolygon."""
+
+        rotate = rotation( round(float(angle), 9) )
+        return { 'union_area': self.area, 'center': rotate(self.center[None, :])[0], 'convex_hull': shapely.transform(self.convex_hull, rotate) }
+
+
+    def angle_to(self, line):
+        """Returns the angle (in radians) that the template is rotated by to make the front of the house parallel to the line."""
+
+        return LineFunctions.findAngle(line) - self.base_angle
+
+
+    def parallel_to(self, line):
+        """Returns a *copy* of the dxfblock rotated until the front of the house is parallel to the line.
+
+        This gives the same dxfblock as InputBlocks.dxf_parallel_to_ll(), without measuring the house again.
+
+        """
+
+        block = self.dxfblock.copy()
+        block.geometry = self.rotated( self.angle_to(line) )
+        return block
+
+
+class TemplateLibrary():
+    """Compiled templates, kept in memory and in "cache_dir" (if it is given) by the hash of their DXF file.
+
+    Cache files are pickles, so the cache directory should only be writable by this software.
+
+    """
+
+    def __init__(self, cache_dir=None, rotation_step=15) -> None:
+        self.cache_dir = cache_dir
+        self.rotation_step = rotation_step
+        self.templates = {}
+        self.house_types = {}
+
+
+    def get(self, path=InputBlocks.DXF_PATH):
+        """Returns the compiled template of the DXF file at the path, compiling it if it has not been compiled before."""
+
+        digest = file_hash(path)
+        if digest not in self.templates:
+            template = self.load(digest)
+            if template is None:
+                (dxfblock, gardens, parking, house) = InputBlocks.readDXF(path)
+                template = CompiledTemplate(dxfblock, digest, rotation_step=self.rotation_step)
+                self.save(template, digest)
+            self.templates[digest] = template
+        return self.templates[digest]
+
+
+    def get_house_types(self, path, layers=DXFReader.LAYERS):
+        """Returns a compiled template for every house type in the DXF file at the path, as a dict keyed by the name of the house type.
+
+        The file is only read the first time, in a single pass (see DXFReader.read_houses()).
+
+        """
+
+        digest = file_hash(path)
+        key = "%s-%s" % (digest, hashlib.sha256(repr(tuple(layers)).encode()).hexdigest()[:16])
+        if key not in self.house_types:
+            templates = self.load(key)
+            if templates is None:
+                templates = {}
+                (dxfblocks, gardens, parking, house) = InputBlocks.clean_dxfblock( DXFReader.read_houses(path, layers), center=False )
+                names = dxfblocks.pop('House')
+                with_houses = set( names[dxfblocks['Section'] == 'HOUSE NEW'] )
+                for name, dxfblock in dxfblocks.groupby(names, sort=False):
+                    if name not in with_houses:
+                        print("Skipping the house type '%s', which has no house." % name)
+                        continue
+                    InputBlocks.centerDXFAtOrigin(dxf=dxfblock)
+                    templates[name] = CompiledTemplate(dxfblock, digest, rotation_step=self.rotation_step)
+                self.save(templates, key)
+            self.house_types[key] = templates
+        return self.house_types[key]
+
+
+    def cache_path(self, key):
+        """Returns the path of the cache file for the key, or None if there is no cache directory."""
+
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, "%s-v%s.pickle" % (key, TEMPLATE_VERSION))
+
+
+    def load(self, key):
+        """Returns what is cached for the key in the cache directory, or None if it is not there."""
+
+        path = self.cache_path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            # a broken cache file is compiled again and replaced
+            return None
+
+
+    def save(self, compiled, key):
+        """Writes a compiled template (or a dict of them) to the cache directory for the key, if there is a cache directory."""
+
+        path = self.cache_path(key)
+        if path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # the file is written under another name first, so other processes never read half of it
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(compiled, f)
+        os.replace(temp_path, path)
+
+
+# the library used by Main.py, made when it is first used
+_library = None
+
+
+def default_library():
+    """Returns the library that is used when no template is given.
+
+    Its cache directory is the HOUSE_TEMPLATE_CACHE environment variable, or it only keeps templates
+    in memory if that is not set.
+
+    """
+
+    global _library
+    if _library is None:
+        _library = TemplateLibrary(cache_dir=os.environ.get("HOUSE_TEMPLATE_CACHE"))
+    return _library
@@ -0,0 +1,205 @@
+"""Records where plotting spends its time, as nested spans and counters, instead of printing each stage.
+
+A Trace is made for every plot (see plot_proportions_in_region()) and kept in its PlotResult as
+"trace". While a trace is active, span() times a stage as a span inside the span it was started in,
+and count() adds to a counter, like the number of geometries given to shapely predicates. When no
+trace is active they do nothing, so the plotting functions can always call them.
+
+The active trace is kept in a context variable, so plots in different threads never share a trace.
+
+A trace can be written as Chrome trace-event JSON (opened in chrome://tracing or ui.perfetto.dev)
+or as speedscope JSON (opened in speedscope.app):
+
+    result.trace.write("plot.trace.json")
+    result.trace.write("plot.speedscope.json", format="speedscope")
+
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+_active = contextvars.ContextVar("trace", default=None)
+
+
+class Trace():
+    """The spans and counters of one plot.
+
+    Each span is a dict in "spans", in the order the spans started, with:
+        'name'     - the name of the stage
+        'start'    - when it started, in seconds since the trace was made
+        'end'      - when it ended, or None if it has not ended yet
+        'depth'    - how many spans it is inside of
+        'args'     - the keyword arguments that span() was given
+        'counters' - how much each counter went up while the span was open
+
+    "counters" holds the totals of every counter, and "samples" holds (time, totals) for the end of
+    every span, so counters can be drawn over time.
+
+    """
+
+    def __init__(self, name="plot") -> None:
+        self.name = name
+        self.spans = []
+        self.counters = {}
+        self.samples = []
+        self.depth = 0
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+        self.origin = time.perf_counter()
+
+
+    def now(self):
+        """Returns the seconds since the trace was made."""
+
+        return time.perf_counter() - self.origin
+
+
+    @contextmanager
+    def activate(self):
+        """Makes this the active trace until the context ends."""
+
+        token = _active.set(self)
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+
+    @contextmanager
+    def span(self, name, **args):
+        """Times the context as a span with the name."""
+
+        record = { 'name': name, 'start': self.now(), 'end': None, 'depth': self.depth, 'args': args, 'counters': {} }
+        self.spans.append(record)
+        counters = dict(self.counters)
+        self.depth += 1
+        try:
+            yield record
+        finally:
+            self.depth -= 1
+            record['end'] = self.now()
+            record['counters'] = { counter: total - counters.get(counter, 0) for counter, total in self.counters.items() if total != counters.get(counter, 0) }
+            self.samples.append( (record['end'], dict(self.counters)) )
+
+
+    def count(self, name, n=1):
+        """Adds n to the counter with the name."""
+
+        self.counters[name] = self.counters.get(name, 0) + n
+
+
+    def totals(self):
+        """Returns the total seconds spent in the spans of each name, as a dict."""
+
+        seconds = {}
+        for record in self.spans:
+            if record['end'] is not None:
+                seconds[record['name']] = seconds.get(record['name'], 0) + record['end'] - record['start']
+        return seconds
+
+
+    def to_chrome(self):
+        """Returns the trace as a dict of Chrome trace events, with a complete event for each span and a counter event for each sample."""
+
+        events = []
+        for record in self.spans:
+            if record['end'] is None:
+                continue
+            events.append({
+                'name': record['name'],
+                'cat': self.name,
+                'ph': "X",
+                'ts': 1e6 * record['start'],
+                'dur': 1e6 * (record['end'] - record['start']),
+                'pid': self.pid,
+                'tid': self.tid,
+                'args': { **record['args'], **record['counters'] },
+            })
+        for end, counters in self.samples:
+            if counters:
+                events.append({ 'name': "counters", 'ph': "C", 'ts': 1e6 * end, 'pid': self.pid, 'tid': self.tid, 'args': counters })
+
+        return { 'traceEvents': events, 'displayTimeUnit': "ms", 'otherData': { 'name': self.name, 'counters': self.counters } }
+
+
+    def to_speedscope(self):
+        """Returns the trace as a dict in speedscope's file format, with the spans as an evented profile."""
+
+        frames, frame_index = [], {}
+        events, stack = [], []
+        end_value = 0
+
+        def close(record):
+            events.append({ 'type': "C", 'frame': frame_index[record['name']], 'at': record['end'] })
+
+        for record in self.spans:
+            if record['end'] is None:
+                continue
+            # the spans that this span is not inside of have ended before it started
+            while stack and stack[-1]['depth'] >= record['depth']:
+                close(stack.pop())
+            if record['name'] not in frame_index:
+                frame_index[record['name']] = len(frames)
+                frames.append({ 'name': record['name'] })
+            events.append({ 'type': "O", 'frame': frame_index[record['name']], 'at': record['start'] })
+            stack.append(record)
+            end_value = max(end_value, record['end'])
+        while stack:
+            close(stack.pop())
+
+        return {
+            '$schema': "https://www.speedscope.app/file-format-schema.json",
+            'name': self.name,
+            'exporter': "plot.software.Tracing",
+            'shared': { 'frames': frames },
+            'profiles': [{
+                'type': "evented",
+                'name': self.name,
+                'unit': "seconds",
+                'startValue': 0,
+                'endValue': end_value,
+                'events': events,
+            }],
+        }
+
+
+    def write(self, path, format="chrome"):
+        """Writes the trace to the path as Chrome trace-event JSON, or as speedscope JSON if "format" is 'speedscope'."""
+
+        if format not in ("chrome", "speedscope"):
+            raise ValueError("Unknown trace format '%s'." % format)
+        trace = self.to_speedscope() if format == "speedscope" else self.to_chrome()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace, f)
+
+
+def current():
+    """Returns the active trace, or None if there is none."""
+
+    return _active.get()
+
+
+@contextmanager
+def span(name, **args):
+    """Times the context as a span of the active trace, if there is one (see Trace.span())."""
+
+    trace = _active.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name, **args) as record:
+        yield record
+
+
+def count(name, n=1):
+    """Adds n to the counter with the name in the active trace, if there is one."""
+
+    trace = _active.get()
+    if trace is not None:
+        trace.count(name, n)
@@ -1,3 +1,968 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 
-# Create your tests here.
+from datetime import timedelta
+from unittest import mock
+
+import geopandas
+import numpy as np
+import shapely
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from shapely import LineString, Polygon, affinity, box
+
+from . import cache, jobs, layouts, views
+from .models import CachedResult, PlotJob, PlotJobEvent, Region
+from .software import BlockFunctions, PolygonFunctions, HRGenerator, PlotOptimals, InputBlocks, BatchPlot, DXFReader, Tracing, Benchmarks
+from .software.Main import website_block_types
+from .software.TemplateLibrary import TEMPLATE_VERSION, TemplateLibrary, default_library
+from .software.FillEngine import FillEngine
+from .software.Layout import Layout
+
+
+class PlacementIndexTests(SimpleTestCase):
+    """Blocks collide when they overlap by more than the tolerance, whether they are in a tree or in the buffer."""
+
+    def make_index(self, polygons, buffer_size):
+        index = BlockFunctions.PlacementIndex(buffer_size=buffer_size)
+        for polygon in polygons:
+            index.add([polygon])
+        return index
+
+
+    def test_touching_blocks_do_not_collide(self):
+        for buffer_size in (1, 64):
+            index = self.make_index([box(0, 0, 10, 10)], buffer_size)
+            footprints = np.array([ [box(10, 0, 20, 10)], [box(0, 10, 10, 20)], [box(10, 10, 20, 20)] ], dtype=object)
+            self.assertFalse(index.collides_many(footprints).any())
+
+
+    def test_overlaps_within_the_tolerance_do_not_collide(self):
+        for buffer_size in (1, 64):
+            index = self.make_index([box(0, 0, 10, 10)], buffer_size)
+            # 1e-8 square units of overlap, then 1e-4
+            footprints = np.array([ [box(10 - 1e-9, 0, 20, 10)], [box(10 - 1e-5, 0, 20, 10)] ], dtype=object)
+            self.assertEqual(index.collides_many(footprints).tolist(), [False, True])
+
+
+    def test_any_polygon_of_a_block_can_collide(self):
+        index = self.make_index([box(0, 0, 10, 10), box(30, 0, 40, 10)], buffer_size=1)
+        footprints = np.array([
+            [box(12, 0, 14, 10), box(29, 0, 31, 10)],
+            [box(12, 0, 14, 10), None],
+            [box(5, 5, 6, 6), None],
+        ], dtype=object)
+        self.assertEqual(index.collides_many(footprints).tolist(), [True, False, True])
+        self.assertTrue(index.collides([box(35, 5, 36, 6)]))
+        self.assertFalse(index.collides([box(10, 0, 30, 10)]))
+
+
+class LocalFrameTests(SimpleTestCase):
+    """Longest edges at any angle, even vertical, become the x axis of their frame and come back where they were."""
+
+    def test_steep_and_vertical_longest_edges_round_trip(self):
+        for angle in (90, -90, 89.999, 90.001, 45, 0):
+            # a strip whose longest edge runs from the origin at the angle
+            site = affinity.rotate(box(0, 0, 300, 40), angle, origin=(0, 0))
+            line = PolygonFunctions.findLongestLine(site)
+            frame = PolygonFunctions.LocalFrame(line)
+
+            local_line = np.asarray(frame.line_to_local(line))
+            np.testing.assert_allclose(local_line[:, 1], 0, atol=1e-9)
+            self.assertAlmostEqual(abs(local_line[1, 0] - local_line[0, 0]), 300)
+
+            # the strip lies along the x axis, on one side of it
+            (minx, miny, maxx, maxy) = frame.to_local(site).bounds
+            np.testing.assert_allclose( (maxx - minx, maxy - miny, min(abs(miny), abs(maxy))), (300, 40, 0), atol=1e-9 )
+            local_site = frame.to_local(site)
+            self.assertLess(frame.to_world(local_site).symmetric_difference(site).area, 1e-6)
+            np.testing.assert_allclose(frame.coords_to_world(frame.coords_to_local(shapely.get_coordinates(site))), shapely.get_coordinates(site), atol=1e-9)
+
+
+    def test_houses_are_plotted_along_a_strip_at_any_angle(self):
+        blocktypes, proportions = website_block_types()
+        unitPolygons = [ BlockFunctions.UnitPolygon.of_template(default_library().get(InputBlocks.EXAMPLE_DXF_PATH)) ]
+        for angle in (0, 90, 180, -90, 30, 210):
+            # a strip deep enough for two rows of houses
+            strip = affinity.rotate(box(0, 0, 400, 40), angle, origin=(200, 0))
+
+            result = PlotOptimals.plot_proportions_in_region(blocktypes, unitPolygons, proportions, strip, ax=None, seed=0)
+            self.assertEqual(len(result.layout), 56)
+            polygons = result.layout.to_arrays()['geometry']
+            self.assertTrue( shapely.contains(strip.buffer(1e-6), polygons).all() )
+
+
+class PreparedRegionTests(SimpleTestCase):
+    """contains_many() gives the same answers as shapely.contains, whether shapes are settled by the inset, the bounds, or exactly."""
+
+    def test_shapes_anywhere_are_contained_like_shapely_says(self):
+        # an L shaped region with a hole, whose inset is the L and the hole moved in by 5
+        region = PolygonFunctions.PreparedRegion( Polygon([ (0, 0), (200, 0), (200, 80), (90, 80), (90, 200), (0, 200) ], holes=[ [ (30, 30), (50, 30), (50, 50), (30, 50) ] ]), inset_distance=5 )
+        rng = np.random.default_rng(0)
+        centers = rng.uniform(-40, 240, size=(3000, 2))
+        sizes = rng.choice([1, 3, 7, 30], size=(3000, 1))
+        shapes = shapely.box(*(centers - sizes/2).T, *(centers + sizes/2).T)
+        shapes[::97] = None
+
+        inset = shapely.contains_xy(region.inset, *centers.T)
+        band = ~inset & shapely.intersects_xy(region.polygon.buffer(5), *centers.T) & ~shapely.contains_xy(region.polygon.buffer(-5), *centers.T)
+        outside = (centers < region.bounds[:2]).any(axis=1) | (centers > region.bounds[2:]).any(axis=1)
+        for where in (inset, band, outside):
+            self.assertGreater(np.count_nonzero(where), 100)
+
+        expected = np.array([ shape is not None and shapely.contains(region.polygon, shape) for shape in shapes ])
+        contained = region.contains_many(shapes)
+        np.testing.assert_array_equal(contained, expected)
+        self.assertGreater(np.count_nonzero(contained & inset), 100)
+        self.assertGreater(np.count_nonzero(contained & band), 10)
+        self.assertFalse( contained[outside & (sizes[:, 0] < 7)].any() )
+        self.assertEqual([ region.contains(shape) for shape in shapes[1:20] ], expected[1:20].tolist())
+
+
+class MoveBlocksLeftTests(SimpleTestCase):
+    """After the sweep the blocks of a row touch each other and the edge of the region, without overlapping."""
+
+    def setUp(self):
+        self.region = PolygonFunctions.PreparedRegion(box(0, 0, 200, 40))
+        self.layout = Layout([ BlockFunctions.UnitPolygon(type="polygon", item_to_plot=box(-5, -5, 5, 5)) ])
+        self.layout.add(0, [ (40, 10), (20, 10), (55, 10), (100, 10), (30, 30), (70, 30) ], [0, 0, 0, 0, 1, 1])
+
+
+    def test_rows_are_flush_and_do_not_overlap(self):
+        moved = BlockFunctions.move_blocks_left(self.layout, self.region)
+
+        self.assertEqual(sorted(moved.tolist()), [0, 1, 2, 3, 4, 5])
+        for row, expected in zip(self.layout.rows(), ([5, 15, 25, 35], [5, 15])):
+            np.testing.assert_allclose(self.layout.coords(row)[:, 0], expected, atol=1e-5)
+
+        footprints, fits = self.layout.footprints(region=self.region)
+        self.assertTrue(fits.all())
+        polygons = footprints[:, 0]
+        for i, polygon in enumerate(polygons):
+            others = np.delete(polygons, i)
+            self.assertFalse(BlockFunctions.PlacementIndex(others, len(others)).collides([polygon]))
+
+
+    def test_only_the_given_rows_move(self):
+        before = self.layout.coords()
+        moved = BlockFunctions.move_blocks_left(self.layout, self.region, rows={1})
+
+        self.assertEqual(sorted(moved.tolist()), [4, 5])
+        np.testing.assert_array_equal(self.layout.coords()[:4], before[:4])
+
+
+class LayoutOutputTests(SimpleTestCase):
+    """Layouts are output in row order, with the attributes of the template polygon each polygon was made from."""
+
+    def template(self, name, sections):
+        # boxes side by side, centered at the origin, named after the template and their part
+        polygons = [ box(-15 + 10*i, -5, -5 + 10*i, 5) for i in range(len(sections)) ]
+        polygons = [ affinity.translate(polygon, xoff=5*(3 - len(sections))) for polygon in polygons ]
+        gdf = geopandas.GeoDataFrame({ 'Section': sections, 'Name': [ "%s%s" % (name, i) for i in range(len(sections)) ] }, geometry=polygons)
+        return BlockFunctions.UnitPolygon(type="gdf", item_to_plot=gdf)
+
+
+    def setUp(self):
+        # the first template has three polygons and the second only two
+        templates = [ self.template("a", ['HOUSE NEW', 'GARDEN', 'PARKING']), self.template("b", ['HOUSE NEW', 'GARDEN']) ]
+        self.layout = Layout(templates)
+        self.layout.add([1, 0, 0, 1, 0], [ (100, 40), (0, 40), (50, 0), (0, 0), (200, 40) ], [1, 1, 0, 0, 1])
+
+
+    def test_polygons_are_in_row_order_with_their_template_and_part(self):
+        arrays = self.layout.to_arrays()
+
+        self.assertEqual(arrays['block'].tolist(), [3, 3, 2, 2, 2, 1, 1, 1, 0, 0, 4, 4, 4])
+        self.assertEqual(arrays['template'].tolist(), [1, 1, 0, 0, 0, 0, 0, 0, 1, 1, 0, 0, 0])
+        self.assertEqual(arrays['part'].tolist(), [0, 1, 0, 1, 2, 0, 1, 2, 0, 1, 0, 1, 2])
+        self.assertEqual(arrays['row'].tolist(), [0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1])
+
+        for geometry, block, template, part in zip(arrays['geometry'], arrays['block'], arrays['template'], arrays['part']):
+            polygon = self.layout.templates[template].item_to_plot.geometry.iloc[part]
+            expected = affinity.translate(polygon, *self.layout.coords([block])[0])
+            self.assertTrue(geometry.equals(expected))
+
+
+    def test_the_gdf_rows_have_the_attributes_of_their_polygons(self):
+        arrays = self.layout.to_arrays()
+        gdf = self.layout.to_gdf()
+
+        self.assertEqual(len(gdf), len(arrays['geometry']))
+        names = [ "%s%s" % ("ab"[template], part) for template, part in zip(arrays['template'], arrays['part']) ]
+        self.assertEqual(gdf['Name'].tolist(), names)
+        self.assertTrue(gdf.geometry.geom_equals(geopandas.GeoSeries(arrays['geometry'])).all())
+        self.assertEqual(gdf['Front'].notna().tolist(), (gdf['Section']=='HOUSE NEW').tolist())
+
+
+    def test_a_layout_in_a_frame_outputs_the_same_polygons_in_the_world(self):
+        frame = PolygonFunctions.LocalFrame(LineString([ (500, 300), (480, 380) ]).coords)
+        layout = Layout(self.layout.templates, blocks=self.layout.blocks.copy(), frame=frame)
+        in_world = layout.in_world()
+
+        self.assertIsNone(in_world.frame)
+        framed, unframed = layout.to_arrays(), in_world.to_arrays()
+        np.testing.assert_array_equal(framed['block'], unframed['block'])
+        self.assertLess(shapely.area(shapely.symmetric_difference(framed['geometry'], unframed['geometry'])).max(), 1e-6)
+        np.testing.assert_allclose(frame.coords_to_local(in_world.coords()), layout.coords(), atol=1e-9)
+
+
+class FillEngineTests(SimpleTestCase):
+    """Filling stops on an empty frontier, at the capacity of the region, or after max_iterations, and reopened blockpoints never give overlaps."""
+
+    def setUp(self):
+        self.blocktypes, self.proportions = website_block_types()
+        self.unitPolygons = [ BlockFunctions.UnitPolygon(type="polygon", item_to_plot=box(-5, -5, 5, 5)) ]
+        self.region = PolygonFunctions.PreparedRegion(box(0, 0, 200, 40))
+        # blockpoints further apart than the blocks, so blocks moved left leave room at the end of their rows
+        self.rows = [ np.column_stack( (np.arange(6, 195, 12), np.full(16, y)) ) for y in (10, 30) ]
+
+
+    def engine(self, rows=None, **kwargs):
+        return FillEngine(self.blocktypes, self.unitPolygons, self.region, self.rows if rows is None else rows, (1, 0), rng=0, **kwargs)
+
+
+    def test_an_empty_frontier_stops_filling(self):
+        engine = self.engine(rows=[])
+        self.assertEqual(len(engine.run()), 0)
+        self.assertEqual(engine.telemetry, [])
+
+        engine = self.engine()
+        engine.run()
+        self.assertFalse(engine.frontier.any())
+        self.assertLess(len(engine.telemetry), engine.max_iterations)
+        self.assertLess(len(engine.layout), engine.capacity)
+
+
+    def test_filling_stops_at_the_capacity(self):
+        engine = self.engine()
+        engine.capacity = 34
+        engine.run()
+
+        self.assertEqual([ record['blocks'] for record in engine.telemetry ], [32, 36])
+        self.assertTrue(engine.frontier.any())
+
+
+    def test_filling_stops_after_max_iterations(self):
+        engine = self.engine(max_iterations=1)
+        engine.run()
+
+        self.assertEqual(len(engine.telemetry), 1)
+        self.assertTrue(engine.frontier.any())
+
+
+    def test_reopened_blockpoints_do_not_give_overlaps(self):
+        engine = self.engine()
+        layout = engine.run()
+
+        self.assertGreater(sum([ record['reopened'] for record in engine.telemetry ]), 0)
+        self.assertGreater(len(layout), engine.telemetry[0]['placed'])
+        footprints, fits = layout.footprints(region=self.region)
+        self.assertTrue(fits.all())
+        polygons = footprints[:, 0]
+        for i, polygon in enumerate(polygons):
+            others = np.delete(polygons, i)
+            self.assertFalse(BlockFunctions.PlacementIndex(others, len(others)).collides([polygon]))
+
+
+class QuotasTests(SimpleTestCase):
+    """quotas() hands out exactly the given number of spaces by the largest remainder method, and indexweightrandom() plots exactly those."""
+
+    def test_quotas_add_up_exactly(self):
+        for numspaces in (0, 1, 7, 100, 1001):
+            for weights in ([1], [1, 1, 1], [3, 5, 11], [0.2, 0.3, 0.5], [100, 0, 1]):
+                counts = HRGenerator.quotas(numspaces, weights)
+                self.assertEqual(counts.sum(), numspaces)
+                shares = numspaces * np.array(weights) / sum(weights)
+                self.assertTrue( (np.abs(counts - shares) < 1).all() )
+
+
+    def test_largest_remainder_gets_the_leftover_spaces(self):
+        # shares of 10 spaces are 1.5, 3.3, and 5.2
+        self.assertEqual(HRGenerator.quotas(10, [15, 33, 52]).tolist(), [2, 3, 5])
+
+
+    def test_equal_remainders_go_to_the_earlier_weights(self):
+        self.assertEqual(HRGenerator.quotas(2, [1, 1, 1]).tolist(), [1, 1, 0])
+        self.assertEqual(HRGenerator.quotas(4, [1, 1, 1]).tolist(), [2, 1, 1])
+
+
+    def test_weights_that_are_all_zero_or_negative_are_rejected(self):
+        for weights in ([0, 0], [], [1, -1]):
+            with self.assertRaises(ValueError):
+                HRGenerator.quotas(5, weights)
+
+
+    def test_indexweightrandom_plots_exactly_the_quotas(self):
+        rows = [ np.zeros((40, 2)), np.zeros((27, 2)) ]
+        guide = HRGenerator.indexweightrandom(67, ['a', 'b', 'c'], rows, rng=3, counts=[3, 5, 11])
+        self.assertEqual([len(row) for row in guide], [40, 27])
+        plotted = np.concatenate(guide)
+        self.assertEqual(np.bincount(plotted, minlength=3).tolist(), HRGenerator.quotas(67, [3, 5, 11]).tolist())
+        self.assertEqual(np.concatenate(HRGenerator.indexweightrandom(67, ['a', 'b', 'c'], rows, rng=3, counts=[3, 5, 11])).tolist(), plotted.tolist())
+
+
+class SearchOrientationsTests(SimpleTestCase):
+    """Orientations whose capacity bound cannot beat the best result so far are not plotted."""
+
+    def test_orientations_across_a_strip_are_left_out(self):
+        blocktypes, proportions = website_block_types()
+        unitPolygons = [ BlockFunctions.UnitPolygon.of_template(default_library().get(InputBlocks.EXAMPLE_DXF_PATH)) ]
+        strip = box(0, 0, 400, 36.9)
+
+        best = PlotOptimals.search_orientations(blocktypes, unitPolygons, proportions, strip, seed=0, max_workers=1)
+
+        plotted = [row for row in best.orientations if row['blocks'] is not None]
+        left_out = [row for row in best.orientations if row['blocks'] is None]
+        self.assertTrue(left_out)
+        self.assertEqual(len(best.layout), max([row['blocks'] for row in plotted]))
+        for row in plotted:
+            self.assertLessEqual(row['blocks'], row['bound'])
+        for row in left_out:
+            self.assertLessEqual(row['bound'], len(best.layout))
+
+
+    def test_edges_at_nearly_the_same_angle_give_one_line(self):
+        # the two long edges are 0.1 degrees either side of the horizontal, so they meet where angles wrap around
+        site = Polygon([ (0, 0), (100, -np.tan(np.radians(0.1))*100), (200, 0), (100, 60) ])
+        angles = list(PlotOptimals.candidate_lines(site, sweep_degrees=None))
+        self.assertEqual(len(angles), 3)
+        self.assertAlmostEqual(angles[-1], 179.9)
+
+        # the horizontal sweep line is left out, as it is within half a degree of the edges
+        self.assertNotIn(0.0, PlotOptimals.candidate_lines(site))
+
+
+    def test_sites_with_many_edges_give_a_few_lines(self):
+        circle = shapely.Point(0, 0).buffer(300, quad_segs=64)
+        lines = PlotOptimals.candidate_lines(circle, sweep_degrees=15, max_edge_lines=24)
+        self.assertLessEqual(len(lines), 24 + 12)
+        self.assertGreater(len(PlotOptimals.candidate_lines(circle, max_edge_lines=10**6)), 100)
+
+
+class BestPhaseTests(SimpleTestCase):
+    """Blocks that touch the boundary of the region fit, so phases where they do are not under-counted."""
+
+    def test_a_strip_two_rows_deep_keeps_both_rows(self):
+        # the strip is exactly deep enough for two rows at the usual phase of (0.5, 0.5)
+        blocktypes, proportions = website_block_types()
+        strip = box(0, 0, 400, 36.9)
+
+        unitPolygons = [ BlockFunctions.UnitPolygon.of_template(default_library().get(InputBlocks.EXAMPLE_DXF_PATH)) ]
+        result = PlotOptimals.plot_proportions_in_region(blocktypes, unitPolygons, proportions, strip, ax=None, seed=0)
+
+        self.assertEqual(len(result.layout.rows()), 2)
+        self.assertEqual(len(result.layout), 56)
+
+
+    def test_the_best_phase_is_the_best_of_the_checked_counts(self):
+        site = affinity.rotate(Polygon([ (0, 0), (300, 0), (300, 120), (140, 120), (140, 260), (0, 260) ]), 30, origin=(0, 0))
+        unitPolygon = BlockFunctions.UnitPolygon.of_template(default_library().get(InputBlocks.EXAMPLE_DXF_PATH))
+        line = PolygonFunctions.findLongestLine(site)
+        frame = PolygonFunctions.LocalFrame(line)
+        longestline = frame.line_to_local(line)
+        unitPolygon.rotate(line=longestline)
+        region = PolygonFunctions.PreparedRegion(frame.to_local(site), inset_distance=unitPolygon.bounding_radius())
+        blockpadding, rowpadding = PlotOptimals.findPadding([unitPolygon], longestline)
+
+        phases = np.array([ (dx, dy) for dx in np.arange(4)/4 for dy in np.arange(4)/4 ])
+        counts = BlockFunctions.count_feasible_blockpoints(region, longestline, blockpadding, rowpadding, unitPolygon, phases)
+        checked = [ BlockFunctions.count_phase_fits(region, longestline, blockpadding, rowpadding, unitPolygon, phase) for phase in phases ]
+        # counting every phase at once may count blocks that only touch the boundary up to float error, but never fewer
+        self.assertTrue( (counts >= checked).all() )
+
+        phase, phase_counts = BlockFunctions.best_phase(region, longestline, blockpadding, rowpadding, unitPolygon, steps=4)
+        self.assertEqual(phase_counts[phase], max(checked))
+        self.assertEqual(phase_counts[phase], BlockFunctions.count_phase_fits(region, longestline, blockpadding, rowpadding, unitPolygon, phase))
+
+
+class BatchPlotTests(SimpleTestCase):
+    """Every RLP of a batch gets its own output file, even when ids only differ in characters that are not safe in file names."""
+
+    def write_source(self, directory, names):
+        square = [ [-0.1, 51.5], [-0.098, 51.5], [-0.098, 51.501], [-0.1, 51.501], [-0.1, 51.5] ]
+        features = [ { "type": "Feature", "properties": { "name": name }, "geometry": { "type": "Polygon", "coordinates": [square] } } for name in names ]
+        path = os.path.join(directory, "rlps.geojson")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({ "type": "FeatureCollection", "features": features }, f)
+        return path
+
+
+    def test_ids_that_sanitize_alike_get_different_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = self.write_source(directory, ["site 0", "site_0", "site 0", "site_0", "Site_0"])
+            ids = [ rlp_id for rlp_id, rlp in BatchPlot.iter_rlps(source) ]
+
+            self.assertEqual(len(set(ids)), 5)
+            self.assertEqual(len({ BatchPlot.file_name(rlp_id).lower() for rlp_id in ids }), 5)
+            self.assertEqual(ids, [ rlp_id for rlp_id, rlp in BatchPlot.iter_rlps(source) ])
+
+
+    def test_a_rerun_only_skips_rlps_that_were_written(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = self.write_source(directory, ["site 0", "site_0", "site 0", "site_0"])
+            output_dir = os.path.join(directory, "out")
+
+            self.assertEqual(BatchPlot.run_batch(source, output_dir, max_workers=1, seed=0), (4, 0, 0))
+            self.assertEqual(len([ name for name in os.listdir(output_dir) if name.endswith(".geojson") ]), 4)
+            self.assertEqual(BatchPlot.run_batch(source, output_dir, max_workers=1, seed=0), (0, 0, 4))
+
+
+class FakeProcess():
+    """Stands in for the worker process of a job, so that the dispatcher can be tested without plotting."""
+
+    def __init__(self, target=None, args=(), name=None, daemon=None) -> None:
+        self.args = args
+        self.alive = False
+        self.terminated = False
+        self.exitcode = None
+
+
+    def start(self):
+        self.alive = True
+
+
+    def is_alive(self):
+        return self.alive
+
+
+    def terminate(self):
+        self.alive, self.terminated, self.exitcode = False, True, -15
+
+
+    def join(self):
+        pass
+
+
+class FakeContext():
+    Process = FakeProcess
+
+
+@override_settings(PLOT_JOBS={ 'MAX_CONCURRENT_JOBS': 2, 'TIME_LIMIT': 60, 'CACHE_MAX_BYTES': 1 << 20 })
+class JobDispatcherTests(TestCase):
+    """Queued jobs are started under the cap, one key at a time, and stopped when they are cancelled, take too long, or are lost."""
+
+    def setUp(self):
+        self.region = Region.objects.create(outer_polygon="rlp.geojson")
+        self.dispatcher = jobs.JobDispatcher()
+        self.dispatcher.context = FakeContext()
+
+
+    def make_job(self, key='', **fields):
+        return PlotJob.objects.create(region=self.region, key=key, time_limit=60, **fields)
+
+
+    def statuses(self, *queued_jobs):
+        return [ PlotJob.objects.get(pk=job.pk).status for job in queued_jobs ]
+
+
+    def test_jobs_are_started_oldest_first_under_the_cap(self):
+        queued_jobs = [ self.make_job() for i in range(3) ]
+        self.dispatcher.start_queued_jobs()
+
+        self.assertEqual(self.statuses(*queued_jobs), [PlotJob.RUNNING, PlotJob.RUNNING, PlotJob.QUEUED])
+        self.assertEqual(sorted(self.dispatcher.processes), [queued_jobs[0].pk, queued_jobs[1].pk])
+
+
+    def test_a_job_waits_for_a_running_job_with_its_key_and_takes_its_result(self):
+        first, second = self.make_job(key='k'), self.make_job(key='k')
+        self.dispatcher.start_queued_jobs()
+        self.assertEqual(self.statuses(first, second), [PlotJob.RUNNING, PlotJob.QUEUED])
+
+        # the worker of the first job caches its result as it finishes
+        cache.put('k', '{"houses":[]}', 1 << 20)
+        PlotJob.objects.filter(pk=first.pk).update(status=PlotJob.DONE, finished=timezone.now())
+        self.dispatcher.start_queued_jobs()
+
+        second.refresh_from_db()
+        self.assertEqual(second.status, PlotJob.DONE)
+        self.assertEqual(second.result, '{"houses":[]}')
+        self.assertNotIn(second.pk, self.dispatcher.processes)
+
+
+    def test_a_job_is_not_claimed_while_a_job_with_its_key_is_running(self):
+        self.make_job(key='k', status=PlotJob.RUNNING, started=timezone.now())
+        waiting, other = self.make_job(key='k'), self.make_job(key='other')
+
+        self.assertFalse(self.dispatcher.claim(waiting))
+        self.assertTrue(self.dispatcher.claim(other))
+        self.assertFalse(self.dispatcher.claim(other))
+
+
+    def test_cancelled_jobs_are_stopped(self):
+        job = self.make_job()
+        self.dispatcher.start_queued_jobs()
+        process = self.dispatcher.processes[job.pk]
+
+        self.assertTrue(jobs.cancel(job))
+        self.dispatcher.check_workers()
+
+        self.assertTrue(process.terminated)
+        self.assertEqual(self.statuses(job), [PlotJob.CANCELLED])
+        self.assertFalse(jobs.cancel(job))
+
+
+    def test_jobs_past_their_time_limit_are_stopped(self):
+        job = self.make_job()
+        self.dispatcher.start_queued_jobs()
+        process = self.dispatcher.processes[job.pk]
+        PlotJob.objects.filter(pk=job.pk).update(started=timezone.now() - timedelta(seconds=61))
+
+        self.dispatcher.check_workers()
+
+        self.assertTrue(process.terminated)
+        self.assertEqual(self.statuses(job), [PlotJob.TIMED_OUT])
+        self.assertEqual(self.dispatcher.processes, {})
+
+
+    def test_jobs_whose_worker_died_fail(self):
+        job = self.make_job()
+        self.dispatcher.start_queued_jobs()
+        self.dispatcher.processes[job.pk].alive = False
+
+        self.dispatcher.check_workers()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, PlotJob.FAILED)
+        self.assertIn("exit code", job.error)
+
+
+    def test_running_jobs_without_a_dispatcher_expire_after_their_time_limit(self):
+        late = timezone.now() - timedelta(seconds=60 + jobs.STALE_GRACE_SECONDS + 1)
+        lost = self.make_job(status=PlotJob.RUNNING, started=late)
+        recent = self.make_job(status=PlotJob.RUNNING, started=timezone.now())
+
+        self.dispatcher.expire_stale_jobs()
+
+        self.assertEqual(self.statuses(lost, recent), [PlotJob.TIMED_OUT, PlotJob.RUNNING])
+
+
+class JobEventsTests(TestCase):
+    """Progress events are saved without keeping every 'fill' event, and streamed as they are saved."""
+
+    def setUp(self):
+        self.job = PlotJob.objects.create(region=Region.objects.create(outer_polygon="rlp.geojson"), time_limit=60, status=PlotJob.RUNNING)
+
+
+    def test_only_the_latest_fill_event_is_kept(self):
+        progress = jobs.event_saver(self.job)
+        progress({ 'stage': 'lattice', 'blockpoints': 10 })
+        for blocks in range(5):
+            progress({ 'stage': 'fill', 'blocks': blocks })
+        progress({ 'stage': 'output', 'blocks': 4 })
+
+        stages = [ json.loads(data) for data in self.job.events.order_by('id').values_list('data', flat=True) ]
+        self.assertEqual(stages, [ { 'stage': 'lattice', 'blockpoints': 10 }, { 'stage': 'fill', 'blocks': 4 }, { 'stage': 'output', 'blocks': 4 } ])
+
+
+    def test_events_are_streamed_without_async_under_wsgi(self):
+        first = PlotJobEvent.objects.create(job=self.job, data='{"stage": "lattice"}')
+        second = PlotJobEvent.objects.create(job=self.job, data='{"stage": "output"}')
+        PlotJob.objects.filter(pk=self.job.pk).update(status=PlotJob.DONE)
+
+        response = Client().get(reverse("job_events", args=[self.job.pk]), HTTP_LAST_EVENT_ID=str(first.pk))
+        self.assertFalse(response.is_async)
+        messages = b"".join(response.streaming_content).decode().split("\n\n")
+
+        self.assertEqual(messages[0], 'id: %s\nevent: progress\ndata: {"stage": "output"}' % second.pk)
+        self.assertTrue(messages[1].startswith("event: end\n"))
+        self.assertEqual(json.loads(messages[1].split("data: ")[1])["status"], PlotJob.DONE)
+
+
+class CacheTests(TestCase):
+    """Results are keyed by everything that decides what is plotted, and the least recently used are removed first."""
+
+    def rlp(self, coords):
+        return geopandas.GeoDataFrame(geometry=[Polygon(coords)], crs="EPSG:27700")
+
+
+    def test_the_key_changes_with_what_is_plotted(self):
+        rlp = self.rlp([ (0, 0), (100, 0), (100, 50), (0, 50) ])
+        key = cache.result_key(rlp, 0)
+
+        self.assertEqual(cache.result_key(rlp, 0, InputBlocks.DXF_PATH), key)
+        self.assertNotEqual(cache.result_key(self.rlp([ (0, 0), (100, 0), (100, 51), (0, 50) ]), 0), key)
+        self.assertNotEqual(cache.result_key(rlp, 1), key)
+        with mock.patch.object(cache, "CACHE_VERSION", cache.CACHE_VERSION + 1):
+            self.assertNotEqual(cache.result_key(rlp, 0), key)
+
+        with tempfile.TemporaryDirectory() as directory:
+            template_path = os.path.join(directory, "houses.dxf")
+            shutil.copyfile(InputBlocks.DXF_PATH, template_path)
+            self.assertEqual(cache.result_key(rlp, 0, template_path), key)
+            with open(template_path, "a", encoding="utf-8") as f:
+                f.write("999\nanother house\n")
+            self.assertNotEqual(cache.result_key(rlp, 0, template_path), key)
+
+
+    def test_the_key_does_not_depend_on_the_order_of_the_vertices(self):
+        coords = [ (0, 0), (100, 0), (100, 50), (40, 80), (0, 50) ]
+        key = cache.result_key(self.rlp(coords), 0)
+
+        self.assertEqual(cache.result_key(self.rlp(coords[2:] + coords[:2]), 0), key)
+        self.assertEqual(cache.result_key(self.rlp(coords[::-1]), 0), key)
+
+
+    def test_the_least_recently_used_results_are_removed_first(self):
+        cache.put("a", "x" * 10, max_bytes=25)
+        cache.put("b", "x" * 10, max_bytes=25)
+        self.assertEqual(cache.get("a"), "x" * 10)
+
+        cache.put("c", "x" * 10, max_bytes=25)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(sorted(CachedResult.objects.values_list("key", flat=True)), ["a", "c"])
+        self.assertLessEqual(sum(CachedResult.objects.values_list("size", flat=True)), 25)
+
+
+    def test_a_result_larger_than_the_cache_is_not_kept(self):
+        cache.put("a", "x" * 10, max_bytes=25)
+        cache.put("b", "x" * 30, max_bytes=25)
+
+        self.assertEqual(list(CachedResult.objects.values_list("key", flat=True)), ["a"])
+
+
+class LayoutsTests(SimpleTestCase):
+    """Houses in the columnar format come back within the quantization error, in much less json than GeoJSON."""
+
+    def houses(self, columns=10, rows=10):
+        # rows of the example house, with its garden and parking, moved to British National Grid coordinates in London
+        template = default_library().get(InputBlocks.EXAMPLE_DXF_PATH)
+        polygons, sections = [], []
+        for i in range(columns):
+            for j in range(rows):
+                polygons.extend( shapely.transform(template.polygons, lambda coords: coords + [530000 + 20*i, 180000 + 30*j]) )
+                sections.extend(template.dxfblock['Section'])
+        # a polygon with a hole, which has a ring of its own
+        polygons.append( box(530000, 179900, 530010, 179910).difference(box(530002, 179902, 530004, 179904)) )
+        sections.append('GARDEN')
+        houses = geopandas.GeoDataFrame({ 'Section': sections, 'colors': 'red' }, geometry=polygons, crs="EPSG:27700")
+        return houses.to_crs(epsg=4326)
+
+
+    def test_coordinates_round_trip_within_the_quantization_error(self):
+        houses = self.houses()
+        layout = layouts.to_columnar(houses)
+        polygons = layouts.columnar_coordinates(layout)
+
+        self.assertEqual(len(polygons), len(houses))
+        for polygon, house in zip(polygons, houses.geometry):
+            rings = [house.exterior] + list(house.interiors)
+            self.assertEqual(len(polygon), len(rings))
+            for ring, original in zip(polygon, rings):
+                np.testing.assert_allclose(ring, shapely.get_coordinates(original), rtol=0, atol=0.5/layout["scale"] + 1e-12)
+
+
+    def test_geojson_has_the_columns_and_rounded_coordinates(self):
+        houses = self.houses(columns=2, rows=2)
+        geojson = layouts.columnar_to_geojson(layouts.to_columnar(houses), precision=5)
+
+        self.assertEqual(len(geojson["features"]), len(houses))
+        for feature, (_, house) in zip(geojson["features"], houses.iterrows()):
+            self.assertEqual(feature["properties"], { 'Section': house['Section'], 'colors': house['colors'] })
+            coordinates = np.asarray(feature["geometry"]["coordinates"][0])
+            np.testing.assert_allclose(coordinates, shapely.get_coordinates(house.geometry.exterior), rtol=0, atol=1e-5)
+            np.testing.assert_array_equal(coordinates, np.round(coordinates, 5))
+
+
+    def test_the_columnar_format_is_much_smaller_than_geojson(self):
+        houses = self.houses()
+        columnar = json.dumps(layouts.to_columnar(houses), separators=(",", ":"))
+
+        # about an eighth of the size of the GeoJSON that was sent before, before either is compressed
+        self.assertLess(len(columnar), len(houses.to_json()) / 6)
+
+
+class JobViewsTests(TestCase):
+    """Clients that do not ask for a page get json, and the result's parameters are checked."""
+
+    def setUp(self):
+        # uploaded RLPs are saved in a directory of their own
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.region = Region.objects.create(outer_polygon="rlp.geojson")
+
+
+    def test_clients_that_accept_anything_get_json(self):
+        job = PlotJob.objects.create(region=self.region, time_limit=60)
+        with mock.patch.object(jobs, "submit", return_value=job):
+            for accept, status in (("*/*", 202), ("application/json", 202), ("text/html,application/xhtml+xml,*/*;q=0.8", 200)):
+                upload = SimpleUploadedFile("rlp.geojson", b'{"type": "FeatureCollection", "features": []}')
+                response = Client().post(reverse("generate"), { "regionfile": upload }, HTTP_ACCEPT=accept)
+                self.assertEqual(response.status_code, status, accept)
+
+            upload = SimpleUploadedFile("rlp.geojson", b'{"type": "FeatureCollection", "features": []}')
+            response = Client().post(reverse("generate") + "?format=json", { "regionfile": upload }, HTTP_ACCEPT="text/html")
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json()["id"], job.pk)
+
+
+    def test_the_precision_of_the_result_is_checked(self):
+        houses = LayoutsTests().houses(columns=1, rows=1)
+        job = PlotJob.objects.create(region=self.region, time_limit=60, status=PlotJob.DONE, result=json.dumps(layouts.to_columnar(houses)))
+        url = reverse("job_result", args=[job.pk])
+
+        self.assertEqual(Client().get(url, { "format": "geojson", "precision": "seven" }).status_code, 400)
+        for precision, decimals in (("3", 3), ("-2", 0), ("400", views.MAX_PRECISION)):
+            response = Client().get(url, { "format": "geojson", "precision": precision })
+            self.assertEqual(response.status_code, 200)
+            x = response.json()["features"][0]["geometry"]["coordinates"][0][0][0]
+            self.assertEqual(x, round(x, decimals))
+
+
+class CalcFrontsTests(SimpleTestCase):
+    """The Front of every house worked out at once is the Front calc_front() gives each house."""
+
+    def test_fronts_match_calc_front_for_the_example_houses(self):
+        (dxfblock, gardens, parking, house) = InputBlocks.readDXF(InputBlocks.EXAMPLE_DXF_PATH)
+        houses = dxfblock.geometry.values[ (dxfblock['Section'] == 'HOUSE NEW').to_numpy() ]
+        # the houses as they would be plotted, moved and turned, with a hole in one of them
+        moved = [ affinity.rotate(affinity.translate(h, 37*i, -11*i), 17*i, origin=(0, 0)) for i in range(12) for h in houses ]
+        moved.append( Polygon(moved[0].exterior.coords, holes=[ list(moved[0].buffer(-0.5).exterior.coords) ]) )
+        moved = np.array(moved, dtype=object)
+
+        fronts = InputBlocks.calc_fronts(moved)
+        self.assertEqual(len(fronts), len(moved))
+        for front, house_polygon in zip(fronts, moved):
+            self.assertTrue(front.equals_exact(InputBlocks.calc_front(house_polygon), 1e-9))
+
+        InputBlocks.update_dxf_front(dxfblock)
+        for section, front, polygon in zip(dxfblock['Section'], dxfblock['Front'], dxfblock.geometry):
+            if section == 'HOUSE NEW':
+                self.assertTrue(front.equals(InputBlocks.calc_front(polygon)))
+            else:
+                self.assertIsNone(front)
+
+
+class ReadHousesTests(SimpleTestCase):
+    """DXFReader moves the blocks a house inserts into the house, and entities on layer 0 take the layer of their INSERT."""
+
+    def hatch(self, layer, points):
+        tags = [ (0, "HATCH"), (8, layer), (91, 1), (92, 2), (72, 0), (73, 1), (93, len(points)) ]
+        for x, y in points:
+            tags += [ (10, x), (20, y) ]
+        return tags
+
+
+    def write_dxf(self, directory, tags):
+        path = os.path.join(directory, "houses.dxf")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join([ "%s\n%s\n" % tag for tag in tags ]))
+        return path
+
+
+    def test_nested_rotated_inserts_take_the_layer_of_the_insert(self):
+        tags = [ (0, "SECTION"), (2, "HEADER"), (9, "$ACADVER"), (1, "AC1015"), (0, "ENDSEC") ]
+        tags += [ (0, "SECTION"), (2, "BLOCKS") ]
+        # a parking bay drawn on layer 0, which is only ever inserted by a house
+        tags += [ (0, "BLOCK"), (8, "0"), (2, "BAY"), (10, 0), (20, 0) ]
+        tags += self.hatch("0", [ (0, 0), (2, 0), (2, 1), (0, 1) ])
+        tags += [ (0, "ENDBLK") ]
+        tags += [ (0, "BLOCK"), (8, "0"), (2, "HOUSE_A"), (10, 1), (20, 1) ]
+        tags += self.hatch("HOUSE NEW", [ (1, 1), (11, 1), (11, 9), (1, 9) ])
+        tags += self.hatch("WALLS", [ (1, 1), (3, 1), (3, 3), (1, 3) ])
+        tags += [ (0, "INSERT"), (8, "PARKING"), (2, "BAY"), (10, 20), (20, 1), (50, 90) ]
+        tags += [ (0, "ENDBLK"), (0, "ENDSEC") ]
+        tags += [ (0, "SECTION"), (2, "ENTITIES"), (0, "INSERT"), (8, "0"), (2, "HOUSE_A"), (10, 0), (20, 0), (0, "ENDSEC"), (0, "EOF") ]
+
+        with tempfile.TemporaryDirectory() as directory:
+            houses = DXFReader.read_houses(self.write_dxf(directory, tags))
+
+        self.assertEqual(houses['House'].tolist(), ["HOUSE_A", "HOUSE_A"])
+        self.assertEqual(houses['Layer'].tolist(), ["HOUSE NEW", "PARKING"])
+        # the house is moved so that the base point of its block is the origin
+        self.assertTrue(houses.geometry[0].equals(box(0, 0, 10, 8)))
+        # the bay is turned a quarter turn about its insertion point, which is (19, 0) from the base point
+        self.assertTrue(houses.geometry[1].normalize().equals_exact(box(18, 0, 19, 2).normalize(), 1e-9))
+
+
+class PlotInPartsTests(SimpleTestCase):
+    """L and U shaped RLPs are split at their inner corners and plotted in parts, at any angle."""
+
+    # arms 40 wide, which only fit two rows each way
+    L = Polygon([ (0, 0), (300, 0), (300, 40), (40, 40), (40, 300), (0, 300) ])
+    U = Polygon([ (0, 0), (300, 0), (300, 300), (260, 300), (260, 40), (40, 40), (40, 300), (0, 300) ])
+
+
+    def test_rotated_sites_are_split_into_their_arms(self):
+        for polygon, num_parts in ((self.L, 2), (self.U, 3)):
+            for angle in range(0, 180, 3):
+                rotated = affinity.rotate(polygon, angle, origin=(0, 0))
+                parts = PolygonFunctions.decompose(rotated, min_area=5000)
+                self.assertEqual(len(parts), num_parts, "%s degrees" % angle)
+                self.assertAlmostEqual(sum([part.area for part in parts]), rotated.area, places=3)
+                self.assertTrue( all([PolygonFunctions.convexity(part) > 0.999 for part in parts]) )
+
+
+    def test_rotated_sites_are_plotted_in_parts(self):
+        blocktypes, proportions = website_block_types()
+        for polygon, num_parts in ((self.L, 2), (self.U, 3)):
+            for angle in (17, 21):
+                rotated = affinity.rotate(polygon, angle, origin=(0, 0))
+                unitPolygons = [ BlockFunctions.UnitPolygon.of_template(default_library().get(InputBlocks.EXAMPLE_DXF_PATH)) ]
+                result = PlotOptimals.plot_in_parts(blocktypes, unitPolygons, proportions, rotated, seed=0, max_workers=1)
+
+                self.assertEqual(len(result.parts), num_parts)
+                self.assertEqual(len(result.layout), sum([part['blocks'] - part['dropped'] for part in result.parts]))
+                footprints, fits = result.layout.footprints()
+                polygons = footprints[:, 0]
+                # blocks that touch the boundary are moved out of the frame of their part with float error
+                self.assertLess(shapely.area(shapely.difference(polygons, rotated)).max(), 1e-6)
+                for i, polygon_i in enumerate(polygons):
+                    others = np.delete(polygons, i)
+                    self.assertFalse(BlockFunctions.PlacementIndex(others, len(others)).collides([polygon_i]))
+
+
+class TracingTests(SimpleTestCase):
+    """Traces are written with every span inside the span it was started in, and with their counters."""
+
+    def trace(self):
+        trace = Tracing.Trace("test")
+        with trace.activate():
+            with Tracing.span("plot"):
+                with Tracing.span("lattice", phase=0.5):
+                    Tracing.count("predicates", 10)
+                with Tracing.span("fill"):
+                    for iteration in (1, 2):
+                        with Tracing.span("iteration", iteration=iteration):
+                            with Tracing.span("filter_blocks"):
+                                Tracing.count("placed", 3)
+                with Tracing.span("output"):
+                    pass
+        return trace
+
+
+    def test_spans_and_counts_outside_a_trace_do_nothing(self):
+        with Tracing.span("plot") as record:
+            Tracing.count("placed")
+        self.assertIsNone(record)
+        self.assertIsNone(Tracing.current())
+
+
+    def test_chrome_spans_nest_and_carry_their_counters(self):
+        chrome = self.trace().to_chrome()
+        spans = [ event for event in chrome['traceEvents'] if event['ph']=="X" ]
+        self.assertEqual([ event['name'] for event in spans ], ["plot", "lattice", "fill", "iteration", "filter_blocks", "iteration", "filter_blocks", "output"])
+
+        # every span is inside the span before it that it was started in
+        parents = [None, 0, 0, 2, 3, 2, 5, 0]
+        for event, parent in zip(spans, parents):
+            if parent is not None:
+                self.assertGreaterEqual(event['ts'], spans[parent]['ts'])
+                self.assertLessEqual(event['ts'] + event['dur'], spans[parent]['ts'] + spans[parent]['dur'])
+
+        self.assertEqual(spans[1]['args'], { 'phase': 0.5, 'predicates': 10 })
+        self.assertEqual(spans[2]['args'], { 'placed': 6 })
+        self.assertEqual(spans[3]['args'], { 'iteration': 1, 'placed': 3 })
+        self.assertEqual(spans[0]['args'], { 'predicates': 10, 'placed': 6 })
+
+        counters = [ event['args'] for event in chrome['traceEvents'] if event['ph']=="C" ]
+        self.assertEqual(counters[-1], { 'predicates': 10, 'placed': 6 })
+        self.assertEqual(chrome['otherData']['counters'], { 'predicates': 10, 'placed': 6 })
+
+
+    def test_speedscope_events_open_and_close_in_order(self):
+        speedscope = self.trace().to_speedscope()
+        names = [ frame['name'] for frame in speedscope['shared']['frames'] ]
+        profile = speedscope['profiles'][0]
+
+        stack, opened, last = [], [], 0
+        for event in profile['events']:
+            self.assertGreaterEqual(event['at'], last)
+            last = event['at']
+            if event['type']=="O":
+                stack.append(event['frame'])
+                opened.append(names[event['frame']])
+            else:
+                self.assertEqual(stack.pop(), event['frame'])
+        self.assertEqual(stack, [])
+        self.assertEqual(opened, ["plot", "lattice", "fill", "iteration", "filter_blocks", "iteration", "filter_blocks", "output"])
+        self.assertEqual(profile['endValue'], last)
+
+
+    def test_traces_are_written_as_json(self):
+        trace = self.trace()
+        with tempfile.TemporaryDirectory() as directory:
+            for format, to_dict in (("chrome", trace.to_chrome), ("speedscope", trace.to_speedscope)):
+                path = os.path.join(directory, "plot.%s.json" % format)
+                trace.write(path, format=format)
+                with open(path, encoding="utf-8") as f:
+                    self.assertEqual(json.load(f), json.loads(json.dumps(to_dict())))
+            with self.assertRaises(ValueError):
+                trace.write(os.path.join(directory, "plot.json"), format="perfetto")
+
+
+class BenchmarksTests(SimpleTestCase):
+    """Baselines written with other versions of numpy or shapely only have their numbers of blocks compared."""
+
+    def results(self, numpy_version, blocks, seconds):
+        machine = { 'processor': 'x86_64', 'python': '3.11.7', 'numpy': numpy_version, 'shapely': '2.0.4' }
+        return { 'machine': machine, 'cases': { 'case': { 'blocks': blocks, 'seconds': { 'fill': seconds }, 'peak_memory_mb': 1.0 } } }
+
+
+    def test_times_are_only_compared_on_the_same_versions(self):
+        baseline = self.results('1.26.4', 100, 1.0)
+        self.assertEqual(Benchmarks.machine_differences(self.results('1.26.4', 100, 2.0), baseline), [])
+        self.assertEqual(len(Benchmarks.compare(self.results('1.26.4', 100, 2.0), baseline)), 1)
+
+        results = self.results('2.4.6', 99, 2.0)
+        self.assertEqual(Benchmarks.machine_differences(results, baseline), ["numpy 2.4.6 (the baseline has 1.26.4)"])
+        self.assertEqual(Benchmarks.compare(results, baseline, times=False), ["case: 99 blocks instead of 100"])
+
+
+class ImportTests(SimpleTestCase):
+    """Importing the software only defines things, so it does not load what is only needed to plot or show maps."""
+
+    def test_importing_the_software_does_not_load_plotting_libraries(self):
+        # the import is made in a new interpreter, as the test runner may have loaded these already
+        code = "import os, sys, plot.software.Main; print(*sorted( name for name in ('matplotlib', 'folium', 'scipy', 'webbrowser', 'MPLBACKEND') if name in sys.modules or name in os.environ ))"
+        website = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        environment = { name: value for name, value in os.environ.items() if name != 'MPLBACKEND' }
+        loaded = subprocess.run([sys.executable, "-c", code], cwd=website, env=environment, capture_output=True, text=True, check=True).stdout
+
+        self.assertEqual(loaded.split(), [])
+
+
+class TemplateLibraryTests(SimpleTestCase):
+    """Compiled templates are cached by the hash of their DXF, and give UnitPolygons the shapes they would measure themselves."""
+
+    def test_rotated_templates_give_the_shapes_of_their_polygons(self):
+        template = TemplateLibrary().get(InputBlocks.EXAMPLE_DXF_PATH)
+        line = LineString([ (0, 0), (3, 7) ])
+
+        up = BlockFunctions.UnitPolygon.of_template(template)
+        up.rotate(line=line)
+        measured = BlockFunctions.UnitPolygon(type="gdf", item_to_plot=up.item_to_plot.copy())
+
+        np.testing.assert_allclose(up.center(), measured.center(), atol=1e-9)
+        self.assertAlmostEqual(up.union_area(), measured.union_area())
+        self.assertTrue(up.convex_hull().normalize().equals_exact(measured.convex_hull().normalize(), 1e-9))
+        for direction in ((1, 0), (3, 7), (-2, 5)):
+            np.testing.assert_allclose(up.projection(direction), measured.projection(direction), atol=1e-9)
+
+
+    def test_a_changed_dxf_is_compiled_again(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "houses.dxf")
+            shutil.copyfile(InputBlocks.EXAMPLE_DXF_PATH, path)
+            cache_dir = os.path.join(directory, "cache")
+
+            first = TemplateLibrary(cache_dir=cache_dir).get(path)
+            self.assertEqual(TemplateLibrary(cache_dir=cache_dir).get(path).digest, first.digest)
+
+            # a comment changes the hash of the file, but not the houses in it
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("999\nchanged\n")
+            changed = TemplateLibrary(cache_dir=cache_dir).get(path)
+
+            self.assertNotEqual(changed.digest, first.digest)
+            self.assertEqual(sorted(os.listdir(cache_dir)), sorted([ "%s-v%s.pickle" % (digest, TEMPLATE_VERSION) for digest in (first.digest, changed.digest) ]))
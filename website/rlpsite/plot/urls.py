@@ -5,4 +5,8 @@ from . import views
 urlpatterns = [
     path("", views.index, name="index"),
     path("generate", views.generate, name="generate"),
-]
\ No newline at end of file
+    path("generate/<int:job_id>/status", views.job_status, name="job_status"),
+    path("generate/<int:job_id>/result", views.job_result, name="job_result"),
+    path("generate/<int:job_id>/cancel", views.job_cancel, name="job_cancel"),
+    path("generate/<int:job_id>/events", views.job_events, name="job_events"),
+]
@@ -1,13 +1,18 @@
-from django.shortcuts import render
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.shortcuts import render, get_object_or_404
 from django.template import loader
 
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse, Http404
+from django.views.decorators.http import require_POST
 
-from .software.Main import startplot
 from .forms import RegionForm, ExampleForm
+from .models import Region, PlotJob, PlotJobEvent
+from . import jobs, layouts
 
-import geopandas
-import mpld3
+import asyncio
+import json
+import time
 
 
 
@@ -25,21 +30,44 @@ def index(request):
     return HttpResponse(template.render(context=context, request=request))
 
 
+def wants_html(request):
+    """Returns True if the request asks for a page rather than json.
+
+    The "format" parameter ("html" or "json") decides if it is given. Otherwise only clients that name
+    text/html in their Accept header get a page, as browsers do, so clients that accept anything
+    (like fetch() and curl, which send */*) get json.
+
+    """
+
+    requested = request.GET.get("format") or request.POST.get("format")
+    if requested in ("html", "json"):
+        return requested=="html"
+    accepted = [media_type.split(";")[0].strip() for media_type in request.headers.get("Accept", "").split(",")]
+    return "text/html" in accepted
+
+
 def generate(request):
+    """Shows the form to submit an RLP, and queues a job to plot houses on a submitted RLP.
+
+    The houses are plotted in the background (see jobs.py), so the page is returned with the id of
+    the job at once and checks the job's status until its houses are ready.
+
+    A DXF of the houses may be submitted with the RLP, otherwise the default DXF is used.
+    
+    """
+
     if request.method == "POST":
         form = RegionForm(request.POST, request.FILES)
         context = {"form": form}
         
         if form.is_valid():
-            file = request.FILES["regionfile"].file
-            rlp = geopandas.read_file(file)
-            fig = startplot(rlp)
+            region = Region.objects.create(outer_polygon=request.FILES["regionfile"], template=request.FILES.get("templatefile", ""))
+            job = jobs.submit(region)
+            context["job"] = job
 
-            mp = mpld3.plugins.MousePosition(fontsize=12, fmt='.6g')
-            mpld3.plugins.connect(fig, mp)
-            context["graph"] = mpld3.fig_to_html(fig)
-
-            return render(request, "plot/generate.html", context)
+            if wants_html(request):
+                return render(request, "plot/generate.html", context)
+            return JsonResponse(job.to_dict(), status=202)
         else:
             return HttpResponse("error with invalid form")
 
@@ -48,3 +76,126 @@ def generate(request):
         context = {"form": form}
 
         return render(request, "plot/generate.html", context)
+
+
+def job_status(request, job_id):
+    """Returns the state of a job as json."""
+
+    job = get_object_or_404(PlotJob, pk=job_id)
+    jobs.dispatcher.start()
+    return JsonResponse(job.to_dict())
+
+
+# GeoJSON coordinates are never rounded to more decimal places than this, as floats do not hold more
+MAX_PRECISION = 15
+
+
+def job_result(request, job_id):
+    """Returns the houses of a finished job as compact json, or its state as json if it has no houses.
+
+    The houses are in the columnar format, or GeoJSON if the "format" parameter is "geojson" (see
+    layouts.py), and are compressed if the browser accepts it. The "precision" parameter is how many
+    decimal places GeoJSON coordinates are rounded to, up to MAX_PRECISION.
+    
+    """
+
+    job = get_object_or_404(PlotJob, pk=job_id)
+    if job.status!=PlotJob.DONE:
+        # 409 as the job exists but is not in a state with a result (yet)
+        return JsonResponse(job.to_dict(), status=409)
+
+    try:
+        precision = min(max(int(request.GET.get("precision", 7)), 0), MAX_PRECISION)
+    except ValueError:
+        return JsonResponse({ "error": "precision must be a whole number of decimal places" }, status=400)
+
+    layout = json.loads(job.result)
+    if request.GET.get("format")=="geojson":
+        layout = layouts.columnar_to_geojson(layout, precision=precision)
+
+    body, content_encoding = layouts.encode(layout, request.headers.get("Accept-Encoding", ""))
+    response = HttpResponse(body, content_type="application/json")
+    if content_encoding is not None:
+        response["Content-Encoding"] = content_encoding
+    response["Vary"] = "Accept-Encoding"
+    return response
+
+
+@require_POST
+def job_cancel(request, job_id):
+    """Cancels a job that has not finished, and returns its state as json."""
+
+    job = get_object_or_404(PlotJob, pk=job_id)
+    jobs.cancel(job)
+    job.refresh_from_db()
+    return JsonResponse(job.to_dict())
+
+
+# how often the event stream checks for new progress events, in seconds
+EVENTS_POLL_SECONDS = 0.5
+
+
+def read_job_events(job_id, last_id):
+    """Returns the server-sent events of a job after the event with id "last_id", for job_events().
+
+    Returns (messages, last_id, finished), where "last_id" is the id of the last event read, and
+    the messages end with the 'end' event if the job has finished.
+
+    """
+
+    # the status is checked before the events, so no events are missed after the job finishes
+    status = PlotJob.objects.filter(pk=job_id).values_list("status", flat=True).get()
+    messages = []
+    for event in PlotJobEvent.objects.filter(job_id=job_id, id__gt=last_id).order_by("id"):
+        last_id = event.id
+        messages.append("id: %s\nevent: progress\ndata: %s\n\n" % (event.id, event.data))
+
+    finished = status in PlotJob.FINISHED
+    if finished:
+        job = PlotJob.objects.get(pk=job_id)
+        messages.append("event: end\ndata: %s\n\n" % json.dumps(job.to_dict(), default=str))
+    return messages, last_id, finished
+
+
+def job_events(request, job_id):
+    """Streams the progress events of a job as server-sent events, until the job finishes.
+
+    Each event is a 'progress' event with the json of a progress event (see jobs.event_to_json()),
+    and the stream ends with an 'end' event with the state of the job. A browser that reconnects
+    sends the id of the last event it got (Last-Event-ID), and gets the events after it.
+
+    Under WSGI (like "manage.py runserver") the stream is a plain generator, as Django would read an
+    async one to the end before sending anything, and each stream holds a thread of the server while
+    it is open. Under the ASGI application (see rlpsite/asgi.py) the stream is async, so a waiting
+    stream does not hold a thread.
+    
+    """
+
+    if not PlotJob.objects.filter(pk=job_id).exists():
+        raise Http404("No job with id %s" % job_id)
+
+    last_id = int(request.headers.get("Last-Event-ID") or 0)
+
+    def stream():
+        nonlocal last_id
+        while True:
+            messages, last_id, finished = read_job_events(job_id, last_id)
+            yield from messages
+            if finished:
+                return
+            time.sleep(EVENTS_POLL_SECONDS)
+
+    async def async_stream():
+        nonlocal last_id
+        while True:
+            messages, last_id, finished = await sync_to_async(read_job_events)(job_id, last_id)
+            for message in messages:
+                yield message
+            if finished:
+                return
+            await asyncio.sleep(EVENTS_POLL_SECONDS)
+
+    events = async_stream() if isinstance(request, ASGIRequest) else stream()
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    return response
@@ -10,8 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+
 from pathlib import Path
 
+# matplotlib is only imported when something is plotted, and the web server and its job workers have no display
+os.environ.setdefault('MPLBACKEND', 'agg')
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -123,3 +128,21 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Uploaded files, like the RLP of a Region
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
+
+# Background plotting jobs (see plot/jobs.py)
+# MAX_CONCURRENT_JOBS is across all web processes, and TIME_LIMIT is in seconds
+# CACHE_MAX_BYTES is the size of the cache of results shared by every process (see plot/cache.py)
+# TEMPLATE_CACHE_DIR is where DXF templates are kept once they are compiled (see plot/software/TemplateLibrary.py)
+
+PLOT_JOBS = {
+    'MAX_CONCURRENT_JOBS': 2,
+    'TIME_LIMIT': 600,
+    'CACHE_MAX_BYTES': 256 * 1024 * 1024,
+    'TEMPLATE_CACHE_DIR': MEDIA_ROOT / 'templates',
+}